@@ -0,0 +1,204 @@
+"""
+Admission control in front of the vision pipeline.
+
+Three layers keep a burst of free-tier uploads from exhausting the Gemini
+quota and starving paying users:
+
+  1. Per-user token buckets (rate and burst per tier) → fast 429.
+  2. A global cap on vision analyses in flight.
+  3. A priority queue for the cap: Pro (and admin) waiters are always
+     served before free ones. When the queue is full, or a waiter gives up
+     after `queue_timeout_s` → 503.
+
+Rejections carry Retry-After, and 503s an X-Queue-Position, so clients can
+back off instead of hammering the API. Everything runs on the event loop;
+no locking is needed.
+"""
+
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+from fastapi import HTTPException
+
+from cache import LRUCache
+from config import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_WAITING,
+    ADMISSION_FREE_MAX_WAITING,
+    ADMISSION_QUEUE_TIMEOUT_S,
+    ADMISSION_FREE_RATE_PER_MIN,
+    ADMISSION_FREE_BURST,
+    ADMISSION_PRO_RATE_PER_MIN,
+    ADMISSION_PRO_BURST,
+    ADMISSION_MAX_TRACKED_KEYS,
+)
+
+_PAID, _FREE = 0, 1  # queue priorities, lowest served first
+
+# Called with the waiter's 1-based position whenever it changes
+QueueCallback = Callable[[int], None]
+
+
+def _priority(tier: str) -> int:
+    return _FREE if tier == "free" else _PAID
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future", "on_wait")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future, on_wait: QueueCallback | None):
+        self.priority, self.seq, self.future, self.on_wait = priority, seq, future, on_wait
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """Token buckets per user plus a prioritised concurrency cap."""
+
+    def __init__(
+        self,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_waiting: int = ADMISSION_MAX_WAITING,
+        free_max_waiting: int = ADMISSION_FREE_MAX_WAITING,
+        queue_timeout_s: float = ADMISSION_QUEUE_TIMEOUT_S,
+        rates: dict[int, tuple[float, float]] | None = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.free_max_waiting = free_max_waiting
+        self.queue_timeout_s = queue_timeout_s
+        # priority → (tokens per minute, burst)
+        self.rates = rates or {
+            _FREE: (ADMISSION_FREE_RATE_PER_MIN, ADMISSION_FREE_BURST),
+            _PAID: (ADMISSION_PRO_RATE_PER_MIN, ADMISSION_PRO_BURST),
+        }
+
+        self._buckets = LRUCache(max_entries=ADMISSION_MAX_TRACKED_KEYS)  # key → (tokens, updated_at)
+        self._waiters: list[_Waiter] = []  # heap
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._service_s = 10.0  # moving average of slot hold time, for Retry-After estimates
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_rate = 0
+        self.rejected_busy = 0
+        self.timed_out = 0
+
+    # ── Rate limiting ───────────────────────────────────────────────────────
+
+    def limit_rate(self, key: str, tier: str) -> None:
+        """Take one token from `key`'s bucket, or raise 429 with the wait until the next one."""
+        rate_per_min, burst = self.rates[_priority(tier)]
+        rate_per_s = rate_per_min / 60
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate_per_s)
+        if tokens < 1:
+            self.rejected_rate += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many uploads in a short time. Please wait before trying again.",
+                headers={"Retry-After": str(max(1, math.ceil((1 - tokens) / rate_per_s)))},
+            )
+        self._buckets.set(key, (tokens - 1, now))
+
+    # ── Concurrency cap ─────────────────────────────────────────────────────
+
+    def check_capacity(self, tier: str) -> None:
+        """Raise 503 at once if a new request of this tier could not even join the queue."""
+        if self._in_flight < self.max_in_flight:
+            return
+        priority = _priority(tier)
+        waiting = len(self._waiters)
+        free_waiting = sum(1 for w in self._waiters if w.priority == _FREE)
+        if waiting >= self.max_waiting or (priority == _FREE and free_waiting >= self.free_max_waiting):
+            self.rejected_busy += 1
+            raise self._busy(self._position(priority))
+
+    @asynccontextmanager
+    async def slot(
+        self, tier: str, on_wait: QueueCallback | None = None, wait_indefinitely: bool = False
+    ) -> AsyncIterator[None]:
+        """
+        Hold one of the in-flight slots, queueing by tier priority when all
+        are taken. Raises 503 after queue_timeout_s unless `wait_indefinitely`
+        (background jobs). `on_wait` is told the queue position on joining
+        and each time it moves.
+        """
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+        else:
+            await self._wait(_priority(tier), None if wait_indefinitely else self.queue_timeout_s, on_wait)
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_s = 0.9 * self._service_s + 0.1 * (time.monotonic() - started)
+            self._release()
+
+    async def _wait(self, priority: int, timeout_s: float | None, on_wait: QueueCallback | None) -> None:
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future(), on_wait)
+        heapq.heappush(self._waiters, waiter)
+        self.queued += 1
+        self._notify_positions()
+        try:
+            await asyncio.wait_for(waiter.future, timeout=timeout_s)
+        except BaseException as exc:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we gave up: hand the slot on
+                self._release()
+            else:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._notify_positions()
+            if isinstance(exc, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise self._busy(self._position(priority))
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        while self._waiters and self._in_flight < self.max_in_flight:
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            self._in_flight += 1
+            waiter.future.set_result(None)
+        self._notify_positions()
+
+    def _notify_positions(self) -> None:
+        for position, waiter in enumerate(sorted(self._waiters), start=1):
+            if waiter.on_wait is not None:
+                waiter.on_wait(position)
+
+    def _position(self, priority: int) -> int:
+        """Where a new waiter of this priority would join the queue (1-based)."""
+        return sum(1 for w in self._waiters if w.priority <= priority) + 1
+
+    def _busy(self, position: int) -> HTTPException:
+        retry_after = max(1, math.ceil(position * self._service_s / max(1, self.max_in_flight)))
+        return HTTPException(
+            status_code=503,
+            detail="Plan analysis is at capacity. Please retry shortly.",
+            headers={"Retry-After": str(retry_after), "X-Queue-Position": str(position)},
+        )
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "waiting_pro": sum(1 for w in self._waiters if w.priority == _PAID),
+            "waiting_free": sum(1 for w in self._waiters if w.priority == _FREE),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_rate_limited": self.rejected_rate,
+            "rejected_busy": self.rejected_busy,
+            "timed_out": self.timed_out,
+            "avg_service_s": round(self._service_s, 2),
+        }
@@ -0,0 +1,60 @@
+"""
+Incremental ZIP archive builder for streamed downloads.
+
+zipfile writes to an unseekable sink here, so every member is followed by a
+data descriptor instead of having its header patched afterwards. Bytes are
+drained as they are produced and never accumulate beyond what the caller
+has not yet sent, which keeps memory flat however large the archive gets.
+"""
+
+import io
+import time
+import zipfile
+from typing import IO
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable buffer that zipfile appends to and we drain."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """
+    Builds a ZIP archive member by member.
+
+    Write to the file returned by open(), call drain() as often as convenient
+    to collect the bytes produced so far, and finish with close().
+    """
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w")
+
+    def open(self, name: str, compress: bool = True) -> IO[bytes]:
+        """A writable member. Pass compress=False for already-compressed data (PNG, PDF)."""
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        # Sizes aren't known up front, so always reserve Zip64 fields
+        return self._zip.open(info, "w", force_zip64=True)
+
+    def drain(self) -> bytes:
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the remaining bytes."""
+        self._zip.close()
+        return self._sink.drain()
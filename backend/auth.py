@@ -1,14 +1,60 @@
 import os
 import jwt
+import time
+import hashlib
+import threading
 from fastapi import Request, HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import create_client, Client
 import functools
 
+from cache import LRUCache
+from config import (
+    TIER_CACHE_TTL_S,
+    TIER_CACHE_NEGATIVE_TTL_S,
+    TIER_CACHE_MAX_ENTRIES,
+    TIER_COUNTS_TTL_S,
+    CLERK_ISSUERS,
+    CLERK_DEV_ANY_ISSUER,
+    JWKS_REFRESH_INTERVAL_S,
+    JWKS_FORCED_REFRESH_MIN_INTERVAL_S,
+    TOKEN_CACHE_MAX_ENTRIES,
+)
+
 security = HTTPBearer(auto_error=False)
 
-# Cache the JWKS clients so we don't refetch on every request
-_jwks_clients = {}
+# sha256(token) → user ID, each entry expiring with the token's `exp`
+_verified_tokens = LRUCache(max_entries=TOKEN_CACHE_MAX_ENTRIES)
+
+# JWKS clients and their signing keys (issuer → kid → key). For allow-listed
+# issuers the keys are prefetched at startup and refreshed in the background,
+# so verification never waits on the network.
+_jwks_clients: dict[str, jwt.PyJWKClient] = {}
+_signing_keys: dict[str, dict[str, jwt.PyJWK]] = {}
+_jwks_lock = threading.Lock()
+_jwks_refresh_now = threading.Event()
+# When an unknown kid last forced a refresh. Tokens with made-up kids are
+# free to mint, so forced refreshes are rate limited to protect Clerk.
+_jwks_forced_at = float("-inf")
+_jwks_refresher: threading.Thread | None = None
+
+# CLERK_DEV_ANY_ISSUER: JWKS clients for issuers discovered from tokens. An
+# LRU, so arbitrary `iss` values evict each other instead of piling up.
+_dev_jwks_clients = LRUCache(max_entries=16)
+
+# user_id → tier. Users without a profile row are cached as "free" for a
+# shorter time (negative caching).
+_tier_cache = LRUCache(max_entries=TIER_CACHE_MAX_ENTRIES, ttl_s=TIER_CACHE_TTL_S)
+
+# Striped locks: concurrent misses for the same user wait for a single query
+# instead of stampeding Supabase, without keeping a lock per user forever.
+_tier_locks = [threading.Lock() for _ in range(64)]
+
+TIERS = ("free", "pro", "admin")
+
+# Users per tier for the admin dashboard; one cached aggregate, dropped
+# whenever a tier changes.
+_tier_counts = LRUCache(max_entries=1, ttl_s=TIER_COUNTS_TTL_S)
 
 @functools.lru_cache()
 def get_supabase() -> Client:
@@ -18,64 +64,189 @@ def get_supabase() -> Client:
         raise HTTPException(status_code=500, detail="Supabase credentials missing")
     return create_client(supabase_url, supabase_key)
 
+def _jwks_client(issuer: str) -> jwt.PyJWKClient:
+    with _jwks_lock:
+        client = _jwks_clients.get(issuer)
+        if client is None:
+            client = jwt.PyJWKClient(f"{issuer}/.well-known/jwks.json")
+            _jwks_clients[issuer] = client
+        return client
+
+
+def _dev_jwks_client(issuer: str) -> jwt.PyJWKClient:
+    client = _dev_jwks_clients.get(issuer)
+    if client is None:
+        client = jwt.PyJWKClient(f"{issuer}/.well-known/jwks.json")
+        _dev_jwks_clients.set(issuer, client)
+    return client
+
+
+def refresh_jwks(issuer: str) -> None:
+    """Fetch an issuer's JWKS and swap in its signing keys."""
+    keys = _jwks_client(issuer).get_signing_keys(refresh=True)
+    with _jwks_lock:
+        _signing_keys[issuer] = {key.key_id: key for key in keys}
+
+
+def _refresh_all_jwks() -> None:
+    for issuer in CLERK_ISSUERS:
+        try:
+            refresh_jwks(issuer)
+        except Exception as e:
+            print(f"JWKS refresh failed for {issuer}: {e}")
+
+
+def _jwks_refresh_loop() -> None:
+    while True:
+        # Wake early when a token arrives signed with a key we haven't seen (rotation)
+        _jwks_refresh_now.wait(JWKS_REFRESH_INTERVAL_S)
+        _jwks_refresh_now.clear()
+        _refresh_all_jwks()
+
+
+def start_jwks_refresher() -> None:
+    """
+    Prefetch JWKS for every allow-listed issuer, then keep them fresh in a
+    daemon thread. Call once at application startup.
+    """
+    global _jwks_refresher
+    if not CLERK_ISSUERS and not CLERK_DEV_ANY_ISSUER:
+        print("CLERK_ISSUERS is not set: every bearer token will be rejected")
+    if _jwks_refresher is not None or not CLERK_ISSUERS:
+        return
+    _refresh_all_jwks()
+    _jwks_refresher = threading.Thread(target=_jwks_refresh_loop, name="jwks-refresh", daemon=True)
+    _jwks_refresher.start()
+
+
+def _signing_key(issuer: str, kid: str | None, token: str) -> jwt.PyJWK:
+    if not CLERK_ISSUERS:
+        if not CLERK_DEV_ANY_ISSUER:
+            raise ValueError("CLERK_ISSUERS is not set; no issuer is trusted")
+        # Dev mode: lazily discovered issuer, fetched (and cached) by PyJWKClient
+        return _dev_jwks_client(issuer).get_signing_key_from_jwt(token)
+    if issuer not in CLERK_ISSUERS:
+        raise ValueError(f"Issuer not allowed: {issuer}")
+    with _jwks_lock:
+        key = _signing_keys.get(issuer, {}).get(kid)
+    if key is None:
+        if _schedule_forced_refresh():
+            raise ValueError(f"Unknown signing key {kid!r} for {issuer}; JWKS refresh scheduled")
+        raise ValueError(f"Unknown signing key {kid!r} for {issuer}")
+    return key
+
+
+def _schedule_forced_refresh() -> bool:
+    """Wake the refresher early, at most once per JWKS_FORCED_REFRESH_MIN_INTERVAL_S."""
+    global _jwks_forced_at
+    now = time.monotonic()
+    with _jwks_lock:
+        if now - _jwks_forced_at < JWKS_FORCED_REFRESH_MIN_INTERVAL_S:
+            return False
+        _jwks_forced_at = now
+    _jwks_refresh_now.set()
+    return True
+
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> str | None:
     """
     Decodes the Clerk JWT to extract the user ID (`sub`).
     Returns the user ID if valid, else None.
+    Verified tokens are cached until they expire.
     """
     if not credentials:
         return None
-        
+
     token = credentials.credentials
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    user_id = _verified_tokens.get(token_hash)
+    if user_id is not None:
+        return user_id
+
     try:
-        # 1. Decode header to find unverified claims for Issuer (iss)
-        unverified_claims = jwt.decode(token, options={"verify_signature": False})
-        
-        issuer = unverified_claims.get("iss")
+        # 1. Read header (kid) and issuer without verifying, in one parse
+        unverified = jwt.decode_complete(token, options={"verify_signature": False})
+        issuer = (unverified["payload"].get("iss") or "").rstrip("/")
         if not issuer:
             raise ValueError("No issuer found in JWT")
-            
-        # 2. Get or create JWK client for this issuer
-        if issuer not in _jwks_clients:
-            jwks_url = f"{issuer.rstrip('/')}/.well-known/jwks.json"
-            _jwks_clients[issuer] = jwt.PyJWKClient(jwks_url)
-            
-        jwks_client = _jwks_clients[issuer]
-        
-        # 3. Get the signing key
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
-        
-        # 4. Verify the token signature and claims
+
+        # 2. Find the signing key for this issuer
+        signing_key = _signing_key(issuer, unverified["header"].get("kid"), token)
+
+        # 3. Verify the token signature and claims
         decoded = jwt.decode(
             token,
             signing_key.key,
             algorithms=["RS256"],
-            issuer=issuer,
+            issuer=unverified["payload"]["iss"],
             options={"verify_aud": False}  # Ignore audience for simpler integration
         )
-        return decoded.get("sub")
-        
     except Exception as e:
         print(f"Token verification failed: {e}")
         return None
 
+    user_id = decoded.get("sub")
+    exp = decoded.get("exp")
+    if user_id and exp:
+        ttl = exp - time.time()
+        if ttl > 0:
+            _verified_tokens.set(token_hash, user_id, ttl_s=ttl)
+    return user_id
+
 def get_current_user_tier(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
     """
     Extracts user ID from token and fetches their subscription tier from Supabase.
     Defaults to 'free' if no token or user not found.
+    Tiers are cached per user; see invalidate_user_tier.
     """
     user_id = verify_token(credentials)
     if not user_id:
         return "free"
-        
-    try:
-        supabase = get_supabase()
-        response = supabase.table("profiles").select("tier").eq("id", user_id).execute()
-        
+
+    tier = _tier_cache.get(user_id)
+    if tier is not None:
+        return tier
+
+    with _tier_locks[hash(user_id) % len(_tier_locks)]:
+        # Another request may have filled the cache while we waited
+        tier = _tier_cache.get(user_id)
+        if tier is not None:
+            return tier
+
+        try:
+            supabase = get_supabase()
+            response = supabase.table("profiles").select("tier").eq("id", user_id).execute()
+        except Exception as e:
+            # Don't cache failures; the next request retries
+            print(f"Failed to fetch user tier: {e}")
+            return "free"
+
         if response.data and len(response.data) > 0:
-            return response.data[0].get("tier", "free")
-            
-        return "free"
-    except Exception as e:
-        print(f"Failed to fetch user tier: {e}")
+            tier = response.data[0].get("tier", "free")
+            _tier_cache.set(user_id, tier)
+            return tier
+
+        _tier_cache.set(user_id, "free", ttl_s=TIER_CACHE_NEGATIVE_TTL_S)
         return "free"
+
+
+def invalidate_user_tier(user_id: str | None = None) -> None:
+    """Drop a cached tier after it changes. With no user_id, drop them all."""
+    if user_id is None:
+        _tier_cache.clear()
+    else:
+        _tier_cache.pop(user_id)
+    _tier_counts.clear()
+
+
+def get_tier_counts() -> dict[str, int]:
+    """Number of users on each tier, from count queries cached for TIER_COUNTS_TTL_S."""
+    counts = _tier_counts.get("all")
+    if counts is None:
+        supabase = get_supabase()
+        counts = {
+            tier: supabase.table("profiles").select("id", count="exact", head=True).eq("tier", tier).execute().count or 0
+            for tier in TIERS
+        }
+        _tier_counts.set("all", counts)
+    return counts
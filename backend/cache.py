@@ -0,0 +1,245 @@
+"""
+Caching primitives for CostCorrect.
+
+  - LRUCache:    thread-safe in-process LRU with optional per-entry TTL
+  - VisionCache: two-tier (memory + SQLite) cache of Gemini WallMeasurements
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import functools
+from collections import OrderedDict
+from typing import Any
+
+from schemas import WallMeasurement
+from config import (
+    VISION_CACHE_ENABLED,
+    VISION_CACHE_PATH,
+    VISION_CACHE_MEMORY_ENTRIES,
+    VISION_CACHE_MAX_ENTRIES,
+    VISION_CACHE_TTL_S,
+)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with optional expiry."""
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float | None = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: OrderedDict[Any, tuple[Any, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_s: float | None = None) -> None:
+        """Store a value. `ttl_s` overrides the cache-wide TTL for this entry."""
+        ttl = ttl_s if ttl_s is not None else self.ttl_s
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def keys(self) -> list:
+        """Snapshot of current keys (including any not yet purged as expired)."""
+        with self._lock:
+            return list(self._data)
+
+
+class VisionCache:
+    """
+    Content-addressed cache of Gemini Vision results.
+
+    Entries are keyed by the SHA-256 of the uploaded bytes, the PDF page
+    analysed and a namespace (model name + prompt version), so changing the
+    model or prompt invalidates old results.
+    A small in-memory LRU sits in front of a persistent SQLite table with
+    TTL and entry-count eviction.
+    """
+
+    # Run disk eviction every N writes rather than on every insert.
+    _EVICT_EVERY = 50
+    # Bump when the table layout changes, and teach _migrate() the upgrade.
+    _SCHEMA_VERSION = 1
+
+    def __init__(
+        self,
+        namespace: str,
+        db_path: str = VISION_CACHE_PATH,
+        memory_entries: int = VISION_CACHE_MEMORY_ENTRIES,
+        max_entries: int = VISION_CACHE_MAX_ENTRIES,
+        ttl_s: float = VISION_CACHE_TTL_S,
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._memory = LRUCache(max_entries=memory_entries, ttl_s=ttl_s)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Bring the on-disk schema up to _SCHEMA_VERSION (tracked in PRAGMA user_version)."""
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version >= self._SCHEMA_VERSION:
+            return
+        with self._db:
+            legacy = self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vision_cache'"
+            ).fetchone()
+            if legacy and version < 1:
+                # v0 had no page column; its entries were all for the first page
+                self._db.execute("DROP INDEX IF EXISTS vision_cache_accessed")
+                self._db.execute("ALTER TABLE vision_cache RENAME TO vision_cache_v0")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vision_cache (
+                    digest      TEXT NOT NULL,
+                    page        INTEGER NOT NULL,
+                    namespace   TEXT NOT NULL,
+                    value       TEXT NOT NULL,
+                    created_at  REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (digest, page, namespace)
+                )
+                """
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS vision_cache_accessed ON vision_cache (accessed_at)"
+            )
+            if legacy and version < 1:
+                self._db.execute(
+                    """
+                    INSERT OR IGNORE INTO vision_cache
+                    SELECT digest, 0, namespace, value, created_at, accessed_at FROM vision_cache_v0
+                    """
+                )
+                self._db.execute("DROP TABLE vision_cache_v0")
+            self._db.execute(f"PRAGMA user_version = {self._SCHEMA_VERSION}")
+
+    def get(self, digest: str, page: int = 0) -> WallMeasurement | None:
+        measurement = self._memory.get((digest, page))
+        if measurement is not None:
+            self.hits_memory += 1
+            return measurement
+
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM vision_cache WHERE digest = ? AND page = ? AND namespace = ?",
+                (digest, page, self.namespace),
+            ).fetchone()
+            if row is None or row[1] + self.ttl_s <= now:
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE vision_cache SET accessed_at = ? WHERE digest = ? AND page = ? AND namespace = ?",
+                (now, digest, page, self.namespace),
+            )
+            self._db.commit()
+
+        measurement = WallMeasurement.model_validate_json(row[0])
+        self._memory.set((digest, page), measurement)
+        self.hits_disk += 1
+        return measurement
+
+    def set(self, digest: str, measurement: WallMeasurement, page: int = 0) -> None:
+        self._memory.set((digest, page), measurement)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO vision_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, page, self.namespace, measurement.model_dump_json(), now, now),
+            )
+            self._writes += 1
+            if self._writes % self._EVICT_EVERY == 0:
+                self._evict(now)
+            self._db.commit()
+
+    def evict_digest(self, digest: str) -> None:
+        """Drop every cached result for an upload, across all pages and namespaces."""
+        for key in self._memory.keys():
+            if key[0] == digest:
+                self._memory.pop(key)
+        with self._lock:
+            self._db.execute("DELETE FROM vision_cache WHERE digest = ?", (digest,))
+            self._db.commit()
+
+    def _evict(self, now: float) -> None:
+        """Remove expired rows, then the least recently used beyond max_entries."""
+        self._db.execute("DELETE FROM vision_cache WHERE created_at <= ?", (now - self.ttl_s,))
+        self._db.execute(
+            """
+            DELETE FROM vision_cache WHERE rowid IN (
+                SELECT rowid FROM vision_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def stats(self) -> dict:
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+        }
+
+
+@functools.lru_cache()
+def get_vision_cache(tiled: bool = False) -> VisionCache | None:
+    """Return the process-wide vision cache for an analysis mode, or None if caching is disabled."""
+    if not VISION_CACHE_ENABLED:
+        return None
+    from config import GEMINI_MODEL, VISION_PROVIDER, PREPROCESS_ENABLED
+    from vision import VISION_PROMPT_VERSION, VISION_TILE_PROMPT_VERSION
+    from preprocess import PREPROCESS_VERSION
+    namespace = f"{GEMINI_MODEL}:{VISION_PROMPT_VERSION}"
+    if PREPROCESS_ENABLED:
+        # Crop and tile-budget settings change the image Gemini sees
+        namespace += f":pre:{PREPROCESS_VERSION}"
+    if VISION_PROVIDER == "replay":
+        # Replayed answers are canned; keep them apart from real Gemini results
+        namespace += ":replay"
+    if tiled:
+        # Tiled results also depend on the tile prompt and must not be served for single-call uploads
+        namespace += f":tiled:{VISION_TILE_PROMPT_VERSION}"
+    return VisionCache(namespace=namespace)
@@ -10,10 +10,23 @@ Wastage: 10 % default (configurable 0–30 %)
 Cement 1:4 mix: ~7 bags per 1 000 bricks (50 kg bags)
 Sand: ~0.5 m³ per 1 000 bricks
 Lintels: required for openings > 600 mm wide
+
+`calculate_boq_batch` is a NumPy twin of `calculate_boq` for scenario sweeps;
+it must stay arithmetically identical to the scalar version.
 """
 
 import math
-from schemas import BOQResponse, MaterialLine, CalculatorAssumptions, BrickType
+import numpy as np
+from schemas import (
+    BOQResponse,
+    MaterialLine,
+    CalculatorAssumptions,
+    BrickType,
+    WallMeasurement,
+    FloorBOQ,
+    MultiFloorBOQResponse,
+    ScenarioSweepRequest,
+)
 from config import (
     BRICKS_PER_SQM_SINGLE,
     BRICKS_PER_SQM_DOUBLE,
@@ -184,3 +197,217 @@ def calculate_boq(
         total_estimated_cost=total_cost,
         confidence_note=confidence_note,
     )
+
+
+def calculate_multi_floor_boq(
+    filename: str,
+    page_measurements: list[tuple[int, WallMeasurement]],
+    assumptions: CalculatorAssumptions | None = None,
+    failed_pages: list[int] | None = None,
+) -> MultiFloorBOQResponse:
+    """
+    Aggregate per-page measurements (one PDF page per floor) into a BOQ.
+
+    Each page is costed as a single floor, so `assumptions.floors` is ignored.
+    Openings and lintels are building-wide inputs and are therefore applied
+    only to the total, not to the individual floor BOQs.
+    `page_measurements` holds 0-based page indices.
+    """
+    if assumptions is None:
+        assumptions = CalculatorAssumptions()
+
+    single_floor = assumptions.model_copy(update={"floors": 1})
+    floor_only = single_floor.model_copy(update={"openings_area_sqm": 0.0, "openings_wider_than_600mm": 0})
+
+    ordered = sorted(page_measurements, key=lambda pm: pm[0])
+    floors = [
+        FloorBOQ(
+            page=page + 1,
+            measurement=m,
+            boq=calculate_boq(
+                filename=f"{filename} (page {page + 1})",
+                scale=m.scale,
+                walls_230mm_linear_m=m.walls_230mm_linear_m,
+                walls_110mm_linear_m=m.walls_110mm_linear_m,
+                assumptions=floor_only,
+                confidence_note=m.confidence_note,
+            ),
+        )
+        for page, m in ordered
+    ]
+
+    scales = {m.scale for _, m in ordered}
+    notes = [f"Page {page + 1}: {m.confidence_note}" for page, m in ordered if m.confidence_note]
+    total = calculate_boq(
+        filename=filename,
+        scale=scales.pop() if len(scales) == 1 else "mixed" if scales else "unknown",
+        walls_230mm_linear_m=sum(m.walls_230mm_linear_m for _, m in ordered),
+        walls_110mm_linear_m=sum(m.walls_110mm_linear_m for _, m in ordered),
+        assumptions=single_floor,
+        confidence_note="\n".join(notes) or None,
+    )
+
+    return MultiFloorBOQResponse(
+        filename=filename,
+        floors=floors,
+        failed_pages=sorted(p + 1 for p in (failed_pages or [])),
+        total=total,
+    )
+
+
+# ── Vectorised scenario engine ──────────────────────────────────────────────
+
+def _round_like_python(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    Element-wise equivalent of Python's round(x, ndigits).
+
+    np.round scales, rounds and unscales, which can disagree with Python's
+    correctly-rounded round() when the scaled value lies within float error
+    of a .5 tie. Those (rare) elements are re-rounded in Python.
+    """
+    result = np.array(np.round(x, ndigits), dtype=np.float64)
+    scaled = x * 10.0 ** ndigits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= np.abs(scaled) * 1e-12 + 1e-12
+    for i in np.flatnonzero(near_tie):
+        result.flat[i] = round(float(x.flat[i]), ndigits)
+    return result
+
+
+def calculate_boq_batch(
+    walls_230mm_linear_m,
+    walls_110mm_linear_m,
+    brick_type=BrickType.STOCK,
+    wall_height_m=DEFAULT_WALL_HEIGHT_M,
+    wastage_percent=10.0,
+    floors=1,
+    include_vat=False,
+    estimate_prices=False,
+    openings_area_sqm=0.0,
+    openings_wider_than_600mm=0,
+) -> dict[str, np.ndarray]:
+    """
+    Compute many BOQs in one vectorised pass.
+
+    Every argument may be a scalar or an array; all are broadcast together,
+    one element per scenario. Returns a dict of arrays keyed by the matching
+    BOQResponse field names. Cost fields are NaN where prices were not
+    requested (None in the scalar version).
+
+    Results are identical to calling `calculate_boq` once per scenario.
+    """
+    (
+        w230, w110, is_maxi, wall_height, wastage_pct, floors,
+        include_vat, estimate_prices, openings_area, lintels,
+    ) = np.broadcast_arrays(
+        np.asarray(walls_230mm_linear_m, dtype=np.float64),
+        np.asarray(walls_110mm_linear_m, dtype=np.float64),
+        np.asarray(brick_type, dtype=object) == BrickType.MAXI.value,
+        np.asarray(wall_height_m, dtype=np.float64),
+        np.asarray(wastage_percent, dtype=np.float64),
+        np.asarray(floors, dtype=np.int64),
+        np.asarray(include_vat, dtype=bool),
+        np.asarray(estimate_prices, dtype=bool),
+        np.asarray(openings_area_sqm, dtype=np.float64),
+        np.asarray(openings_wider_than_600mm, dtype=np.int64),
+    )
+    wastage = wastage_pct / 100.0
+
+    # ── Brick lookup ────────────────────────────────────────────────────────
+    bricks_per_sqm_single = np.where(is_maxi, MAXI_BRICKS_PER_SQM_SINGLE, BRICKS_PER_SQM_SINGLE)
+    bricks_per_sqm_double = np.where(is_maxi, MAXI_BRICKS_PER_SQM_DOUBLE, BRICKS_PER_SQM_DOUBLE)
+    price_per_brick = np.where(is_maxi, PRICE_MAXI_BRICK, PRICE_BRICK)
+
+    # ── Wall areas (gross) ──────────────────────────────────────────────────
+    area_230_gross = w230 * wall_height * floors
+    area_110_gross = w110 * wall_height * floors
+    total_wall_area = area_230_gross + area_110_gross
+
+    # ── Openings deduction ──────────────────────────────────────────────────
+    openings_deducted = np.minimum(openings_area, total_wall_area)
+    has_area = total_wall_area > 0
+    ratio_230 = np.divide(area_230_gross, total_wall_area, out=np.full_like(total_wall_area, 0.5), where=has_area)
+    area_230_net = np.maximum(0.0, area_230_gross - openings_deducted * ratio_230)
+    area_110_net = np.maximum(0.0, area_110_gross - openings_deducted * (1 - ratio_230))
+    net_wall_area = area_230_net + area_110_net
+
+    # ── Bricks, cement, sand (with wastage) ─────────────────────────────────
+    bricks_230 = np.ceil(area_230_net * bricks_per_sqm_double * (1 + wastage)).astype(np.int64)
+    bricks_110 = np.ceil(area_110_net * bricks_per_sqm_single * (1 + wastage)).astype(np.int64)
+    total_bricks = bricks_230 + bricks_110
+
+    cement_bags = _round_like_python((total_bricks / 1000) * CEMENT_BAGS_PER_1000_BRICKS * (1 + wastage), 1)
+    sand_cubes = _round_like_python((total_bricks / 1000) * SAND_CUBES_PER_1000_BRICKS * (1 + wastage), 2)
+
+    # ── Cost totals (summed in the same order as the materials table) ───────
+    subtotal = (
+        _round_like_python(bricks_230 * price_per_brick, 2)
+        + _round_like_python(bricks_110 * price_per_brick, 2)
+        + _round_like_python(cement_bags * PRICE_CEMENT_BAG, 2)
+        + _round_like_python(sand_cubes * PRICE_SAND_CUBE, 2)
+        + np.where(lintels > 0, _round_like_python(lintels * PRICE_LINTEL_STANDARD, 2), 0.0)
+    )
+    subtotal = _round_like_python(subtotal, 2)
+    vat_amount = np.where(include_vat, _round_like_python(subtotal * VAT_RATE, 2), np.nan)
+    total_cost = np.where(include_vat, _round_like_python(subtotal + np.nan_to_num(vat_amount), 2), subtotal)
+
+    no_prices = ~estimate_prices
+    return {
+        "walls_230mm_linear_m": _round_like_python(w230, 2),
+        "walls_110mm_linear_m": _round_like_python(w110, 2),
+        "walls_230mm_area_sqm": _round_like_python(area_230_gross, 2),
+        "walls_110mm_area_sqm": _round_like_python(area_110_gross, 2),
+        "total_wall_area_sqm": _round_like_python(total_wall_area, 2),
+        "openings_deducted_sqm": _round_like_python(openings_deducted, 2),
+        "net_wall_area_sqm": _round_like_python(net_wall_area, 2),
+        "bricks_230mm": bricks_230,
+        "bricks_110mm": bricks_110,
+        "total_bricks": total_bricks,
+        "cement_bags": cement_bags,
+        "sand_cubes": sand_cubes,
+        "lintels": lintels.copy(),
+        "wastage_percent": wastage_pct.copy(),
+        "subtotal": np.where(no_prices, np.nan, subtotal),
+        "vat_amount": np.where(no_prices, np.nan, vat_amount),
+        "total_estimated_cost": np.where(no_prices, np.nan, total_cost),
+    }
+
+
+def sweep_scenarios(request: ScenarioSweepRequest) -> dict[str, np.ndarray]:
+    """
+    Evaluate every plan × grid combination with `calculate_boq_batch`.
+
+    Returns the swept inputs (`plan`, `brick_type`, `wall_height_m`, `floors`,
+    `include_vat`) alongside the BOQ output columns, one row per scenario.
+    """
+    grid, base = request.grid, request.base
+    axes = [
+        np.arange(len(request.measurements)),
+        np.array([b.value for b in grid.brick_types], dtype=object),
+        np.array(grid.wall_heights_m, dtype=np.float64),
+        np.array(grid.wastage_percents, dtype=np.float64),
+        np.array(grid.floors, dtype=np.int64),
+        np.array(grid.include_vat, dtype=bool),
+    ]
+    idx = np.indices([len(a) for a in axes]).reshape(len(axes), -1)
+    plan, brick_type, wall_height, wastage, floors, include_vat = (a[i] for a, i in zip(axes, idx))
+
+    results = calculate_boq_batch(
+        walls_230mm_linear_m=np.array([m.walls_230mm_linear_m for m in request.measurements])[plan],
+        walls_110mm_linear_m=np.array([m.walls_110mm_linear_m for m in request.measurements])[plan],
+        brick_type=brick_type,
+        wall_height_m=wall_height,
+        wastage_percent=wastage,
+        floors=floors,
+        include_vat=include_vat,
+        estimate_prices=base.estimate_prices,
+        openings_area_sqm=base.openings_area_sqm,
+        openings_wider_than_600mm=base.openings_wider_than_600mm,
+    )
+    return {
+        "plan": plan,
+        "brick_type": brick_type,
+        "wall_height_m": wall_height,
+        "floors": floors,
+        "include_vat": include_vat,
+        **results,
+    }
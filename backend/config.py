@@ -12,13 +12,39 @@ load_dotenv()
 GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
 GEMINI_MODEL: str = "gemini-2.0-flash"
 
+# ── Vision provider ─────────────────────────────────────────────────────────
+# "gemini" calls the API; "record" also saves each raw response to
+# VISION_RECORD_DIR; "replay" serves those recordings offline (load tests, CI).
+VISION_PROVIDER: str = os.getenv("VISION_PROVIDER", "gemini")  # "gemini" | "record" | "replay"
+VISION_RECORD_DIR: str = os.getenv(
+    "VISION_RECORD_DIR", os.path.join(os.path.dirname(__file__), ".cache", "vision_recordings")
+)
+VISION_REPLAY_LATENCY_S: float = float(os.getenv("VISION_REPLAY_LATENCY_S", "1.5"))  # typical Gemini latency
+VISION_REPLAY_JITTER_S: float = float(os.getenv("VISION_REPLAY_JITTER_S", "0.5"))
+
 # ── File Storage ────────────────────────────────────────────────────────────
 UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(__file__), "uploads"))
 STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "local")  # "local" | "gcs"
+MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))  # 50 MB
+UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # streamed to storage 1 MiB at a time
+
+# ── Upload janitor (local storage) ─────────────────────────────────────────
+UPLOAD_JANITOR_INTERVAL_S: float = float(os.getenv("UPLOAD_JANITOR_INTERVAL_S", "300"))
+UPLOAD_MAX_AGE_S: float = float(os.getenv("UPLOAD_MAX_AGE_S", str(7 * 24 * 3600)))  # 7 days
+UPLOAD_QUOTA_BYTES: int = int(os.getenv("UPLOAD_QUOTA_BYTES", str(2 * 1024 ** 3)))  # 2 GiB, evicted LRU
+# Uploads younger than this are never evicted for quota: they may still be queued for analysis
+UPLOAD_MIN_AGE_S: float = float(os.getenv("UPLOAD_MIN_AGE_S", "3600"))
+UPLOAD_PART_MAX_AGE_S: float = float(os.getenv("UPLOAD_PART_MAX_AGE_S", "3600"))  # abandoned partial uploads
 
 # ── GCS / POPIA-ready ──────────────────────────────────────────────────────
 GCS_BUCKET: str = os.getenv("GCS_BUCKET", "")
 GCS_REGION: str = os.getenv("GCS_REGION", "africa-south1")  # Johannesburg
+GCS_ENDPOINT: str = os.getenv("GCS_ENDPOINT", "")  # e.g. http://localhost:4443 for a local emulator
+GCS_CHUNK_BYTES: int = int(os.getenv("GCS_CHUNK_BYTES", str(8 * 1024 * 1024)))  # multiple of 256 KiB
+# Uploads larger than this are sent as parallel chunks (XML multipart) instead
+# of a single resumable stream.
+GCS_PARALLEL_THRESHOLD_BYTES: int = int(os.getenv("GCS_PARALLEL_THRESHOLD_BYTES", str(32 * 1024 * 1024)))
+GCS_PARALLEL_WORKERS: int = int(os.getenv("GCS_PARALLEL_WORKERS", "8"))
 
 # ── Auth ────────────────────────────────────────────────────────────────────
 CLERK_WEBHOOK_SECRET: str = os.getenv("CLERK_WEBHOOK_SECRET", "")
@@ -68,3 +94,124 @@ PRICE_CEMENT_BAG: float = 120.00    # 50 kg bag
 PRICE_SAND_CUBE: float = 400.00     # m³
 PRICE_LINTEL_STANDARD: float = 120.00  # per lintel (900mm × 75mm)
 VAT_RATE: float = 0.15              # South African VAT (15 %)
+
+# ── Scenario sweeps ─────────────────────────────────────────────────────────
+SCENARIO_MAX_COUNT: int = int(os.getenv("SCENARIO_MAX_COUNT", "100000"))  # per /api/scenarios request
+
+# ── Vision result cache ─────────────────────────────────────────────────────
+# Gemini results keyed by upload SHA-256 + model + prompt version.
+VISION_CACHE_ENABLED: bool = os.getenv("VISION_CACHE_ENABLED", "true").lower() == "true"
+VISION_CACHE_PATH: str = os.getenv(
+    "VISION_CACHE_PATH", os.path.join(os.path.dirname(__file__), ".cache", "vision.sqlite3")
+)
+VISION_CACHE_MEMORY_ENTRIES: int = int(os.getenv("VISION_CACHE_MEMORY_ENTRIES", "256"))
+VISION_CACHE_MAX_ENTRIES: int = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "10000"))
+VISION_CACHE_TTL_S: int = int(os.getenv("VISION_CACHE_TTL_S", str(30 * 24 * 3600)))  # 30 days
+
+# ── Vision pipeline concurrency ─────────────────────────────────────────────
+VISION_MAX_CONCURRENCY: int = int(os.getenv("VISION_MAX_CONCURRENCY", "8"))   # in-flight analyses
+VISION_RENDER_WORKERS: int = int(os.getenv("VISION_RENDER_WORKERS", "2"))     # CPU-bound render threads
+VISION_QUEUE_TIMEOUT_S: float = float(os.getenv("VISION_QUEUE_TIMEOUT_S", "30"))
+VISION_RENDER_TIMEOUT_S: float = float(os.getenv("VISION_RENDER_TIMEOUT_S", "60"))
+VISION_GEMINI_TIMEOUT_S: float = float(os.getenv("VISION_GEMINI_TIMEOUT_S", "90"))
+VISION_PAGE_CONCURRENCY: int = int(os.getenv("VISION_PAGE_CONCURRENCY", "4"))  # per multi-page upload
+VISION_MAX_PAGES: int = int(os.getenv("VISION_MAX_PAGES", "20"))
+
+# ── Admission control (rate limits & priority in front of Gemini) ──────────
+# Uploads per user per minute, with a burst allowance; anonymous users are
+# limited per client IP at the free-tier rate.
+ADMISSION_FREE_RATE_PER_MIN: float = float(os.getenv("ADMISSION_FREE_RATE_PER_MIN", "4"))
+ADMISSION_FREE_BURST: float = float(os.getenv("ADMISSION_FREE_BURST", "3"))
+ADMISSION_PRO_RATE_PER_MIN: float = float(os.getenv("ADMISSION_PRO_RATE_PER_MIN", "30"))
+ADMISSION_PRO_BURST: float = float(os.getenv("ADMISSION_PRO_BURST", "10"))
+ADMISSION_MAX_TRACKED_KEYS: int = int(os.getenv("ADMISSION_MAX_TRACKED_KEYS", "100000"))
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 on
+# Render). The client IP is taken that many entries from the right, which
+# clients cannot forge; 0 uses the socket peer address.
+TRUSTED_PROXY_HOPS: int = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+# Vision analyses in flight; beyond this requests queue, Pro ahead of free
+ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(VISION_MAX_CONCURRENCY)))
+ADMISSION_MAX_WAITING: int = int(os.getenv("ADMISSION_MAX_WAITING", "100"))
+ADMISSION_FREE_MAX_WAITING: int = int(os.getenv("ADMISSION_FREE_MAX_WAITING", "20"))  # keeps room for Pro
+ADMISSION_QUEUE_TIMEOUT_S: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "20"))  # then 503
+
+# ── PDF rasterisation ───────────────────────────────────────────────────────
+# Pages render at PDF_MAX_DPI unless that would exceed the pixel budget
+# (large-format sheets), in which case DPI is lowered to fit.
+PDF_MAX_DPI: int = int(os.getenv("PDF_MAX_DPI", "200"))
+PDF_MAX_PIXELS: int = int(os.getenv("PDF_MAX_PIXELS", str(24_000_000)))  # ~24 MP
+
+# ── Tiled analysis (large-format sheets) ───────────────────────────────────
+# Opt-in per upload: the sheet is rendered at a higher pixel budget, split
+# into overlapping tiles and each tile analysed at full detail in parallel.
+VISION_TILE_MAX_PIXELS: int = int(os.getenv("VISION_TILE_MAX_PIXELS", str(48_000_000)))
+# Target tile core size; with preprocessing on it is capped so a padded tile
+# fits PREPROCESS_MAX_TILES and is never downscaled (1918 px at the defaults)
+VISION_TILE_PX: int = int(os.getenv("VISION_TILE_PX", "2048"))
+VISION_TILE_OVERLAP: float = float(os.getenv("VISION_TILE_OVERLAP", "0.1"))  # of the core, per side
+VISION_TILE_MAX: int = int(os.getenv("VISION_TILE_MAX", "12"))
+VISION_TILE_CONCURRENCY: int = int(os.getenv("VISION_TILE_CONCURRENCY", "6"))  # per sheet
+
+# ── Background analysis jobs ───────────────────────────────────────────────
+# In-process queue behind /api/upload/jobs; no external broker. Each worker
+# runs one analysis at a time (still bounded by VISION_MAX_CONCURRENCY).
+JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX: int = int(os.getenv("JOB_QUEUE_MAX", "500"))          # queued jobs before 503
+JOB_RESULT_TTL_S: float = float(os.getenv("JOB_RESULT_TTL_S", "3600"))  # keep finished jobs for polling
+
+# ── Report exports (XLSX / PDF) ────────────────────────────────────────────
+EXPORT_WORKERS: int = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_CACHE_MAX_ENTRIES: int = int(os.getenv("EXPORT_CACHE_MAX_ENTRIES", "256"))
+EXPORT_CACHE_TTL_S: float = float(os.getenv("EXPORT_CACHE_TTL_S", "3600"))
+
+# ── POPIA data deletion ────────────────────────────────────────────────────
+# Deletion runs as a background job: estimates are removed in batches, each
+# after its uploads and cached results, so a failed job can simply be retried.
+POPIA_DELETE_WORKERS: int = int(os.getenv("POPIA_DELETE_WORKERS", "2"))
+POPIA_DELETE_BATCH_SIZE: int = int(os.getenv("POPIA_DELETE_BATCH_SIZE", "200"))
+POPIA_DELETE_TIMEOUT_S: float = float(os.getenv("POPIA_DELETE_TIMEOUT_S", "600"))  # whole account, then fail
+
+# ── Pagination & bulk exports ──────────────────────────────────────────────
+PAGE_SIZE_DEFAULT: int = 50
+PAGE_SIZE_MAX: int = 200
+BULK_EXPORT_PAGE_SIZE: int = int(os.getenv("BULK_EXPORT_PAGE_SIZE", "1000"))  # rows fetched per query
+
+# ── Measurement store (recalculate without re-upload) ──────────────────────
+MEASUREMENT_STORE_MAX_ENTRIES: int = int(os.getenv("MEASUREMENT_STORE_MAX_ENTRIES", "10000"))
+MEASUREMENT_STORE_TTL_S: int = int(os.getenv("MEASUREMENT_STORE_TTL_S", str(24 * 3600)))  # 24 h
+
+# ── Subscription tier cache ─────────────────────────────────────────────────
+# Invalidated explicitly by the Stripe/Clerk webhooks and admin tier updates;
+# the TTL only bounds staleness from out-of-band edits to `profiles`.
+TIER_CACHE_TTL_S: float = float(os.getenv("TIER_CACHE_TTL_S", "60"))
+TIER_CACHE_NEGATIVE_TTL_S: float = float(os.getenv("TIER_CACHE_NEGATIVE_TTL_S", "15"))  # users with no profile row
+TIER_CACHE_MAX_ENTRIES: int = int(os.getenv("TIER_CACHE_MAX_ENTRIES", "50000"))
+TIER_COUNTS_TTL_S: float = float(os.getenv("TIER_COUNTS_TTL_S", "300"))  # admin dashboard aggregate
+
+# ── JWT verification ────────────────────────────────────────────────────────
+# Comma-separated Clerk issuer URLs (e.g. https://clerk.costcorrect.co.za).
+# Their JWKS is fetched at startup and refreshed in the background; tokens
+# from other issuers are rejected. While it is empty every token is rejected,
+# unless CLERK_DEV_ANY_ISSUER is set for local development: then any issuer a
+# token names is trusted, which lets anyone mint tokens. Never set it in production.
+CLERK_ISSUERS: list[str] = [i.strip().rstrip("/") for i in os.getenv("CLERK_ISSUERS", "").split(",") if i.strip()]
+CLERK_DEV_ANY_ISSUER: bool = os.getenv("CLERK_DEV_ANY_ISSUER", "false").lower() == "true"
+JWKS_REFRESH_INTERVAL_S: float = float(os.getenv("JWKS_REFRESH_INTERVAL_S", "3600"))
+JWKS_FORCED_REFRESH_MIN_INTERVAL_S: float = float(os.getenv("JWKS_FORCED_REFRESH_MIN_INTERVAL_S", "60"))  # unknown-kid refreshes
+TOKEN_CACHE_MAX_ENTRIES: int = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# ── Background batch writers (audit log, estimate history) ─────────────────
+AUDIT_QUEUE_MAX: int = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))         # rows buffered before dropping
+AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL_S: float = float(os.getenv("AUDIT_FLUSH_INTERVAL_S", "2"))
+ESTIMATE_QUEUE_MAX: int = int(os.getenv("ESTIMATE_QUEUE_MAX", "5000"))
+ESTIMATE_BATCH_SIZE: int = int(os.getenv("ESTIMATE_BATCH_SIZE", "50"))
+ESTIMATE_FLUSH_INTERVAL_S: float = float(os.getenv("ESTIMATE_FLUSH_INTERVAL_S", "1"))  # history should catch up fast
+
+# ── Image preprocessing (before Gemini) ────────────────────────────────────
+PREPROCESS_ENABLED: bool = os.getenv("PREPROCESS_ENABLED", "true").lower() == "true"
+PREPROCESS_MODE: str = os.getenv("PREPROCESS_MODE", "gray")  # "gray" | "bilevel"
+# Gemini bills images in 768 px tiles of 258 tokens; cap how many we send.
+PREPROCESS_MAX_TILES: int = int(os.getenv("PREPROCESS_MAX_TILES", "12"))
+PREPROCESS_WHITE_THRESHOLD: int = 245  # gray level above which a pixel counts as paper
+PREPROCESS_MARGIN_PX: int = 16         # padding kept around the cropped drawing
@@ -0,0 +1,102 @@
+"""
+Persisted estimate history.
+
+Each BOQResponse is stored as one compact `estimates` row: the inputs (wall
+measurement and full assumptions snapshot), the priced material lines as
+positional arrays and the headline totals. The remaining BOQ fields are
+recomputed from the inputs by calculate_boq on read. Rows are written
+through a BatchWriter, so ids are generated here and returned to the client
+before the insert happens.
+"""
+
+import uuid
+import datetime
+
+from calculator import calculate_boq
+from schemas import BOQResponse, CalculatorAssumptions, MaterialLine, EstimateSummary
+
+_MATERIAL_FIELDS = ("item", "quantity", "unit", "unit_price", "estimated_cost", "note")
+_TOTAL_FIELDS = (
+    "net_wall_area_sqm", "total_bricks", "cement_bags", "sand_cubes", "lintels",
+    "subtotal", "vat_amount", "total_estimated_cost",
+)
+
+# Flat columns for bulk exports: row metadata, then headline BOQ figures
+EXPORT_COLUMNS = [
+    "id", "user_id", "filename", "created_at",
+    "scale", "walls_230mm_linear_m", "walls_110mm_linear_m", *_TOTAL_FIELDS,
+]
+
+
+def new_estimate_id() -> str:
+    return str(uuid.uuid4())
+
+
+def estimate_row(
+    estimate_id: str, user_id: str, boq: BOQResponse, upload_sha256: str | None = None, upload_path: str | None = None
+) -> dict:
+    """The `estimates` row for a BOQ."""
+    return {
+        "id": estimate_id,
+        "user_id": user_id,
+        "filename": boq.filename,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "upload_sha256": upload_sha256,
+        "upload_path": upload_path,
+        "measurement": {
+            "scale": boq.scale,
+            "walls_230mm_linear_m": boq.walls_230mm_linear_m,
+            "walls_110mm_linear_m": boq.walls_110mm_linear_m,
+            "confidence_note": boq.confidence_note,
+        },
+        "assumptions": boq.assumptions.model_dump(mode="json"),
+        "materials": [[getattr(mat, f) for f in _MATERIAL_FIELDS] for mat in boq.materials],
+        "totals": {f: getattr(boq, f) for f in _TOTAL_FIELDS if getattr(boq, f) is not None},
+    }
+
+
+def boq_from_row(row: dict) -> BOQResponse:
+    """Rebuild the BOQResponse for a stored row; prices are as they were when it was saved."""
+    if row.get("measurement") is None:
+        # Rows from before the compact format carried the whole BOQ
+        return BOQResponse.model_validate({**row["result"], "estimate_id": row["id"]})
+
+    m = row["measurement"]
+    boq = calculate_boq(
+        filename=row["filename"],
+        scale=m["scale"],
+        walls_230mm_linear_m=m["walls_230mm_linear_m"],
+        walls_110mm_linear_m=m["walls_110mm_linear_m"],
+        assumptions=CalculatorAssumptions.model_validate(row["assumptions"]),
+        confidence_note=m.get("confidence_note"),
+    )
+    return boq.model_copy(update={
+        **(row.get("totals") or {}),
+        "materials": [MaterialLine(**dict(zip(_MATERIAL_FIELDS, line))) for line in row["materials"]],
+        "estimate_id": row["id"],
+    })
+
+
+def _figures(row: dict) -> dict:
+    """Scale, wall lengths and totals of a row, in either storage format."""
+    if row.get("measurement") is None:
+        return row.get("result") or {}
+    return {**row["measurement"], **(row.get("totals") or {})}
+
+
+def estimate_summary(row: dict) -> EstimateSummary:
+    figures = _figures(row)
+    return EstimateSummary(
+        id=row["id"],
+        filename=row.get("filename") or "",
+        created_at=str(row["created_at"]),
+        scale=figures.get("scale", "unknown"),
+        total_bricks=figures.get("total_bricks"),
+        total_estimated_cost=figures.get("total_estimated_cost"),
+    )
+
+
+def flatten_estimate(row: dict) -> dict:
+    """One row of a bulk export (see EXPORT_COLUMNS)."""
+    figures = _figures(row)
+    return {col: row[col] if col in row else figures.get(col) for col in EXPORT_COLUMNS}
@@ -0,0 +1,194 @@
+"""
+BOQ report exports: Excel (XLSX) and PDF.
+
+Both formats are CPU-bound to build, so they are generated in a small
+dedicated thread pool rather than on the event loop. Finished reports are
+cached by a hash of the BOQResponse, the format, the watermark flag and the
+date they show, so downloading the same report twice (or in both formats)
+on the same day costs one build each.
+Free-tier reports carry a watermark.
+"""
+
+import io
+import asyncio
+import hashlib
+import datetime
+from xml.sax.saxutils import escape
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from cache import LRUCache
+from schemas import BOQResponse
+from config import EXPORT_WORKERS, EXPORT_CACHE_MAX_ENTRIES, EXPORT_CACHE_TTL_S, VAT_RATE
+
+ExportFormat = Literal["xlsx", "pdf"]
+
+MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+WATERMARK_TEXT = "CostCorrect Free"
+DISCLAIMER = "AI-assisted suggested takeoff. Verify all quantities on site before procurement."
+
+_export_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+_export_cache = LRUCache(max_entries=EXPORT_CACHE_MAX_ENTRIES, ttl_s=EXPORT_CACHE_TTL_S)
+
+
+def clear_export_cache() -> None:
+    """Drop every cached report (keys are content hashes, so they can't be traced to a user)."""
+    _export_cache.clear()
+
+
+def boq_digest(boq: BOQResponse) -> str:
+    return hashlib.sha256(boq.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def _summary_rows(boq: BOQResponse) -> list[tuple[str, object]]:
+    a = boq.assumptions
+    return [
+        ("File", boq.filename),
+        ("Scale", boq.scale),
+        ("Brick Type", a.brick_type.value),
+        ("Wall Height (m)", a.wall_height_m),
+        ("Waste %", a.wastage_percent),
+        ("Floors", a.floors),
+        ("Net Wall Area (m²)", boq.net_wall_area_sqm),
+    ]
+
+
+def _total_rows(boq: BOQResponse) -> list[tuple[str, float]]:
+    rows = []
+    if boq.subtotal is not None:
+        rows.append(("Subtotal (excl. VAT)", boq.subtotal))
+    if boq.vat_amount is not None:
+        rows.append((f"VAT ({VAT_RATE:.0%})", boq.vat_amount))
+    if boq.total_estimated_cost is not None:
+        rows.append(("TOTAL", boq.total_estimated_cost))
+    return rows
+
+
+def boq_to_xlsx(boq: BOQResponse, watermark: bool = False) -> bytes:
+    """Build the workbook with openpyxl's streaming write-only mode."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Bill of Quantities")
+    for col, width in zip("ABCDEF", (34, 14, 10, 18, 22, 40)):
+        ws.column_dimensions[col].width = width
+
+    def bold(value) -> WriteOnlyCell:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = Font(bold=True)
+        return cell
+
+    def text(value):
+        # Filenames, items and Gemini's note are untrusted; openpyxl would
+        # store a string starting with "=" as a formula
+        if not isinstance(value, str):
+            return value
+        cell = WriteOnlyCell(ws, value=value)
+        cell.data_type = "s"
+        return cell
+
+    ws.append([bold("CostCorrect - Bill of Quantities")])
+    if watermark:
+        ws.append([f"{WATERMARK_TEXT}: upgrade to Pro for clean reports"])
+    for label, value in _summary_rows(boq):
+        ws.append([label, text(value)])
+    ws.append([])
+    ws.append([bold(h) for h in ("Item", "Quantity", "Unit", "Unit Price (ZAR)", "Estimated Cost (ZAR)", "Note")])
+    for mat in boq.materials:
+        ws.append([text(mat.item), mat.quantity, text(mat.unit), mat.unit_price, mat.estimated_cost, text(mat.note)])
+    ws.append([])
+    for label, value in _total_rows(boq):
+        ws.append([bold(label), None, None, None, value])
+    ws.append([])
+    ws.append(["AI Confidence Note", text(boq.confidence_note or "N/A")])
+    ws.append(["Generated", datetime.date.today().isoformat()])
+    ws.append(["Disclaimer", DISCLAIMER])
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _draw_watermark(canvas, doc) -> None:
+    canvas.saveState()
+    canvas.setFont("Helvetica-Bold", 56)
+    canvas.setFillColor(colors.Color(0.6, 0.6, 0.6, alpha=0.25))
+    canvas.translate(A4[0] / 2, A4[1] / 2)
+    canvas.rotate(45)
+    canvas.drawCentredString(0, 0, WATERMARK_TEXT)
+    canvas.restoreState()
+
+
+def boq_to_pdf(boq: BOQResponse, watermark: bool = False) -> bytes:
+    """Build a one-page A4 BOQ report with reportlab."""
+    styles = getSampleStyleSheet()
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buf, pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm, topMargin=18 * mm, bottomMargin=18 * mm,
+        title=f"CostCorrect BOQ - {boq.filename}", author="CostCorrect",
+    )
+    grid = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1d3557")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
+    ])
+
+    story = [
+        Paragraph("CostCorrect - Bill of Quantities", styles["Title"]),
+        Table([[label, str(value)] for label, value in _summary_rows(boq)], colWidths=[50 * mm, 110 * mm]),
+        Spacer(1, 6 * mm),
+    ]
+
+    materials = [["Item", "Quantity", "Unit", "Unit Price (R)", "Cost (R)"]]
+    for mat in boq.materials:
+        materials.append([
+            mat.item,
+            f"{mat.quantity:,.2f}",
+            mat.unit,
+            f"{mat.unit_price:,.2f}" if mat.unit_price is not None else "",
+            f"{mat.estimated_cost:,.2f}" if mat.estimated_cost is not None else "",
+        ])
+    for label, value in _total_rows(boq):
+        materials.append([label, "", "", "", f"{value:,.2f}"])
+    story.append(Table(materials, colWidths=[64 * mm, 26 * mm, 20 * mm, 26 * mm, 30 * mm], style=grid, repeatRows=1))
+    story.append(Spacer(1, 6 * mm))
+
+    for mat in (m for m in boq.materials if m.note):
+        story.append(Paragraph(f"<b>{escape(mat.item)}:</b> {escape(mat.note)}", styles["Normal"]))
+    # Paragraphs take reportlab markup; Gemini's note is untrusted text
+    story.append(Paragraph(f"<b>AI confidence note:</b> {escape(boq.confidence_note or 'N/A')}", styles["Normal"]))
+    story.append(Spacer(1, 4 * mm))
+    story.append(Paragraph(f"Generated {datetime.date.today().isoformat()}. {DISCLAIMER}", styles["Italic"]))
+
+    on_page = _draw_watermark if watermark else (lambda canvas, doc: None)
+    doc.build(story, onFirstPage=on_page, onLaterPages=on_page)
+    return buf.getvalue()
+
+
+_BUILDERS = {"xlsx": boq_to_xlsx, "pdf": boq_to_pdf}
+
+
+async def render_export(boq: BOQResponse, fmt: ExportFormat, watermark: bool) -> bytes:
+    """Return the report bytes, building them in the export pool on a cache miss."""
+    # Reports print the date they were generated, so yesterday's bytes aren't reused
+    key = (boq_digest(boq), fmt, watermark, datetime.date.today())
+    data = _export_cache.get(key)
+    if data is None:
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(_export_executor, _BUILDERS[fmt], boq, watermark)
+        _export_cache.set(key, data)
+    return data
@@ -0,0 +1,163 @@
+"""
+Background janitor for the local upload directory.
+
+LocalStorage keeps every upload forever, which eventually fills the disk.
+The janitor sweeps UPLOAD_DIR periodically and whenever recorded uploads
+push usage over the quota:
+
+  - page renders (<stem>_page<N>.png) are intermediates and always removed
+  - partial uploads (*.part) are removed once stale
+  - uploads older than `max_age_s` are removed
+  - while usage exceeds `quota_bytes`, the least recently used uploads go
+    first, but never ones younger than `min_age_s` (they may still be
+    queued for analysis)
+
+Only file names the storage layer produces are ever touched.
+"""
+
+import os
+import re
+import time
+import asyncio
+from pathlib import Path
+
+from config import (
+    UPLOAD_DIR,
+    UPLOAD_JANITOR_INTERVAL_S,
+    UPLOAD_MAX_AGE_S,
+    UPLOAD_QUOTA_BYTES,
+    UPLOAD_MIN_AGE_S,
+    UPLOAD_PART_MAX_AGE_S,
+)
+
+_UPLOAD_RE = re.compile(r"^[0-9a-f]{32}\.(pdf|png|jpg)$")
+_PART_RE = re.compile(r"^[0-9a-f]{32}\.part$")
+_PAGE_RENDER_RE = re.compile(r"^.+_page\d+\.png$")
+
+
+class UploadJanitor:
+    """Keeps a local upload directory under an age limit and a size quota."""
+
+    def __init__(
+        self,
+        base_dir: str = UPLOAD_DIR,
+        interval_s: float = UPLOAD_JANITOR_INTERVAL_S,
+        max_age_s: float = UPLOAD_MAX_AGE_S,
+        quota_bytes: int = UPLOAD_QUOTA_BYTES,
+        min_age_s: float = UPLOAD_MIN_AGE_S,
+        part_max_age_s: float = UPLOAD_PART_MAX_AGE_S,
+    ):
+        self.base_dir = Path(base_dir)
+        self.interval_s = interval_s
+        self.max_age_s = max_age_s
+        self.quota_bytes = quota_bytes
+        self.min_age_s = min_age_s
+        self.part_max_age_s = part_max_age_s
+
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.usage_bytes = 0          # as of the last sweep, plus uploads recorded since
+        self.files_removed = {"page_render": 0, "partial": 0, "age": 0, "quota": 0}
+        self.bytes_reclaimed = 0
+        self.sweeps = 0
+        self.last_sweep_s: float | None = None
+
+    def record_upload(self, size: int) -> None:
+        """Account for a new upload; sweeps early once it pushes usage over the quota."""
+        self.usage_bytes += size
+        if self._wakeup is not None and self.usage_bytes > self.quota_bytes:
+            self._wakeup.set()
+
+    def sweep(self, now: float | None = None) -> int:
+        """One pass over the directory (blocking). Returns bytes reclaimed."""
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        reclaimed = 0
+        uploads: list[tuple[float, float, int, Path]] = []  # (last used, modified, size, path)
+
+        try:
+            entries = list(os.scandir(self.base_dir))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            name, path = entry.name, Path(entry.path)
+            if _PAGE_RENDER_RE.match(name):
+                reclaimed += self._remove(path, st.st_size, "page_render")
+            elif _PART_RE.match(name):
+                if now - st.st_mtime > self.part_max_age_s:
+                    reclaimed += self._remove(path, st.st_size, "partial")
+            elif _UPLOAD_RE.match(name):
+                if now - st.st_mtime > self.max_age_s:
+                    reclaimed += self._remove(path, st.st_size, "age")
+                else:
+                    uploads.append((max(st.st_atime, st.st_mtime), st.st_mtime, st.st_size, path))
+
+        usage = sum(size for _, _, size, _ in uploads)
+        if usage > self.quota_bytes:
+            for _, mtime, size, path in sorted(uploads):
+                if usage <= self.quota_bytes:
+                    break
+                if now - mtime < self.min_age_s:
+                    continue
+                freed = self._remove(path, size, "quota")
+                reclaimed += freed
+                usage -= freed
+            if usage > self.quota_bytes:
+                print(f"Upload janitor: {usage} bytes of recent uploads exceed the {self.quota_bytes} byte quota")
+
+        self.usage_bytes = usage
+        self.bytes_reclaimed += reclaimed
+        self.sweeps += 1
+        self.last_sweep_s = time.perf_counter() - started
+        return reclaimed
+
+    def _remove(self, path: Path, size: int, reason: str) -> int:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f"Upload janitor: removing {path.name} failed: {e}")
+            return 0
+        self.files_removed[reason] += 1
+        return size
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="upload-janitor")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._wakeup = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Upload janitor sweep failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stats(self) -> dict:
+        return {
+            "usage_bytes": self.usage_bytes,
+            "quota_bytes": self.quota_bytes,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "files_removed": dict(self.files_removed),
+            "sweeps": self.sweeps,
+            "last_sweep_s": self.last_sweep_s,
+        }
@@ -0,0 +1,202 @@
+"""
+In-process background job queue.
+
+Slow work (plan analysis) is submitted as a coroutine factory and run by a
+fixed pool of asyncio worker tasks in this process, so no external broker is
+needed. Clients poll jobs by id; finished jobs are kept for `result_ttl_s`
+so their results can be fetched, then forgotten.
+"""
+
+import asyncio
+import time
+import uuid
+import datetime
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException
+
+from schemas import JobInfo, JobStatus
+
+
+def _iso(ts: float | None) -> str | None:
+    if ts is None:
+        return None
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+class Job:
+    """One unit of background work and its outcome."""
+
+    def __init__(
+        self,
+        seq: int,
+        fn: Callable[[], Awaitable[Any]],
+        owner: str | None,
+        on_cancel: Callable[[], Any] | None = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.seq = seq
+        self.fn: Callable[[], Awaitable[Any]] | None = fn
+        self.owner = owner
+        self.on_cancel = on_cancel
+        self.status = JobStatus.QUEUED
+        self.result: Any = None
+        self.error: str | None = None
+        self.error_status = 500
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+
+class JobQueue:
+    """FIFO queue of jobs run by `workers` concurrent worker tasks."""
+
+    def __init__(
+        self,
+        name: str,
+        workers: int = 4,
+        max_queue: int = 500,
+        result_ttl_s: float = 3600,
+        busy_detail: str = "Too many plans waiting for analysis. Please retry shortly.",
+    ):
+        self.name = name
+        self.busy_detail = busy_detail
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl_s = result_ttl_s
+
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+        self._jobs: dict[str, Job] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._submitted = 0
+        self._taken = 0
+        self._skipped = 0  # cancelled jobs taken off the queue without running
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        owner: str | None = None,
+        on_cancel: Callable[[], Any] | None = None,
+    ) -> Job:
+        """
+        Queue `fn()` to run in the background and return its Job at once.
+        `on_cancel` is kept for whoever cancels the job before it runs, e.g.
+        to remove its input. Raises 503 when the queue is full.
+        """
+        self._purge()
+        if self._queue.qsize() >= self.max_queue:
+            raise HTTPException(
+                status_code=503,
+                detail=self.busy_detail,
+                headers={"Retry-After": "30"},
+            )
+        job = Job(self._submitted, fn, owner, on_cancel)
+        self._submitted += 1
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str, owner: str | None = None) -> Job | None:
+        """Look up a job. Jobs submitted by a signed-in user are only visible to that user."""
+        job = self._jobs.get(job_id)
+        if job is None or self._expired(job, time.time()):
+            return None
+        if job.owner is not None and job.owner != owner:
+            return None
+        return job
+
+    def cancel_owner(self, owner: str, detail: str, status_code: int = 409) -> list[Job]:
+        """
+        Fail one owner's queued jobs without running them and return them
+        (their on_cancel callbacks are the caller's to run). Running jobs are
+        left to finish.
+        """
+        now = time.time()
+        queued = [j for j in self._jobs.values() if j.owner == owner and j.status == JobStatus.QUEUED]
+        for job in queued:
+            job.status, job.error, job.error_status = JobStatus.FAILED, detail, status_code
+            job.finished_at = now
+            job.fn = None
+        self.cancelled += len(queued)
+        return queued
+
+    def forget_owner(self, owner: str) -> int:
+        """Drop the finished jobs (and results) of one owner. Returns how many were dropped."""
+        done = [j.id for j in self._jobs.values() if j.owner == owner and j.finished_at is not None]
+        for job_id in done:
+            del self._jobs[job_id]
+        return len(done)
+
+    def info(self, job: Job) -> JobInfo:
+        return JobInfo(
+            job_id=job.id,
+            status=job.status,
+            # FIFO: everything submitted before this job and not yet taken is ahead of it
+            queue_position=job.seq - self._taken if job.status == JobStatus.QUEUED else None,
+            created_at=_iso(job.created_at),
+            started_at=_iso(job.started_at),
+            finished_at=_iso(job.finished_at),
+            error=job.error,
+        )
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._work(), name=f"job-worker:{self.name}:{i}")
+                for i in range(self.workers)
+            ]
+
+    async def stop(self) -> None:
+        """Cancel the workers. Queued and running jobs are lost with the process."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self._taken += 1
+            if job.status != JobStatus.QUEUED:
+                # Cancelled while it waited
+                self._skipped += 1
+                self._queue.task_done()
+                continue
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await job.fn()
+                job.status = JobStatus.SUCCEEDED
+                self.succeeded += 1
+            except HTTPException as exc:
+                job.status, job.error, job.error_status = JobStatus.FAILED, exc.detail, exc.status_code
+                self.failed += 1
+            except Exception as exc:
+                print(f"Job {job.id} ({self.name}) failed: {exc}")
+                job.status, job.error = JobStatus.FAILED, str(exc) or type(exc).__name__
+                self.failed += 1
+            finally:
+                job.finished_at = time.time()
+                job.fn = job.on_cancel = None  # release the closures (upload paths, assumptions)
+                self._queue.task_done()
+
+    def _expired(self, job: Job, now: float) -> bool:
+        return job.finished_at is not None and job.finished_at + self.result_ttl_s <= now
+
+    def _purge(self) -> None:
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values() if self._expired(j, now)]:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "running": self._taken - self._skipped - self.succeeded - self.failed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "workers": len(self._tasks),
+        }
@@ -5,35 +5,152 @@ Upload an architectural plan → Gemini Vision → SA BOQ.
 
 import io
 import os
+import asyncio
 import json
 import csv
+import time
 import datetime
 import stripe
+from typing import AsyncContextManager, Callable, Literal
+from contextlib import asynccontextmanager, nullcontext
+import numpy as np
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Header, Depends
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Header, Depends, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
 
-from storage import get_storage
-from vision import analyse_plan
-from calculator import calculate_boq
-from schemas import BOQResponse, CalculatorAssumptions, BrickType, UserDataExport
-from auth import get_current_user_tier, verify_token, get_supabase
+from storage import StoredFile, get_storage, open_stored, delete_stored
+from vision import StageCallback, TiledAnalysisDegraded, analyse_plan, analyse_plan_tiled, analyse_pages, tiled_metrics
+from vision_providers import get_vision_provider
+from calculator import calculate_boq, calculate_multi_floor_boq, sweep_scenarios
+from cache import get_vision_cache
+from measurements import get_measurement_store
+from writers import BatchWriter
+from archive import ZipStream
+from janitor import UploadJanitor
+from admission import AdmissionController
+from jobs import JobQueue
+from preprocess import preprocess_metrics
+from exports import MEDIA_TYPES, render_export, clear_export_cache
+from pagination import iter_rows, fetch_page, encode_cursor, decode_cursor
+from estimates import new_estimate_id, estimate_row, boq_from_row, estimate_summary, flatten_estimate, EXPORT_COLUMNS
+from schemas import (
+    BOQResponse,
+    CalculatorAssumptions,
+    BrickType,
+    WallMeasurement,
+    ScenarioSweepRequest,
+    ScenarioSweepResponse,
+    RecalculateRequest,
+    JobInfo,
+    JobStatus,
+    EstimatePage,
+    AdminUserPage,
+    AuditLogPage,
+    UserDataExport,
+)
+from auth import (
+    TIERS,
+    get_current_user_tier,
+    verify_token,
+    get_supabase,
+    invalidate_user_tier,
+    get_tier_counts,
+    start_jwks_refresher,
+)
 from config import (
+    MAX_UPLOAD_BYTES,
+    TRUSTED_PROXY_HOPS,
     STRIPE_SECRET_KEY,
     STRIPE_WEBHOOK_SECRET,
     STRIPE_PRO_PRICE_ID,
     ENABLE_PAYSTACK,
     PAYSTACK_SECRET_KEY,
     CLERK_WEBHOOK_SECRET,
+    STORAGE_BACKEND,
+    VISION_MAX_PAGES,
+    SCENARIO_MAX_COUNT,
+    AUDIT_QUEUE_MAX,
+    AUDIT_BATCH_SIZE,
+    AUDIT_FLUSH_INTERVAL_S,
+    JOB_WORKERS,
+    JOB_QUEUE_MAX,
+    JOB_RESULT_TTL_S,
+    BULK_EXPORT_PAGE_SIZE,
+    UPLOAD_CHUNK_BYTES,
+    POPIA_DELETE_WORKERS,
+    POPIA_DELETE_BATCH_SIZE,
+    POPIA_DELETE_TIMEOUT_S,
+    PAGE_SIZE_DEFAULT,
+    PAGE_SIZE_MAX,
+    ESTIMATE_QUEUE_MAX,
+    ESTIMATE_BATCH_SIZE,
+    ESTIMATE_FLUSH_INTERVAL_S,
 )
 
 stripe.api_key = STRIPE_SECRET_KEY
 
+audit_writer = BatchWriter(
+    "audit_logs",
+    max_queue=AUDIT_QUEUE_MAX,
+    batch_size=AUDIT_BATCH_SIZE,
+    flush_interval_s=AUDIT_FLUSH_INTERVAL_S,
+)
+
+estimates_writer = BatchWriter(
+    "estimates",
+    max_queue=ESTIMATE_QUEUE_MAX,
+    batch_size=ESTIMATE_BATCH_SIZE,
+    flush_interval_s=ESTIMATE_FLUSH_INTERVAL_S,
+)
+
+analysis_jobs = JobQueue("analysis", workers=JOB_WORKERS, max_queue=JOB_QUEUE_MAX, result_ttl_s=JOB_RESULT_TTL_S)
+
+admission = AdmissionController()
+
+upload_janitor = UploadJanitor() if STORAGE_BACKEND == "local" else None
+
+deletion_jobs = JobQueue(
+    "popia_delete",
+    workers=POPIA_DELETE_WORKERS,
+    max_queue=JOB_QUEUE_MAX,
+    result_ttl_s=JOB_RESULT_TTL_S,
+    busy_detail="Too many deletion requests in progress. Please retry shortly.",
+)
+
+# POPIA deletions: users with one pending or running (their uploads are
+# refused), and a per-user count of deletions requested. Uploads note the
+# count when admitted; if it has moved by the time their result would be
+# saved, the upload was overtaken by a deletion and nothing is kept.
+_deleting_users: set[str] = set()
+_deletion_epochs: dict[str, int] = {}
+_DELETING_DETAIL = "Your data is being deleted. Please try again once deletion has finished."
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Prefetch JWKS so the first authenticated request doesn't pay for it
+    await asyncio.to_thread(start_jwks_refresher)
+    await audit_writer.start()
+    await estimates_writer.start()
+    await analysis_jobs.start()
+    await deletion_jobs.start()
+    if upload_janitor is not None:
+        await upload_janitor.start()
+    yield
+    if upload_janitor is not None:
+        await upload_janitor.stop()
+    await deletion_jobs.stop()
+    await analysis_jobs.stop()
+    await estimates_writer.stop()
+    await audit_writer.stop()
+
+
 app = FastAPI(
     title="CostCorrect API",
     description="Upload an architectural plan and receive a South African Bill of Quantities.",
     version="0.2.0",
+    lifespan=lifespan,
 )
 
 # ── CORS ─────────────────────────────────────────────────────────────────────
@@ -50,24 +167,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ── Request body limit ───────────────────────────────────────────────────────
+# Form parsing spools the whole multipart body before an endpoint runs, so
+# oversized uploads are refused here: by Content-Length before any byte is
+# read, or as soon as a chunked body passes the limit.
+_FORM_OVERHEAD_BYTES = 1024 * 1024  # boundaries and the other form fields
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(
+            status_code=413, detail=f"File too large. Maximum is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > self.max_bytes:
+            error = self._too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Surfaces through the route like any HTTPException
+                    raise self._too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES + _FORM_OVERHEAD_BYTES)
+
 ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 
 async def _write_audit(user_id: str, action: str, resource: str = None, detail: str = None):
-    """Fire-and-forget audit log to Supabase."""
-    try:
-        supabase = get_supabase()
-        supabase.table("audit_logs").insert({
-            "user_id": user_id,
-            "action": action,
-            "resource": resource,
-            "detail": detail,
-            "created_at": datetime.datetime.utcnow().isoformat(),
-        }).execute()
-    except Exception as e:
-        print(f"Audit log failed (non-fatal): {e}")
+    """Fire-and-forget audit log: queued here, inserted in batches by audit_writer."""
+    audit_writer.submit({
+        "user_id": user_id,
+        "action": action,
+        "resource": resource,
+        "detail": detail,
+        "created_at": datetime.datetime.utcnow().isoformat(),
+    })
 
 
 def _boq_to_csv_bytes(boq: BOQResponse) -> bytes:
@@ -119,9 +280,7 @@ async def get_me(tier: str = Depends(get_current_user_tier)):
 
 # ── Main upload + analyse endpoint ────────────────────────────────────────────
 
-@app.post("/api/upload", response_model=BOQResponse)
-async def upload_plan(
-    file: UploadFile = File(...),
+def _assumptions_form(
     # Assumption fields (passed from frontend form)
     brick_type: str = Form("stock"),
     wall_height_m: float = Form(2.7),
@@ -132,46 +291,144 @@ async def upload_plan(
     include_vat: bool = Form(False),
     openings_area_sqm: float = Form(0.0),
     openings_wider_than_600mm: int = Form(0),
-    tier: str = Depends(get_current_user_tier),
-):
-    """
-    Accept an architectural plan (PDF/PNG/JPG), analyse it with
-    Gemini Vision, and return a Bill of Quantities.
-    """
-    if (floors > 1 or estimate_prices) and tier == "free":
-        raise HTTPException(
-            status_code=402,
-            detail="Multi-floor analysis and cost estimates are Pro features. Please upgrade.",
-        )
+) -> CalculatorAssumptions:
+    return CalculatorAssumptions(
+        brick_type=BrickType(brick_type),
+        wall_height_m=wall_height_m,
+        wastage_percent=wastage_percent,
+        mortar_joint_mm=mortar_joint_mm,
+        floors=floors,
+        estimate_prices=estimate_prices,
+        include_vat=include_vat,
+        openings_area_sqm=openings_area_sqm,
+        openings_wider_than_600mm=openings_wider_than_600mm,
+    )
 
-    filename = file.filename or "upload"
+
+async def _save_upload(file: UploadFile) -> StoredFile:
+    stored = await get_storage().save(file)
+    if upload_janitor is not None:
+        upload_janitor.record_upload(stored.size)
+    return stored
+
+
+def _check_extension(filename: str) -> str:
     ext = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
     if ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
             detail=f"Unsupported file type '{ext}'. Allowed: {ALLOWED_EXTENSIONS}",
         )
+    return ext
 
-    storage = get_storage()
-    saved_path = await storage.save(file)
 
+async def _measure(
+    saved_path: str,
+    digest: str,
+    page: int = 0,
+    tiled: bool = False,
+    on_stage: StageCallback | None = None,
+    admit: Callable[[], AsyncContextManager] | None = None,
+) -> WallMeasurement:
+    """
+    Vision analysis of one page, served from the cache when possible.
+    Cache misses run inside `admit()` (an admission slot) when given; tiled
+    analyses take one per Gemini call. A degraded tiled result is returned
+    but not cached, so the next upload of the plan retries the tiles.
+    """
+    # Re-uploads of the same plan (e.g. to try another brick type) skip Gemini
+    started = time.perf_counter()
+    cache = get_vision_cache(tiled)
+    measurement = await asyncio.to_thread(cache.get, digest, page) if cache else None
+    if measurement is not None and on_stage:
+        on_stage("cache_hit", time.perf_counter() - started)
+    if measurement is None:
+        try:
+            if tiled:
+                measurement = await analyse_plan_tiled(saved_path, page, on_stage=on_stage, admit=admit)
+            else:
+                async with admit() if admit else nullcontext():
+                    measurement = await analyse_plan(saved_path, page, on_stage=on_stage)
+        except TiledAnalysisDegraded as degraded:
+            return degraded.measurement
+        if cache:
+            await asyncio.to_thread(cache.set, digest, measurement, page)
+    return measurement
+
+
+def _check_pro_features(assumptions: CalculatorAssumptions, tier: str, tiled: bool = False) -> None:
+    if (assumptions.floors > 1 or assumptions.estimate_prices) and tier == "free":
+        raise HTTPException(
+            status_code=402,
+            detail="Multi-floor analysis and cost estimates are Pro features. Please upgrade.",
+        )
+    if tiled and tier == "free":
+        raise HTTPException(status_code=402, detail="Tiled analysis of large sheets is a Pro feature. Please upgrade.")
+
+
+def _check_admission(request: Request, tier: str, user_id: str | None, queue: bool = True) -> None:
+    """
+    Fast admission checks before an upload is stored: 503 if the analysis
+    queue has no room for this tier, 429 if the user (or, signed out, the
+    client IP) is over their tier's upload rate.
+    """
+    if user_id in _deleting_users:
+        raise HTTPException(status_code=409, detail=_DELETING_DETAIL)
+    if queue:
+        admission.check_capacity(tier)
+    admission.limit_rate(user_id or f"ip:{_client_ip(request)}", tier)
+
+
+def _client_ip(request: Request) -> str:
+    """
+    The client's address. Behind TRUSTED_PROXY_HOPS proxies it is the entry
+    they appended to X-Forwarded-For; entries further left come from the
+    client and could be anything.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = ",".join(request.headers.getlist("x-forwarded-for"))
+        hops = [h.strip() for h in forwarded.split(",") if h.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+async def _refuse_if_overtaken(user_id: str | None, epoch: int, stored: StoredFile) -> None:
+    """409, after purging the upload, if a deletion was requested since it was admitted."""
+    if user_id and _deletion_epochs.get(user_id, 0) != epoch:
+        await asyncio.to_thread(_purge_upload, stored.path, stored.sha256)
+        raise HTTPException(status_code=409, detail=_DELETING_DETAIL)
+
+
+async def _analyse_upload(
+    filename: str,
+    stored: StoredFile,
+    assumptions: CalculatorAssumptions,
+    tiled: bool = False,
+    on_stage: StageCallback | None = None,
+    user_id: str | None = None,
+    admit: Callable[[], AsyncContextManager] | None = None,
+    epoch: int = 0,
+) -> BOQResponse:
+    """
+    Vision analysis and BOQ for a saved upload; shared by the upload endpoints
+    and background jobs. Signed-in users' results are saved to their history,
+    unless a POPIA deletion was requested after the upload was admitted at
+    deletion `epoch` (then the upload is purged and this raises 409).
+    """
+    await _refuse_if_overtaken(user_id, epoch, stored)
     try:
-        measurement = await analyse_plan(saved_path)
+        measurement = await _measure(stored.path, stored.sha256, tiled=tiled, on_stage=on_stage, admit=admit)
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Gemini Vision analysis timed out. Please retry.")
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"Gemini Vision analysis failed: {exc}")
 
-    assumptions = CalculatorAssumptions(
-        brick_type=BrickType(brick_type),
-        wall_height_m=wall_height_m,
-        wastage_percent=wastage_percent,
-        mortar_joint_mm=mortar_joint_mm,
-        floors=floors,
-        estimate_prices=estimate_prices,
-        include_vat=include_vat,
-        openings_area_sqm=openings_area_sqm,
-        openings_wider_than_600mm=openings_wider_than_600mm,
-    )
+    await _refuse_if_overtaken(user_id, epoch, stored)
 
+    started = time.perf_counter()
     boq = calculate_boq(
         filename=filename,
         scale=measurement.scale,
@@ -180,10 +437,426 @@ async def upload_plan(
         assumptions=assumptions,
         confidence_note=measurement.confidence_note,
     )
+    boq.measurement_id = get_measurement_store().put(filename, stored.sha256, measurement)
+    if user_id:
+        estimate_id = new_estimate_id()
+        if estimates_writer.submit(estimate_row(estimate_id, user_id, boq, stored.sha256, stored.path)):
+            boq.estimate_id = estimate_id
+    if on_stage:
+        on_stage("calculate", time.perf_counter() - started)
+    return boq
+
+
+@app.post("/api/upload", response_model=BOQResponse)
+async def upload_plan(
+    request: Request,
+    file: UploadFile = File(...),
+    assumptions: CalculatorAssumptions = Depends(_assumptions_form),
+    tiled: bool = Form(False, description="Analyse a large-format sheet as overlapping tiles (Pro)."),
+    tier: str = Depends(get_current_user_tier),
+    user_id: str | None = Depends(verify_token),
+):
+    """
+    Accept an architectural plan (PDF/PNG/JPG), analyse it with
+    Gemini Vision, and return a Bill of Quantities.
+
+    Over the tier's upload rate: 429. When analysis is at capacity the
+    request queues (Pro ahead of free), or gets a 503 with Retry-After and
+    X-Queue-Position if the queue is full or the wait runs out.
+    """
+    _check_pro_features(assumptions, tier, tiled)
+
+    filename = file.filename or "upload"
+    _check_extension(filename)
+    _check_admission(request, tier, user_id)
+    epoch = _deletion_epochs.get(user_id, 0)
+
+    stored = await _save_upload(file)
+    return await _analyse_upload(
+        filename, stored, assumptions, tiled, user_id=user_id, admit=lambda: admission.slot(tier), epoch=epoch
+    )
+
+
+# ── Upload progress (Server-Sent Events) ──────────────────────────────────────
+
+# Per-stage timings from streamed uploads, for /api/admin/metrics (this worker only)
+_stage_timings: dict[str, dict] = {}
+
+
+def _record_stage(stage: str, elapsed_ms: float) -> None:
+    t = _stage_timings.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+    t["count"] += 1
+    t["total_ms"] += elapsed_ms
+    t["max_ms"] = max(t["max_ms"], elapsed_ms)
+
+
+def _retry_hints(exc: HTTPException) -> dict:
+    """Retry-After / X-Queue-Position of an error, for clients that can't see its headers."""
+    headers = exc.headers or {}
+    hints = {}
+    if "Retry-After" in headers:
+        hints["retry_after_s"] = int(headers["Retry-After"])
+    if "X-Queue-Position" in headers:
+        hints["queue_position"] = int(headers["X-Queue-Position"])
+    return hints
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/upload/stream")
+async def upload_plan_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    assumptions: CalculatorAssumptions = Depends(_assumptions_form),
+    tiled: bool = Form(False, description="Analyse a large-format sheet as overlapping tiles (Pro)."),
+    tier: str = Depends(get_current_user_tier),
+    user_id: str | None = Depends(verify_token),
+):
+    """
+    /api/upload with progress, as a Server-Sent Events stream.
+
+    Emits a `stage` event as each step completes (save, cache_hit or
+    queue/render/gemini/parse, calculate) with its duration and the time
+    since the request started, then a `result` event carrying the
+    BOQResponse, or an `error` event with the status the synchronous
+    endpoint would have returned. While waiting for an analysis slot,
+    `queued` events report the queue position.
+    """
+    started = time.perf_counter()
+    _check_pro_features(assumptions, tier, tiled)
+
+    filename = file.filename or "upload"
+    _check_extension(filename)
+    _check_admission(request, tier, user_id)
+    epoch = _deletion_epochs.get(user_id, 0)
+
+    stored = await _save_upload(file)
+    saved_s = time.perf_counter() - started
+
+    events: asyncio.Queue[tuple[str, dict] | None] = asyncio.Queue()
+
+    def on_stage(stage: str, elapsed_s: float) -> None:
+        elapsed_ms = round(elapsed_s * 1000, 1)
+        _record_stage(stage, elapsed_ms)
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        events.put_nowait(("stage", {"stage": stage, "elapsed_ms": elapsed_ms, "total_ms": total_ms}))
+
+    async def stream():
+        on_stage("save", saved_s)
+        def admit():
+            return admission.slot(tier, on_wait=lambda position: events.put_nowait(("queued", {"position": position})))
+
+        task = asyncio.create_task(_analyse_upload(filename, stored, assumptions, tiled, on_stage, user_id, admit, epoch))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (item := await events.get()) is not None:
+                yield _sse(*item)
+            try:
+                boq = task.result()
+            except HTTPException as exc:
+                yield _sse("error", {"status": exc.status_code, "detail": exc.detail, **_retry_hints(exc)})
+                return
+            yield _sse("result", boq.model_dump(mode="json"))
+        finally:
+            # Client disconnected: stop the analysis
+            task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ── Background analysis jobs ──────────────────────────────────────────────────
+
+@app.post("/api/upload/jobs", response_model=JobInfo, status_code=202)
+async def submit_upload_job(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    assumptions: CalculatorAssumptions = Depends(_assumptions_form),
+    tiled: bool = Form(False, description="Analyse a large-format sheet as overlapping tiles (Pro)."),
+    tier: str = Depends(get_current_user_tier),
+    user_id: str | None = Depends(verify_token),
+):
+    """
+    Like /api/upload, but returns as soon as the plan is stored.
+
+    Analysis runs on a background worker; poll GET /api/jobs/{job_id} and
+    fetch the BOQResponse from GET /api/jobs/{job_id}/result once it has
+    succeeded. Jobs are rate-limited like /api/upload but never time out
+    waiting for an analysis slot; the job queue itself bounds them.
+    """
+    _check_pro_features(assumptions, tier, tiled)
+
+    filename = file.filename or "upload"
+    _check_extension(filename)
+    _check_admission(request, tier, user_id, queue=False)
+    epoch = _deletion_epochs.get(user_id, 0)
+
+    stored = await _save_upload(file)
+    def admit():
+        return admission.slot(tier, wait_indefinitely=True)
+
+    job = analysis_jobs.submit(
+        lambda: _analyse_upload(filename, stored, assumptions, tiled, user_id=user_id, admit=admit, epoch=epoch),
+        owner=user_id,
+        on_cancel=lambda: _purge_upload(stored.path, stored.sha256),
+    )
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return analysis_jobs.info(job)
+
+
+def _get_job(job_id: str, user_id: str | None, queue: JobQueue = analysis_jobs):
+    job = queue.get(job_id, owner=user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return job
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str, user_id: str | None = Depends(verify_token)):
+    return analysis_jobs.info(_get_job(job_id, user_id))
+
+
+@app.get("/api/jobs/{job_id}/result", response_model=BOQResponse)
+async def get_job_result(job_id: str, user_id: str | None = Depends(verify_token)):
+    """The finished BOQ. Failed jobs return the error the synchronous upload would have."""
+    job = _get_job(job_id, user_id)
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=job.error_status, detail=job.error)
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job is {job.status.value}; poll /api/jobs/{job_id} until it succeeds.",
+            headers={"Retry-After": "2"},
+        )
+    return job.result
+
+
+@app.post("/api/recalculate", response_model=BOQResponse)
+async def recalculate(body: RecalculateRequest, tier: str = Depends(get_current_user_tier)):
+    """
+    Recompute the BOQ for an already-analysed plan with new assumptions.
+    Pure calculation: no file storage or Gemini call.
+    """
+    assumptions = body.assumptions
+    _check_pro_features(assumptions, tier)
+
+    stored = get_measurement_store().get(body.measurement_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Measurement not found or expired. Please re-upload the plan.")
+
+    measurement = stored.measurement
+    boq = calculate_boq(
+        filename=stored.filename,
+        scale=measurement.scale,
+        walls_230mm_linear_m=measurement.walls_230mm_linear_m,
+        walls_110mm_linear_m=measurement.walls_110mm_linear_m,
+        assumptions=assumptions,
+        confidence_note=measurement.confidence_note,
+    )
+    boq.measurement_id = body.measurement_id
+    return boq
+
+
+def _parse_pages(pages: str) -> list[int] | None:
+    """Parse a 1-based page list like "1,3-5" into 0-based indices (None = all)."""
+    if not pages.strip():
+        return None
+    result: set[int] = set()
+    for part in pages.split(","):
+        first, _, last = part.strip().partition("-")
+        try:
+            start, end = int(first), int(last or first)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid page list '{pages}'. Use e.g. '1,3-5'.")
+        if start < 1 or end < start:
+            raise HTTPException(status_code=400, detail=f"Invalid page range '{part.strip()}'.")
+        # Check the size before expanding, so "1-999999999" never allocates a huge range
+        if end - start + 1 > VISION_MAX_PAGES:
+            raise HTTPException(status_code=400, detail=f"Select between 1 and {VISION_MAX_PAGES} pages.")
+        result.update(range(start - 1, end))
+        if len(result) > VISION_MAX_PAGES:
+            raise HTTPException(status_code=400, detail=f"Select between 1 and {VISION_MAX_PAGES} pages.")
+    return sorted(result)
+
+
+@app.post("/api/upload/pages")
+async def upload_plan_pages(
+    request: Request,
+    file: UploadFile = File(...),
+    pages: str = Form("", description="1-based pages to analyse, e.g. '1,3-5'. Default: all."),
+    tiled: bool = Form(False, description="Analyse each sheet as overlapping tiles."),
+    assumptions: CalculatorAssumptions = Depends(_assumptions_form),
+    tier: str = Depends(get_current_user_tier),
+    user_id: str | None = Depends(verify_token),
+):
+    """
+    Analyse every floor of a multi-page PDF concurrently.
+
+    Streams newline-delimited JSON: one `page` (or `page_error`) event per
+    page as soon as it finishes, then a final `total` event carrying the
+    MultiFloorBOQResponse. Signed-in users' totals are saved to their
+    history with the uploaded plan.
+    """
+    if tier == "free":
+        raise HTTPException(status_code=402, detail="Multi-floor analysis is a Pro feature. Please upgrade.")
+
+    filename = file.filename or "upload"
+    if _check_extension(filename) != ".pdf":
+        raise HTTPException(status_code=400, detail="Multi-page analysis requires a PDF.")
+    page_indices = _parse_pages(pages)
+    _check_admission(request, tier, user_id)
+    epoch = _deletion_epochs.get(user_id, 0)
+
+    stored = await _save_upload(file)
+    saved_path, digest = stored.path, stored.sha256
+    floor_only = assumptions.model_copy(
+        update={"floors": 1, "openings_area_sqm": 0.0, "openings_wider_than_600mm": 0}
+    )
+
+    async def events():
+        done: list[tuple[int, WallMeasurement]] = []
+        failed: list[int] = []
+        try:
+            async for page, result in analyse_pages(
+                saved_path, page_indices,
+                measure=lambda p: _measure(saved_path, digest, p, tiled, admit=lambda: admission.slot(tier)),
+            ):
+                if isinstance(result, Exception):
+                    failed.append(page)
+                    event = {"event": "page_error", "page": page + 1, "detail": str(result) or type(result).__name__}
+                else:
+                    done.append((page, result))
+                    boq = calculate_boq(
+                        filename=f"{filename} (page {page + 1})",
+                        scale=result.scale,
+                        walls_230mm_linear_m=result.walls_230mm_linear_m,
+                        walls_110mm_linear_m=result.walls_110mm_linear_m,
+                        assumptions=floor_only,
+                        confidence_note=result.confidence_note,
+                    )
+                    event = {"event": "page", "page": page + 1, "boq": boq.model_dump(mode="json")}
+                yield json.dumps(event) + "\n"
+        finally:
+            # Runs even if the client went away mid-stream: the stored plan is
+            # either linked to the user's history (so POPIA export and deletion
+            # find it) or, if a deletion overtook the upload, purged
+            total = calculate_multi_floor_boq(filename, done, assumptions, failed_pages=failed)
+            if user_id and _deletion_epochs.get(user_id, 0) == epoch:
+                estimate_id = new_estimate_id()
+                if estimates_writer.submit(estimate_row(estimate_id, user_id, total.total, digest, saved_path)):
+                    total.total.estimate_id = estimate_id
+            elif user_id:
+                # Not awaited: a disconnected stream's cancellation would cancel it too
+                asyncio.get_running_loop().run_in_executor(None, _purge_upload, saved_path, digest)
+        yield json.dumps({"event": "total", "result": total.model_dump(mode="json")}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+# ── Estimate history ──────────────────────────────────────────────────────────
+
+def _require_user(user_id: str | None, detail: str = "Sign in to see your estimates.") -> str:
+    if not user_id:
+        raise HTTPException(status_code=401, detail=detail)
+    return user_id
+
+
+@app.get("/api/estimates", response_model=EstimatePage)
+async def list_estimates(
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: str | None = Query(None, description="`next_cursor` from the previous page"),
+    user_id: str | None = Depends(verify_token),
+):
+    """The signed-in user's saved estimates, newest first (keyset-paginated)."""
+    user_id = _require_user(user_id)
+    supabase = get_supabase()
 
+    def query():
+        # `result` is null for compact rows; legacy rows keep their figures only there
+        return (
+            supabase.table("estimates")
+            .select("id, filename, created_at, measurement, totals, result")
+            .eq("user_id", user_id)
+        )
+
+    rows, next_cursor = await asyncio.to_thread(
+        fetch_page, query, decode_cursor(cursor) if cursor else None, limit
+    )
+    return EstimatePage(
+        items=[estimate_summary(row) for row in rows],
+        next_cursor=encode_cursor(next_cursor) if next_cursor else None,
+    )
+
+
+@app.get("/api/estimates/{estimate_id}", response_model=BOQResponse)
+async def get_estimate(estimate_id: str, user_id: str | None = Depends(verify_token)):
+    """A saved estimate as a full BOQ, ready for /api/recalculate or export."""
+    user_id = _require_user(user_id)
+    supabase = get_supabase()
+    result = await asyncio.to_thread(
+        supabase.table("estimates").select("*").eq("id", estimate_id).eq("user_id", user_id).limit(1).execute
+    )
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Estimate not found.")
+    row = result.data[0]
+    boq = boq_from_row(row)
+    measurement = WallMeasurement(
+        scale=boq.scale,
+        walls_230mm_linear_m=boq.walls_230mm_linear_m,
+        walls_110mm_linear_m=boq.walls_110mm_linear_m,
+        confidence_note=boq.confidence_note,
+    )
+    boq.measurement_id = get_measurement_store().put(boq.filename, row.get("upload_sha256") or "", measurement)
     return boq
 
 
+# ── Scenario sweeps ───────────────────────────────────────────────────────────
+
+_COST_COLUMNS = ("subtotal", "vat_amount", "total_estimated_cost")
+
+
+@app.post("/api/scenarios", response_model=ScenarioSweepResponse)
+async def scenario_sweep(body: ScenarioSweepRequest, tier: str = Depends(get_current_user_tier)):
+    """
+    Compare a grid of assumption options across one or more measured plans.
+    Every plan × brick type × height × wastage × floors × VAT combination is
+    computed in a single vectorised pass.
+    """
+    grid = body.grid
+    count = len(body.measurements) * len(grid.brick_types) * len(grid.wall_heights_m) \
+        * len(grid.wastage_percents) * len(grid.floors) * len(grid.include_vat)
+    if count > SCENARIO_MAX_COUNT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sweep has {count} scenarios; the maximum is {SCENARIO_MAX_COUNT}.",
+        )
+    if (max(grid.floors) > 1 or body.base.estimate_prices) and tier == "free":
+        raise HTTPException(
+            status_code=402,
+            detail="Multi-floor analysis and cost estimates are Pro features. Please upgrade.",
+        )
+
+    results = await asyncio.to_thread(sweep_scenarios, body)
+
+    columns = {}
+    for name, values in results.items():
+        if name in _COST_COLUMNS:
+            if not body.base.estimate_prices:
+                continue
+            # NaN marks "not applicable" (e.g. VAT when excluded); JSON wants null
+            values = np.where(np.isnan(values), None, values)
+        columns[name] = values.tolist()
+
+    # Skip response-model re-validation of potentially 100k-element columns
+    return JSONResponse(content={"count": count, "columns": columns})
+
+
 # ── Export endpoints ──────────────────────────────────────────────────────────
 
 @app.post("/api/export/csv")
@@ -198,6 +871,28 @@ async def export_csv(boq: BOQResponse):
     )
 
 
+async def _report_response(boq: BOQResponse, fmt: str, tier: str) -> Response:
+    data = await render_export(boq, fmt, watermark=tier == "free")
+    filename = f"costcorrect_boq_{datetime.date.today()}.{fmt}"
+    return Response(
+        content=data,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.post("/api/export/xlsx")
+async def export_xlsx(boq: BOQResponse, tier: str = Depends(get_current_user_tier)):
+    """Excel export of a BOQ result (watermarked on the free tier)."""
+    return await _report_response(boq, "xlsx", tier)
+
+
+@app.post("/api/export/pdf")
+async def export_pdf(boq: BOQResponse, tier: str = Depends(get_current_user_tier)):
+    """PDF report of a BOQ result (watermarked on the free tier)."""
+    return await _report_response(boq, "pdf", tier)
+
+
 @app.post("/api/export/json")
 async def export_json(boq: BOQResponse):
     """Return BOQ as downloadable JSON (useful for integration)."""
@@ -251,12 +946,18 @@ async def stripe_webhook(
     if event["type"] == "customer.subscription.updated":
         sub = event["data"]["object"]
         status = sub.get("status")
-        customer_email = sub.get("customer_email")
+        customer_email = (sub.get("customer_email") or "").strip().lower()
         new_tier = "pro" if status == "active" else "free"
         if customer_email:
             try:
                 supabase = get_supabase()
-                supabase.table("profiles").update({"tier": new_tier}).eq("email", customer_email).execute()
+                result = supabase.table("profiles").update({"tier": new_tier}).eq("email", customer_email).execute()
+                updated_ids = [row["id"] for row in (result.data or []) if row.get("id")]
+                for user_id in updated_ids:
+                    invalidate_user_tier(user_id)
+                if not updated_ids:
+                    # Can't tell which user changed; don't risk serving a stale tier
+                    invalidate_user_tier()
             except Exception as e:
                 print(f"Failed to update tier in Supabase: {e}")
 
@@ -304,9 +1005,10 @@ async def clerk_webhook(
                     supabase = get_supabase()
                     supabase.table("profiles").insert({
                         "id": user_id,
-                        "email": primary_email,
+                        "email": primary_email.strip().lower(),  # stored lowercased for prefix search
                         "tier": "free",
                     }).execute()
+                    invalidate_user_tier(user_id)  # may be negatively cached from before the webhook
                     await _write_audit(user_id, "user.created", "profiles", primary_email)
                 except Exception as e:
                     print(f"Failed to insert user: {e}")
@@ -316,13 +1018,77 @@ async def clerk_webhook(
 
 # ── Admin Endpoints ────────────────────────────────────────────────────────────
 
-@app.get("/api/admin/users")
-async def admin_list_users(tier: str = Depends(get_current_user_tier)):
+def _like_prefix(prefix: str) -> str:
+    """
+    A LIKE pattern matching `prefix` at the start. PostgREST turns every `*`
+    into `%` before any escaping applies, so a literal `*` is sent as the
+    single-character wildcard `_`; callers drop the rare extra matches.
+    """
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "_") + "%"
+
+
+@app.get("/api/admin/users", response_model=AdminUserPage)
+async def admin_list_users(
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: str | None = Query(None, description="`next_cursor` from the previous page"),
+    tier_filter: Literal[TIERS] | None = Query(None, alias="tier"),
+    email_prefix: str | None = Query(None, max_length=254),
+    joined_after: datetime.datetime | None = Query(None, description="Inclusive"),
+    joined_before: datetime.datetime | None = Query(None, description="Exclusive"),
+    tier: str = Depends(get_current_user_tier),
+):
+    """Users, newest first, keyset-paginated and filtered in the database."""
     if tier != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     supabase = get_supabase()
-    result = supabase.table("profiles").select("id, email, tier, created_at").execute()
-    return result.data
+    prefix = email_prefix.strip().lower() if email_prefix else None
+
+    def query():
+        q = supabase.table("profiles").select("id, email, tier, created_at")
+        if tier_filter:
+            q = q.eq("tier", tier_filter)
+        if prefix:
+            # Emails are stored lowercased, so a case-sensitive LIKE can use the index
+            q = q.like("email", _like_prefix(prefix))
+        if joined_after:
+            q = q.gte("created_at", joined_after.isoformat())
+        if joined_before:
+            q = q.lt("created_at", joined_before.isoformat())
+        return q
+
+    (rows, next_cursor), tier_counts = await asyncio.gather(
+        asyncio.to_thread(fetch_page, query, decode_cursor(cursor) if cursor else None, limit),
+        asyncio.to_thread(get_tier_counts),
+    )
+    if prefix and "*" in prefix:
+        rows = [row for row in rows if (row.get("email") or "").startswith(prefix)]
+    return AdminUserPage(
+        items=rows,
+        next_cursor=encode_cursor(next_cursor) if next_cursor else None,
+        tier_counts=tier_counts,
+    )
+
+
+@app.get("/api/admin/metrics")
+async def admin_metrics(tier: str = Depends(get_current_user_tier)):
+    """In-process counters for background writers and caches (this worker only)."""
+    if tier != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    cache = get_vision_cache()
+    return {
+        "audit_writer": audit_writer.stats(),
+        "estimates_writer": estimates_writer.stats(),
+        "analysis_jobs": analysis_jobs.stats(),
+        "deletion_jobs": deletion_jobs.stats(),
+        "upload_janitor": upload_janitor.stats() if upload_janitor is not None else None,
+        "vision_provider": get_vision_provider().stats(),
+        "admission": admission.stats(),
+        "vision_cache": cache.stats() if cache else None,
+        "preprocess": preprocess_metrics(),
+        "tiled_analysis": tiled_metrics(),
+        "upload_stages": _stage_timings,
+    }
 
 
 @app.patch("/api/admin/users/{user_id}/tier")
@@ -330,87 +1096,333 @@ async def admin_update_tier(user_id: str, body: dict, tier: str = Depends(get_cu
     if tier != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     new_tier = body.get("tier")
-    if new_tier not in ("free", "pro", "admin"):
+    if new_tier not in TIERS:
         raise HTTPException(status_code=400, detail="Invalid tier")
     supabase = get_supabase()
     supabase.table("profiles").update({"tier": new_tier}).eq("id", user_id).execute()
+    invalidate_user_tier(user_id)
     return {"updated": True}
 
 
-@app.get("/api/admin/audit-logs")
-async def admin_audit_logs(tier: str = Depends(get_current_user_tier), limit: int = 100):
+def _audit_log_filters(
+    user_id: str | None = None,
+    action: str | None = None,
+    since: datetime.datetime | None = Query(None, description="Inclusive lower bound on created_at"),
+    until: datetime.datetime | None = Query(None, description="Exclusive upper bound on created_at"),
+) -> dict:
+    return {"user_id": user_id, "action": action, "since": since, "until": until}
+
+
+def _audit_log_query(filters: dict):
+    """A factory for audit_logs queries with `filters` applied (see pagination.fetch_page)."""
+    supabase = get_supabase()
+
+    def query():
+        q = supabase.table("audit_logs").select("id, user_id, action, resource, detail, created_at")
+        if filters["user_id"]:
+            q = q.eq("user_id", filters["user_id"])
+        if filters["action"]:
+            q = q.eq("action", filters["action"])
+        if filters["since"]:
+            q = q.gte("created_at", filters["since"].isoformat())
+        if filters["until"]:
+            q = q.lt("created_at", filters["until"].isoformat())
+        return q
+
+    return query
+
+
+@app.get("/api/admin/audit-logs", response_model=AuditLogPage)
+async def admin_audit_logs(
+    limit: int = Query(100, ge=1, le=PAGE_SIZE_MAX),
+    cursor: str | None = Query(None, description="`next_cursor` from the previous page"),
+    filters: dict = Depends(_audit_log_filters),
+    tier: str = Depends(get_current_user_tier),
+):
+    """Audit log entries, newest first, keyset-paginated over (created_at, id)."""
+    if tier != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    rows, next_cursor = await asyncio.to_thread(
+        fetch_page, _audit_log_query(filters), decode_cursor(cursor) if cursor else None, limit
+    )
+    return AuditLogPage(items=rows, next_cursor=encode_cursor(next_cursor) if next_cursor else None)
+
+
+@app.get("/api/admin/audit-logs/export")
+async def admin_export_audit_logs(
+    filters: dict = Depends(_audit_log_filters),
+    tier: str = Depends(get_current_user_tier),
+    admin_id: str | None = Depends(verify_token),
+):
+    """Stream every matching audit entry as NDJSON, one keyset page at a time."""
+    if tier != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    async def lines():
+        async for row in iter_rows(_audit_log_query(filters), BULK_EXPORT_PAGE_SIZE):
+            yield json.dumps(row, default=str) + "\n"
+
+    await _write_audit(admin_id, "admin.audit_logs.export", "audit_logs", json.dumps(filters, default=str))
+    filename = f"costcorrect_audit_logs_{datetime.date.today()}.ndjson"
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# Leading characters that make a spreadsheet evaluate a cell as a formula
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_line(values: list) -> str:
+    """One CSV row. Text that Excel would run as a formula (CSV injection) is prefixed with '."""
+    buf = io.StringIO()
+    csv.writer(buf).writerow(
+        "'" + value if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES) else value
+        for value in values
+    )
+    return buf.getvalue()
+
+
+@app.get("/api/admin/estimates/export")
+async def admin_export_estimates(
+    fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    user_id: str | None = None,
+    since: datetime.datetime | None = Query(None, description="Inclusive lower bound on created_at"),
+    until: datetime.datetime | None = Query(None, description="Exclusive upper bound on created_at"),
+    tier: str = Depends(get_current_user_tier),
+    admin_id: str | None = Depends(verify_token),
+):
+    """
+    Stream every matching estimate as CSV or NDJSON.
+
+    The table is paged through with a keyset cursor and rows are written as
+    they arrive, so memory stays constant however many estimates match and
+    the first bytes go out as soon as the first page is back.
+    """
     if tier != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     supabase = get_supabase()
-    result = supabase.table("audit_logs").select("*").order("created_at", desc=True).limit(limit).execute()
-    return result.data
+
+    def query():
+        q = supabase.table("estimates").select("*")
+        if user_id:
+            q = q.eq("user_id", user_id)
+        if since:
+            q = q.gte("created_at", since.isoformat())
+        if until:
+            q = q.lt("created_at", until.isoformat())
+        return q
+
+    async def lines():
+        if fmt == "csv":
+            yield _csv_line(EXPORT_COLUMNS)
+        async for row in iter_rows(query, BULK_EXPORT_PAGE_SIZE):
+            flat = flatten_estimate(row)
+            if fmt == "csv":
+                yield _csv_line([flat[col] for col in EXPORT_COLUMNS])
+            else:
+                yield json.dumps(flat, default=str) + "\n"
+
+    filters = {"user_id": user_id, "since": since, "until": until}
+    await _write_audit(admin_id, "admin.estimates.export", "estimates", json.dumps(filters, default=str))
+    filename = f"costcorrect_estimates_{datetime.date.today()}.{fmt}"
+    return StreamingResponse(
+        lines(),
+        media_type="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 # ── POPIA (Data Subject Rights) ────────────────────────────────────────────────
 
+POPIA_EXPORT_NOTE = "This export is provided under POPIA Section 23 (Right of Access)."
+
+
+async def _zip_upload(archive: ZipStream, name: str, path: str):
+    """Copy one stored upload into the archive chunk by chunk, yielding archive bytes."""
+    reader = await asyncio.to_thread(open_stored, path)
+    try:
+        with archive.open(name, compress=False) as member:
+            while chunk := await asyncio.to_thread(reader.read, UPLOAD_CHUNK_BYTES):
+                member.write(chunk)
+                if data := archive.drain():
+                    yield data
+    finally:
+        await asyncio.to_thread(reader.close)
+
+
 @app.get("/api/popia/export")
-async def popia_export(tier: str = Depends(get_current_user_tier), request: Request = None):
+async def popia_export(user_id: str | None = Depends(verify_token)):
     """
     POPIA Section 23: Data subject right to access their data.
-    Returns all data held for the authenticated user.
+    Streams a ZIP of everything held for the authenticated user: profile,
+    estimates, audit log and the uploaded plan files themselves.
     """
-    from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-    from auth import verify_token
-    from fastapi import Security
+    user_id = _require_user(user_id, "Authentication required")
+    supabase = get_supabase()
 
-    # Get user_id from token
-    auth_header = request.headers.get("authorization", "")
-    token = auth_header.replace("Bearer ", "") if auth_header.startswith("Bearer ") else None
-    if not token:
-        raise HTTPException(status_code=401, detail="Authentication required")
+    def estimates_query():
+        return supabase.table("estimates").select("*").eq("user_id", user_id)
 
-    import jwt as pyjwt
-    unverified = pyjwt.decode(token, options={"verify_signature": False})
-    user_id = unverified.get("sub")
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    def logs_query():
+        return supabase.table("audit_logs").select("*").eq("user_id", user_id)
 
-    supabase = get_supabase()
-    profile = supabase.table("profiles").select("*").eq("id", user_id).execute()
-    estimates = supabase.table("estimates").select("*").eq("user_id", user_id).execute()
-    logs = supabase.table("audit_logs").select("*").eq("user_id", user_id).execute()
-
-    export = {
-        "user_id": user_id,
-        "profile": profile.data,
-        "estimates": estimates.data if estimates.data else [],
-        "audit_logs": logs.data if logs.data else [],
-        "exported_at": datetime.datetime.utcnow().isoformat(),
-        "note": "This export is provided under POPIA Section 23 (Right of Access).",
-    }
+    # The first page of every source is fetched concurrently, before any bytes
+    # are sent, so a Supabase outage is still a clean error response
+    profile, first_estimates, first_logs = await asyncio.gather(
+        asyncio.to_thread(lambda: supabase.table("profiles").select("*").eq("id", user_id).execute().data),
+        asyncio.to_thread(fetch_page, estimates_query, None, BULK_EXPORT_PAGE_SIZE),
+        asyncio.to_thread(fetch_page, logs_query, None, BULK_EXPORT_PAGE_SIZE),
+    )
+    exported_at = datetime.datetime.utcnow().isoformat()
+
+    async def archive():
+        zf = ZipStream()
+        with zf.open("profile.json") as member:
+            member.write(json.dumps(profile or [], indent=2, default=str).encode("utf-8"))
+
+        # Each source keeps prefetching its next page while the current one is written
+        uploads: dict[str, str] = {}
+        with zf.open("estimates.ndjson") as member:
+            async for row in iter_rows(estimates_query, BULK_EXPORT_PAGE_SIZE, first_page=first_estimates):
+                member.write((json.dumps(row, default=str) + "\n").encode("utf-8"))
+                if row.get("upload_path"):
+                    uploads.setdefault(row["upload_path"], f"uploads/{os.path.basename(row['upload_path'])}")
+                if data := zf.drain():
+                    yield data
+
+        with zf.open("audit_logs.ndjson") as member:
+            async for row in iter_rows(logs_query, BULK_EXPORT_PAGE_SIZE, first_page=first_logs):
+                member.write((json.dumps(row, default=str) + "\n").encode("utf-8"))
+                if data := zf.drain():
+                    yield data
+
+        missing = []
+        for path, name in uploads.items():
+            try:
+                async for data in _zip_upload(zf, name, path):
+                    yield data
+            except Exception as e:
+                # Expired or already-deleted uploads are listed in export.json rather than failing the export
+                print(f"POPIA export of {path} failed: {e}")
+                missing.append(name)
+
+        with zf.open("export.json") as member:
+            member.write(json.dumps({
+                "user_id": user_id,
+                "exported_at": exported_at,
+                "uploads": [name for name in uploads.values() if name not in missing],
+                "missing_uploads": missing,
+                "note": POPIA_EXPORT_NOTE,
+            }, indent=2).encode("utf-8"))
+        yield zf.close()
 
     await _write_audit(user_id, "popia.export", "all_data")
-    return JSONResponse(content=export)
+    return StreamingResponse(
+        archive(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="costcorrect-data-{exported_at[:10]}.zip"'},
+    )
+
 
+def _purge_upload(path: str | None, digest: str | None) -> int:
+    """Remove one upload, its derived files and every cached result taken from it."""
+    removed = delete_stored(path) if path else 0
+    if digest:
+        for tiled in (False, True):
+            cache = get_vision_cache(tiled)
+            if cache is not None:
+                cache.evict_digest(digest)
+        get_measurement_store().evict_digest(digest)
+    return removed
 
-@app.delete("/api/popia/delete-my-data")
-async def popia_delete(request: Request):
+
+async def _delete_user_rows(user_id: str) -> dict:
     """
-    POPIA Section 24: Data subject right to deletion.
-    Deletes all personal data for the authenticated user (audit log retained for 1 year).
+    Delete a user's estimates one batch at a time, then their profile. Each
+    batch's rows go only after its files, so a failed or timed-out deletion
+    can simply be requested again and picks up where it stopped.
     """
-    auth_header = request.headers.get("authorization", "")
-    token = auth_header.replace("Bearer ", "") if auth_header.startswith("Bearer ") else None
-    if not token:
-        raise HTTPException(status_code=401, detail="Authentication required")
+    supabase = get_supabase()
 
-    import jwt as pyjwt
-    unverified = pyjwt.decode(token, options={"verify_signature": False})
-    user_id = unverified.get("sub")
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    def estimates_query():
+        return supabase.table("estimates").select("id, created_at, upload_path, upload_sha256").eq("user_id", user_id)
+
+    # Rows still buffered or being inserted for this user would otherwise land after the delete
+    await estimates_writer.flush()
+
+    deleted = {"estimates": 0, "files": 0}
+    cursor = None
+    while True:
+        rows, cursor = await asyncio.to_thread(fetch_page, estimates_query, cursor, POPIA_DELETE_BATCH_SIZE)
+        if not rows:
+            break
+        removed = await asyncio.gather(*(
+            asyncio.to_thread(_purge_upload, row.get("upload_path"), row.get("upload_sha256"))
+            for row in rows
+        ))
+        ids = [row["id"] for row in rows]
+        await asyncio.to_thread(lambda: supabase.table("estimates").delete().in_("id", ids).execute())
+        deleted["estimates"] += len(ids)
+        deleted["files"] += sum(removed)
+        if cursor is None:
+            break
+
+    await asyncio.to_thread(lambda: supabase.table("profiles").delete().eq("id", user_id).execute())
+    return deleted
+
+
+async def _delete_user_data(user_id: str) -> dict:
+    """
+    Background job: delete everything held for a user except the audit log.
+    Their queued analysis jobs are cancelled and their uploads purged first;
+    running analyses save nothing (see _refuse_if_overtaken).
+    """
+    try:
+        cancelled = analysis_jobs.cancel_owner(user_id, _DELETING_DETAIL)
+        await asyncio.gather(*(asyncio.to_thread(job.on_cancel) for job in cancelled if job.on_cancel))
+        deleted = await asyncio.wait_for(_delete_user_rows(user_id), timeout=POPIA_DELETE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Deletion did not finish in time. Please request it again.")
+    finally:
+        _deleting_users.discard(user_id)
+
+    invalidate_user_tier(user_id)
+    analysis_jobs.forget_owner(user_id)
+    clear_export_cache()
+    await _write_audit(
+        user_id, "popia.delete", "all_data",
+        f"Deleted {deleted['estimates']} estimates and {deleted['files']} files under POPIA",
+    )
+    return deleted
 
-    supabase = get_supabase()
-    supabase.table("estimates").delete().eq("user_id", user_id).execute()
-    supabase.table("profiles").delete().eq("id", user_id).execute()
-    await _write_audit(user_id, "popia.delete", "all_data", "User requested data deletion under POPIA")
 
-    return {"deleted": True, "message": "Your personal data has been deleted. Audit logs are retained for 1 year as required by compliance."}
+@app.delete("/api/popia/delete-my-data", status_code=202, response_model=JobInfo)
+async def popia_delete(response: Response, user_id: str | None = Depends(verify_token)):
+    """
+    POPIA Section 24: Data subject right to deletion.
+    Queues deletion of all personal data for the authenticated user (profile,
+    estimates, uploaded plans and cached results; the audit log is retained
+    for 1 year). Poll GET /api/popia/delete-my-data/{job_id} for progress.
+    """
+    user_id = _require_user(user_id, "Authentication required")
+    if user_id in _deleting_users:
+        raise HTTPException(status_code=409, detail="A deletion of your data is already in progress.")
+    job = deletion_jobs.submit(lambda: _delete_user_data(user_id), owner=user_id)
+    # From now on: refuse new uploads, and keep nothing from uploads already admitted
+    _deleting_users.add(user_id)
+    _deletion_epochs[user_id] = _deletion_epochs.get(user_id, 0) + 1
+    await _write_audit(user_id, "popia.delete_requested", "all_data")
+    response.headers["Location"] = f"/api/popia/delete-my-data/{job.id}"
+    return deletion_jobs.info(job)
+
+
+@app.get("/api/popia/delete-my-data/{job_id}", response_model=JobInfo)
+async def popia_delete_status(job_id: str, user_id: str | None = Depends(verify_token)):
+    user_id = _require_user(user_id, "Authentication required")
+    return deletion_jobs.info(_get_job(job_id, user_id, deletion_jobs))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+"""
+In-process store of vision results, addressed by measurement ID.
+
+`/api/upload` returns the ID alongside the BOQ so the estimator can re-run
+the calculator with new assumptions via `/api/recalculate`, without another
+upload or Gemini call.
+"""
+
+import uuid
+import functools
+from pydantic import BaseModel
+
+from cache import LRUCache
+from schemas import WallMeasurement
+from config import MEASUREMENT_STORE_MAX_ENTRIES, MEASUREMENT_STORE_TTL_S
+
+
+class StoredMeasurement(BaseModel):
+    filename: str
+    digest: str
+    measurement: WallMeasurement
+
+
+class MeasurementStore:
+    """Bounded, expiring map of measurement ID → StoredMeasurement."""
+
+    def __init__(self, max_entries: int = MEASUREMENT_STORE_MAX_ENTRIES, ttl_s: float = MEASUREMENT_STORE_TTL_S):
+        self._entries = LRUCache(max_entries=max_entries, ttl_s=ttl_s)
+
+    def put(self, filename: str, digest: str, measurement: WallMeasurement) -> str:
+        measurement_id = uuid.uuid4().hex
+        self._entries.set(measurement_id, StoredMeasurement(filename=filename, digest=digest, measurement=measurement))
+        return measurement_id
+
+    def get(self, measurement_id: str) -> StoredMeasurement | None:
+        return self._entries.get(measurement_id)
+
+    def evict_digest(self, digest: str) -> int:
+        """Forget every measurement taken from an upload. Returns how many were dropped."""
+        evicted = 0
+        for measurement_id in self._entries.keys():
+            stored = self._entries.get(measurement_id)
+            if stored is not None and stored.digest == digest:
+                self._entries.pop(measurement_id)
+                evicted += 1
+        return evicted
+
+
+@functools.lru_cache()
+def get_measurement_store() -> MeasurementStore:
+    return MeasurementStore()
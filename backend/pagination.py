@@ -0,0 +1,91 @@
+"""
+Keyset (cursor) pagination for Supabase / PostgREST queries.
+
+Rows are ordered by (created_at, id), newest first by default, and each
+page continues strictly after the (created_at, id) of the previous page's
+last row. Unlike limit/offset, every page is the same index range scan no
+matter how deep it is. Cursors are opaque to clients.
+"""
+
+import json
+import base64
+import asyncio
+from typing import Any, AsyncIterator, Callable
+
+from fastapi import HTTPException
+
+Cursor = tuple[str, str]  # (created_at, id) of the last row seen
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _quote(value: str) -> str:
+    # PostgREST needs reserved characters (commas, parentheses) inside or=() quoted
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def apply_keyset(query, cursor: Cursor | None, desc: bool = True, time_column: str = "created_at", id_column: str = "id"):
+    """Order a query by (time, id) and start it after `cursor`."""
+    query = query.order(time_column, desc=desc).order(id_column, desc=desc)
+    if cursor is not None:
+        op = "lt" if desc else "gt"
+        ts, row_id = _quote(cursor[0]), _quote(cursor[1])
+        query = query.or_(f"{time_column}.{op}.{ts},and({time_column}.eq.{ts},{id_column}.{op}.{row_id})")
+    return query
+
+
+def fetch_page(
+    make_query: Callable[[], Any], cursor: Cursor | None, limit: int, desc: bool = True
+) -> tuple[list[dict], Cursor | None]:
+    """
+    One page of rows and the cursor for the next (None on the last page).
+
+    `make_query` returns a fresh, already-filtered query builder; builders are
+    mutable, so each page needs its own.
+    """
+    rows = apply_keyset(make_query(), cursor, desc).limit(limit).execute().data or []
+    if len(rows) < limit:
+        return rows, None
+    return rows, (str(rows[-1]["created_at"]), str(rows[-1]["id"]))
+
+
+async def iter_rows(
+    make_query: Callable[[], Any],
+    page_size: int,
+    cursor: Cursor | None = None,
+    desc: bool = True,
+    first_page: tuple[list[dict], Cursor | None] | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Yield every matching row, one keyset page at a time.
+
+    The next page is fetched (in a thread) while the current one is being
+    consumed, so at most two pages are held in memory. Pass `first_page`
+    (a fetch_page result) to start from a page the caller already has.
+    """
+    if first_page is not None:
+        pending = asyncio.get_running_loop().create_future()
+        pending.set_result(first_page)
+    else:
+        pending = asyncio.ensure_future(asyncio.to_thread(fetch_page, make_query, cursor, page_size, desc))
+    try:
+        while True:
+            rows, cursor = await pending
+            if cursor is not None:
+                pending = asyncio.ensure_future(asyncio.to_thread(fetch_page, make_query, cursor, page_size, desc))
+            for row in rows:
+                yield row
+            if cursor is None:
+                return
+    finally:
+        pending.cancel()
@@ -0,0 +1,122 @@
+"""
+Plan image preprocessing between rasterisation and the Gemini call.
+
+  1. Grayscale — colour carries little for wall take-offs
+  2. Auto-crop to the drawing extents, trimming sheet margins and the
+     whitespace around the title block
+  3. Downscale to fit the token budget (Gemini bills 258 tokens per 768 px tile)
+  4. Optional bilevel threshold, then compact PNG encoding
+
+The WallMeasurement contract is unchanged; only the image sent differs.
+"""
+
+import io
+import math
+import hashlib
+import threading
+from PIL import Image, ImageOps
+
+from config import (
+    PREPROCESS_MODE,
+    PREPROCESS_MAX_TILES,
+    PREPROCESS_WHITE_THRESHOLD,
+    PREPROCESS_MARGIN_PX,
+)
+
+TOKENS_PER_TILE = 258
+TILE_PX = 768
+SMALL_IMAGE_PX = 384  # images within 384×384 cost a single tile
+
+# Identifies the preprocessing settings; part of the vision cache namespace so
+# a change to any of them doesn't keep serving results from the old images.
+PREPROCESS_VERSION: str = hashlib.sha256(
+    repr((PREPROCESS_MODE, PREPROCESS_MAX_TILES, PREPROCESS_WHITE_THRESHOLD, PREPROCESS_MARGIN_PX)).encode("utf-8")
+).hexdigest()[:12]
+
+# bytes_in/bytes_out only cover images that arrived encoded (PNG/JPEG uploads).
+# PDF renders and tiles have no encoded original to compare against; they
+# are counted under "renders" and in the token figures only.
+_metrics = {"images": 0, "renders": 0, "bytes_in": 0, "bytes_out": 0, "tokens_in": 0, "tokens_out": 0}
+_metrics_lock = threading.Lock()
+
+
+def estimate_tokens(width: int, height: int) -> int:
+    """Approximate Gemini input tokens for an image of this size."""
+    if width <= SMALL_IMAGE_PX and height <= SMALL_IMAGE_PX:
+        return TOKENS_PER_TILE
+    return math.ceil(width / TILE_PX) * math.ceil(height / TILE_PX) * TOKENS_PER_TILE
+
+
+def crop_to_drawing(gray: Image.Image, threshold: int = PREPROCESS_WHITE_THRESHOLD, margin: int = PREPROCESS_MARGIN_PX) -> Image.Image:
+    """Crop to the bounding box of non-paper pixels, keeping a small margin."""
+    ink = gray.point(lambda p: 255 if p < threshold else 0)
+    bbox = ink.getbbox()
+    if bbox is None:
+        return gray  # blank sheet; let Gemini say so
+    left, top, right, bottom = bbox
+    return gray.crop((
+        max(0, left - margin),
+        max(0, top - margin),
+        min(gray.width, right + margin),
+        min(gray.height, bottom + margin),
+    ))
+
+
+def max_square_px(max_tiles: int = PREPROCESS_MAX_TILES) -> int:
+    """Side of the largest square image fit_tile_budget leaves at full size."""
+    return math.isqrt(max(1, max_tiles)) * TILE_PX
+
+
+def fit_tile_budget(img: Image.Image, max_tiles: int = PREPROCESS_MAX_TILES) -> Image.Image:
+    """Downscale (never upscale) until the image costs at most max_tiles tiles."""
+    scale = 1.0
+    while estimate_tokens(int(img.width * scale), int(img.height * scale)) > max_tiles * TOKENS_PER_TILE:
+        scale *= 0.95
+    if scale == 1.0:
+        return img
+    size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+    return img.resize(size, Image.LANCZOS)
+
+
+def preprocess_plan(
+    img: Image.Image, bytes_in: int | None = None, mode: str = PREPROCESS_MODE, crop: bool = True
+) -> bytes:
+    """
+    Shrink a plan image for Gemini and return it as PNG bytes.
+
+    `bytes_in` is the size of the encoded upload that would otherwise have
+    been sent, or None for a render; it only feeds the savings metrics.
+    Pass crop=False when the prompt refers to positions within the image
+    (tiles), so only uniform downscaling is applied.
+    """
+    tokens_in = estimate_tokens(img.width, img.height)
+
+    gray = ImageOps.grayscale(img) if img.mode != "L" else img
+    out = fit_tile_budget(crop_to_drawing(gray) if crop else gray)
+    if mode == "bilevel":
+        # After downscaling, so thin lines that went grey still come out black
+        out = out.point(lambda p: 255 if p >= PREPROCESS_WHITE_THRESHOLD else 0, mode="1")
+
+    buf = io.BytesIO()
+    out.save(buf, format="PNG", optimize=True)
+    data = buf.getvalue()
+
+    with _metrics_lock:
+        _metrics["images"] += 1
+        if bytes_in is None:
+            _metrics["renders"] += 1
+        else:
+            _metrics["bytes_in"] += bytes_in
+            _metrics["bytes_out"] += len(data)
+        _metrics["tokens_in"] += tokens_in
+        _metrics["tokens_out"] += estimate_tokens(out.width, out.height)
+    return data
+
+
+def preprocess_metrics() -> dict:
+    """Cumulative preprocessing savings for this process."""
+    with _metrics_lock:
+        m = dict(_metrics)
+    m["bytes_saved"] = m["bytes_in"] - m["bytes_out"]
+    m["tokens_saved"] = m["tokens_in"] - m["tokens_out"]
+    return m
@@ -3,7 +3,7 @@ Pydantic models for the CostCorrect API.
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, Literal
+from typing import Optional, Literal, Annotated
 from enum import Enum
 
 
@@ -86,6 +86,105 @@ class BOQResponse(BaseModel):
 
     confidence_note: Optional[str] = None
 
+    measurement_id: Optional[str] = Field(
+        None, description="Pass to /api/recalculate to re-run with new assumptions without re-uploading"
+    )
+    estimate_id: Optional[str] = Field(None, description="ID in the signed-in user's estimate history")
+
+
+class RecalculateRequest(BaseModel):
+    """Re-run the calculator on a previously analysed plan."""
+    measurement_id: str
+    assumptions: CalculatorAssumptions = Field(default_factory=CalculatorAssumptions)
+
+
+class FloorBOQ(BaseModel):
+    """BOQ for a single analysed PDF page (one floor)."""
+    page: int = Field(..., description="1-based page number in the uploaded PDF")
+    measurement: WallMeasurement
+    boq: BOQResponse
+
+
+class MultiFloorBOQResponse(BaseModel):
+    """Per-floor and whole-building BOQ for a multi-page plan set."""
+    filename: str
+    floors: list[FloorBOQ]
+    failed_pages: list[int] = Field(default_factory=list, description="1-based pages Gemini could not analyse")
+    total: BOQResponse
+
+
+class ScenarioGrid(BaseModel):
+    """Option axes for a scenario sweep; every combination is evaluated."""
+    brick_types: list[BrickType] = Field([BrickType.STOCK], min_length=1)
+    wall_heights_m: list[Annotated[float, Field(ge=1.5, le=6.0)]] = Field([2.7], min_length=1)
+    wastage_percents: list[Annotated[float, Field(ge=0, le=30)]] = Field([10.0], min_length=1)
+    floors: list[Annotated[int, Field(ge=1, le=10)]] = Field([1], min_length=1)
+    include_vat: list[bool] = Field([False], min_length=1)
+
+
+class ScenarioSweepRequest(BaseModel):
+    """Plans × option grid to compare in one request."""
+    measurements: list[WallMeasurement] = Field(..., min_length=1, max_length=200)
+    grid: ScenarioGrid = Field(default_factory=ScenarioGrid)
+    base: CalculatorAssumptions = Field(
+        default_factory=CalculatorAssumptions,
+        description="Values for the assumptions that are not swept (openings, lintels, pricing)",
+    )
+
+
+class ScenarioSweepResponse(BaseModel):
+    """Column-oriented sweep results; `plan` indexes into the request's measurements."""
+    count: int
+    columns: dict[str, list]
+
+
+class EstimateSummary(BaseModel):
+    """One entry in a user's estimate history."""
+    id: str
+    filename: str
+    created_at: str
+    scale: str
+    total_bricks: Optional[int] = None
+    total_estimated_cost: Optional[float] = None
+
+
+class EstimatePage(BaseModel):
+    """A page of estimate history; pass `next_cursor` back as `cursor` for the next one."""
+    items: list[EstimateSummary]
+    next_cursor: Optional[str] = None
+
+
+class AdminUser(BaseModel):
+    id: str
+    email: str
+    tier: str
+    created_at: str
+
+
+class AdminUserPage(BaseModel):
+    """A page of users matching the filters, plus cached per-tier totals for all users."""
+    items: list[AdminUser]
+    next_cursor: Optional[str] = None
+    tier_counts: dict[str, int]
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobInfo(BaseModel):
+    """Status of a background job; poll until `status` is succeeded or failed."""
+    job_id: str
+    status: JobStatus
+    queue_position: Optional[int] = Field(None, description="Jobs ahead of this one while queued")
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+
 
 class ProjectCreate(BaseModel):
     """Request to create a new project."""
@@ -111,6 +210,21 @@ class AuditLog(BaseModel):
     timestamp: str
 
 
+class AuditLogEntry(BaseModel):
+    """Stored audit_logs row."""
+    id: str
+    user_id: Optional[str] = None
+    action: str
+    resource: Optional[str] = None
+    detail: Optional[str] = None
+    created_at: str
+
+
+class AuditLogPage(BaseModel):
+    items: list[AuditLogEntry]
+    next_cursor: Optional[str] = None
+
+
 class UserDataExport(BaseModel):
     """POPIA data export for a user."""
     user_id: str
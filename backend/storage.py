@@ -1,15 +1,91 @@
 """
 File storage abstraction for CostCorrect.
-Local storage for development; GCS-ready interface for production.
+Local storage for development; Google Cloud Storage for production.
+
+Uploads are streamed to storage in chunks. The same pass validates the file
+type by magic bytes, enforces MAX_UPLOAD_BYTES and computes the SHA-256, which
+is returned to the caller (e.g. as the vision cache key) in a StoredFile.
 """
 
 import os
 import uuid
-import shutil
+import asyncio
+import hashlib
+import tempfile
+import functools
 from pathlib import Path
-from fastapi import UploadFile
+from typing import Awaitable, BinaryIO, Callable
+from fastapi import UploadFile, HTTPException
+from pydantic import BaseModel
+
+from config import (
+    UPLOAD_DIR,
+    STORAGE_BACKEND,
+    MAX_UPLOAD_BYTES,
+    UPLOAD_CHUNK_BYTES,
+    GCS_ENDPOINT,
+    GCS_CHUNK_BYTES,
+    GCS_PARALLEL_THRESHOLD_BYTES,
+    GCS_PARALLEL_WORKERS,
+)
+
+# Leading bytes → canonical extension
+_MAGIC_BYTES = {
+    b"%PDF-": ".pdf",
+    b"\x89PNG\r\n\x1a\n": ".png",
+    b"\xff\xd8\xff": ".jpg",
+}
+_CONTENT_TYPES = {".pdf": "application/pdf", ".png": "image/png", ".jpg": "image/jpeg"}
+
+
+class StoredFile(BaseModel):
+    """Result of saving an upload."""
+    path: str          # location the vision stage reads from
+    name: str          # unique storage name (with canonical extension)
+    sha256: str
+    size: int
+
+
+def sniff_extension(head: bytes) -> str | None:
+    """Canonical extension for a PDF/PNG/JPEG header, else None."""
+    for magic, ext in _MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+async def _stream_upload(
+    file: UploadFile,
+    write: Callable[[bytes], Awaitable[None]],
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> tuple[str, str, int]:
+    """
+    Stream an upload through `write` chunk by chunk.
 
-from config import UPLOAD_DIR, STORAGE_BACKEND
+    Returns (extension, sha256, size). Raises 415 if the content is not a
+    PDF/PNG/JPEG and 413 as soon as it exceeds max_bytes; callers must discard
+    whatever was written in that case.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum is {max_bytes // (1024 * 1024)} MB.")
+
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        if ext is None:
+            ext = sniff_extension(chunk)
+            if ext is None:
+                raise HTTPException(status_code=415, detail="File content is not a PDF, PNG or JPEG.")
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum is {max_bytes // (1024 * 1024)} MB.")
+        digest.update(chunk)
+        await write(chunk)
+
+    if ext is None:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    return ext, digest.hexdigest(), size
 
 
 class LocalStorage:
@@ -19,40 +95,149 @@ class LocalStorage:
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
 
-    async def save(self, file: UploadFile) -> str:
-        """Save the uploaded file and return the stored path."""
-        ext = Path(file.filename or "upload").suffix
-        unique_name = f"{uuid.uuid4().hex}{ext}"
-        dest = self.base_dir / unique_name
+    async def save(self, file: UploadFile) -> StoredFile:
+        """Stream the upload to disk and return where it went, with its digest."""
+        stem = uuid.uuid4().hex
+        partial = self.base_dir / f"{stem}.part"
 
-        with open(dest, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        f = await asyncio.to_thread(open, partial, "wb")
+        try:
+            async def write(chunk: bytes) -> None:
+                await asyncio.to_thread(f.write, chunk)
 
-        return str(dest)
+            ext, sha256, size = await _stream_upload(file, write)
+        except BaseException:
+            await asyncio.to_thread(f.close)
+            partial.unlink(missing_ok=True)
+            raise
+        await asyncio.to_thread(f.close)
+
+        # Named by detected type, not the client's extension
+        dest = self.base_dir / f"{stem}{ext}"
+        os.replace(partial, dest)
+        return StoredFile(path=str(dest), name=dest.name, sha256=sha256, size=size)
 
     def get_path(self, filename: str) -> Path:
         return self.base_dir / filename
 
 
+@functools.lru_cache()
+def _gcs_client():
+    """One GCS client per process; its HTTP session pools connections."""
+    from google.cloud import storage as gcs
+
+    if GCS_ENDPOINT:
+        # Local emulator (e.g. fake-gcs-server): no real credentials needed
+        from google.auth.credentials import AnonymousCredentials
+        return gcs.Client(
+            project="costcorrect-local",
+            credentials=AnonymousCredentials(),
+            client_options={"api_endpoint": GCS_ENDPOINT},
+        )
+    return gcs.Client()
+
+
 class GCSStorage:
     """
-    Placeholder for Google Cloud Storage backend.
-    Pre-configured for POPIA-compliant SA regions.
+    Google Cloud Storage backend.
+    Pre-configured for POPIA-compliant SA regions (bucket in africa-south1).
+
+    Uploads stream straight into a resumable upload session. Large uploads of
+    known size are spooled to a temporary file and sent as parallel chunks.
+    Stored paths are `gs://bucket/uploads/<name>`.
     """
 
+    PREFIX = "uploads/"
+
     def __init__(self, bucket: str, region: str = "africa-south1"):
         self.bucket = bucket
         self.region = region
-        # In production, initialise the GCS client here:
-        # from google.cloud import storage
-        # self.client = storage.Client()
-        # self.bucket_obj = self.client.bucket(bucket)
-
-    async def save(self, file: UploadFile) -> str:
-        raise NotImplementedError(
-            "GCS storage is not yet implemented. "
-            "Set STORAGE_BACKEND=local for development."
-        )
+        self.bucket_obj = _gcs_client().bucket(bucket)
+
+    async def save(self, file: UploadFile) -> StoredFile:
+        # Name the object by detected type before anything is sent
+        head = await file.read(len(max(_MAGIC_BYTES, key=len)))
+        await file.seek(0)
+        ext = sniff_extension(head)
+        if ext is None:
+            raise HTTPException(status_code=415, detail="File content is not a PDF, PNG or JPEG.")
+
+        name = f"{uuid.uuid4().hex}{ext}"
+        blob = self.bucket_obj.blob(self.PREFIX + name, chunk_size=GCS_CHUNK_BYTES)
+        content_type = _CONTENT_TYPES[ext]
+
+        if file.size is not None and file.size > GCS_PARALLEL_THRESHOLD_BYTES:
+            _, sha256, size = await self._save_parallel(file, blob, content_type)
+        else:
+            writer = blob.open("wb", content_type=content_type)
+
+            async def write(chunk: bytes) -> None:
+                await asyncio.to_thread(writer.write, chunk)
+
+            # On error the resumable session is simply abandoned; nothing is committed
+            _, sha256, size = await _stream_upload(file, write)
+            await asyncio.to_thread(writer.close)
+
+        return StoredFile(path=f"gs://{self.bucket}/{blob.name}", name=name, sha256=sha256, size=size)
+
+    async def _save_parallel(self, file: UploadFile, blob, content_type: str) -> tuple[str, str, int]:
+        from google.cloud.storage import transfer_manager
+
+        with tempfile.NamedTemporaryFile(suffix=".part") as spool:
+            async def write(chunk: bytes) -> None:
+                await asyncio.to_thread(spool.write, chunk)
+
+            result = await _stream_upload(file, write)
+            await asyncio.to_thread(spool.flush)
+            await asyncio.to_thread(
+                transfer_manager.upload_chunks_concurrently,
+                spool.name,
+                blob,
+                content_type=content_type,
+                chunk_size=GCS_CHUNK_BYTES,
+                worker_type=transfer_manager.THREAD,
+                max_workers=GCS_PARALLEL_WORKERS,
+            )
+        return result
+
+    def get_path(self, filename: str) -> BinaryIO:
+        """Stream an object back (no local copy) as a seekable file-like reader."""
+        return self.bucket_obj.blob(self.PREFIX + filename).open("rb", chunk_size=GCS_CHUNK_BYTES)
+
+
+def open_stored(path: str) -> BinaryIO:
+    """Open a StoredFile.path for reading, whichever backend stored it."""
+    if path.startswith("gs://"):
+        bucket, _, key = path[len("gs://"):].partition("/")
+        return GCSStorage(bucket).get_path(key.removeprefix(GCSStorage.PREFIX))
+    return open(path, "rb")
+
+
+def delete_stored(path: str) -> int:
+    """
+    Delete a StoredFile.path, and for local files any page renders derived
+    from it. Missing files are not an error. Returns how many files went.
+    """
+    if path.startswith("gs://"):
+        from google.api_core.exceptions import NotFound
+
+        bucket, _, key = path[len("gs://"):].partition("/")
+        try:
+            GCSStorage(bucket).bucket_obj.blob(key).delete()
+        except NotFound:
+            return 0
+        return 1
+
+    upload = Path(path)
+    removed = 0
+    # Earlier versions rasterised PDFs to <stem>_page<N>.png beside the upload
+    for f in [upload, *upload.parent.glob(f"{upload.stem}_page*.png")]:
+        try:
+            f.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
 
 
 def get_storage():
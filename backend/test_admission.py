@@ -0,0 +1,118 @@
+"""
+Unit tests for admission control: token buckets and the priority queue.
+"""
+
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from admission import AdmissionController, _FREE, _PAID
+
+
+def _controller(**kwargs) -> AdmissionController:
+    settings = dict(max_in_flight=1, max_waiting=10, free_max_waiting=10, queue_timeout_s=5,
+                    rates={_FREE: (60, 2), _PAID: (600, 10)})
+    return AdmissionController(**{**settings, **kwargs})
+
+
+def test_token_bucket_allows_burst_then_429():
+    admission = _controller()
+    admission.limit_rate("user_free", "free")
+    admission.limit_rate("user_free", "free")
+    with pytest.raises(HTTPException) as exc:
+        admission.limit_rate("user_free", "free")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "1"
+    # Buckets are per user, and paid tiers get a bigger one
+    admission.limit_rate("user_other", "free")
+    for _ in range(10):
+        admission.limit_rate("user_pro", "pro")
+
+
+def test_pro_waiters_are_served_before_free():
+    order = []
+
+    async def scenario():
+        admission = _controller()
+
+        async def analyse(name, tier):
+            async with admission.slot(tier):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(analyse("first", "free"))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(analyse(f"free{i}", "free")) for i in range(2)]
+        await asyncio.sleep(0)
+        waiting += [asyncio.create_task(analyse(f"pro{i}", "pro")) for i in range(2)]
+        await asyncio.gather(first, *waiting)
+        return admission
+
+    admission = asyncio.run(scenario())
+    assert order == ["first", "pro0", "pro1", "free0", "free1"]
+    assert admission.stats()["in_flight"] == 0
+
+
+def test_full_queue_is_503_with_position():
+    async def scenario():
+        admission = _controller(free_max_waiting=1)
+        positions = []
+
+        async def hold(tier, on_wait=None):
+            async with admission.slot(tier, on_wait=on_wait):
+                await asyncio.sleep(0.05)
+
+        running = asyncio.create_task(hold("pro"))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(hold("free", positions.append))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            admission.check_capacity("free")
+        admission.check_capacity("pro")  # paid users can still queue
+        await asyncio.gather(running, queued)
+        return exc.value, positions
+
+    exc, positions = asyncio.run(scenario())
+    assert exc.status_code == 503
+    assert exc.headers["X-Queue-Position"] == "2"
+    assert int(exc.headers["Retry-After"]) >= 1
+    assert positions == [1]
+
+
+def test_queue_timeout_is_503_and_frees_the_place():
+    async def scenario():
+        admission = _controller(queue_timeout_s=0.01)
+
+        async def hold():
+            async with admission.slot("pro"):
+                await asyncio.sleep(0.05)
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            async with admission.slot("free"):
+                pass
+        await running
+        return admission, exc.value
+
+    admission, exc = asyncio.run(scenario())
+    assert exc.status_code == 503
+    assert admission.stats()["timed_out"] == 1
+    assert admission.stats()["waiting_free"] == 0
+    assert admission.stats()["in_flight"] == 0
+
+
+def test_anonymous_clients_are_keyed_by_the_trusted_forwarded_hop(monkeypatch):
+    import main
+    from starlette.requests import Request
+
+    def request(forwarded: str | None) -> Request:
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "headers": headers, "client": ("10.0.0.1", 443)})
+
+    monkeypatch.setattr(main, "TRUSTED_PROXY_HOPS", 0)
+    assert main._client_ip(request("203.0.113.9")) == "10.0.0.1"
+    monkeypatch.setattr(main, "TRUSTED_PROXY_HOPS", 1)
+    # The leftmost entry is whatever the client sent; the proxy appended the real one
+    assert main._client_ip(request("198.51.100.1, 203.0.113.9")) == "203.0.113.9"
+    assert main._client_ip(request(None)) == "10.0.0.1"
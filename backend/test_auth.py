@@ -0,0 +1,163 @@
+"""
+Unit tests for token verification and the subscription tier cache in auth.py.
+"""
+
+import json
+import threading
+import time
+import pytest
+import auth
+
+
+class _FakeProfiles:
+    """Minimal stand-in for supabase.table("profiles").select().eq().execute()."""
+
+    def __init__(self, tiers: dict[str, str], delay_s: float = 0.0):
+        self.tiers = tiers
+        self.delay_s = delay_s
+        self.queries = 0
+
+    def table(self, name):
+        return self
+
+    def select(self, columns, count=None, head=None):
+        return self
+
+    def eq(self, column, value):
+        self._column = column
+        self._value = value
+        return self
+
+    def execute(self):
+        self.queries += 1
+        time.sleep(self.delay_s)
+        if self._column == "tier":
+            count = sum(1 for t in self.tiers.values() if t == self._value)
+            return type("Response", (), {"data": [], "count": count})()
+        tier = self.tiers.get(self._value)
+        return type("Response", (), {"data": [{"tier": tier}] if tier else []})()
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    fake = _FakeProfiles({"user_pro": "pro"})
+    monkeypatch.setattr(auth, "get_supabase", lambda: fake)
+    monkeypatch.setattr(auth, "verify_token", lambda credentials: credentials)
+    auth.invalidate_user_tier()
+    yield fake
+    auth.invalidate_user_tier()
+
+
+def test_tier_is_cached(profiles):
+    assert auth.get_current_user_tier("user_pro") == "pro"
+    assert auth.get_current_user_tier("user_pro") == "pro"
+    assert profiles.queries == 1
+
+
+def test_missing_profile_is_negatively_cached(profiles):
+    assert auth.get_current_user_tier("user_new") == "free"
+    assert auth.get_current_user_tier("user_new") == "free"
+    assert profiles.queries == 1
+
+
+def test_invalidate_picks_up_tier_change(profiles):
+    assert auth.get_current_user_tier("user_pro") == "pro"
+    profiles.tiers["user_pro"] = "free"
+    auth.invalidate_user_tier("user_pro")
+    assert auth.get_current_user_tier("user_pro") == "free"
+    assert profiles.queries == 2
+
+
+def test_tier_counts_cached_until_a_tier_changes(profiles):
+    assert auth.get_tier_counts() == {"free": 0, "pro": 1, "admin": 0}
+    queries = profiles.queries
+    auth.get_tier_counts()
+    assert profiles.queries == queries
+    profiles.tiers["user_free"] = "free"
+    auth.invalidate_user_tier("user_free")
+    assert auth.get_tier_counts()["free"] == 1
+
+
+def test_concurrent_misses_query_once(profiles):
+    profiles.delay_s = 0.05
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(auth.get_current_user_tier("user_pro")))
+        for _ in range(10)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["pro"] * 10
+    assert profiles.queries == 1
+
+
+# ── verify_token ────────────────────────────────────────────────────────────
+
+ISSUER = "https://clerk.example.test"
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    """An RSA key registered as the prefetched JWKS of an allow-listed issuer."""
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.PyJWK.from_dict({**json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key())), "kid": "k1"})
+    monkeypatch.setattr(auth, "CLERK_ISSUERS", [ISSUER])
+    monkeypatch.setitem(auth._signing_keys, ISSUER, {"k1": jwk})
+    auth._verified_tokens.clear()
+    yield private_key
+    auth._verified_tokens.clear()
+
+
+def _token(private_key, iss: str = ISSUER, kid: str = "k1") -> auth.HTTPAuthorizationCredentials:
+    import jwt
+    token = jwt.encode(
+        {"sub": "user_1", "iss": iss, "exp": int(time.time()) + 60},
+        private_key, algorithm="RS256", headers={"kid": kid},
+    )
+    return auth.HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_verify_token_caches_until_expiry(signing_key):
+    credentials = _token(signing_key)
+    assert auth.verify_token(credentials) == "user_1"
+    # Second call is served from the cache, even with the keys gone
+    auth._signing_keys[ISSUER] = {}
+    assert auth.verify_token(credentials) == "user_1"
+
+
+def test_verify_token_rejects_unlisted_issuer(signing_key):
+    assert auth.verify_token(_token(signing_key, iss="https://evil.example.test")) is None
+    assert "https://evil.example.test" not in auth._jwks_clients
+
+
+def test_unknown_kid_schedules_refresh_without_blocking(signing_key, monkeypatch):
+    monkeypatch.setattr(auth, "_jwks_forced_at", float("-inf"))
+    auth._jwks_refresh_now.clear()
+    assert auth.verify_token(_token(signing_key, kid="rotated")) is None
+    assert auth._jwks_refresh_now.is_set()
+    auth._jwks_refresh_now.clear()
+
+
+def test_unknown_kid_refreshes_are_rate_limited(signing_key, monkeypatch):
+    monkeypatch.setattr(auth, "_jwks_forced_at", float("-inf"))
+    auth._jwks_refresh_now.clear()
+    assert auth.verify_token(_token(signing_key, kid="random-1")) is None
+    assert auth._jwks_refresh_now.is_set()
+    auth._jwks_refresh_now.clear()
+    # Within the interval, further unknown kids are rejected without another refresh
+    assert auth.verify_token(_token(signing_key, kid="random-2")) is None
+    assert not auth._jwks_refresh_now.is_set()
+
+
+def test_verify_token_rejects_everything_without_an_allow_list(signing_key, monkeypatch):
+    monkeypatch.setattr(auth, "CLERK_ISSUERS", [])
+    monkeypatch.setattr(auth, "CLERK_DEV_ANY_ISSUER", False)
+    # Self-hosted JWKS under an attacker-chosen `iss` is never fetched or trusted
+    assert auth.verify_token(_token(signing_key, iss="https://attacker.example.test")) is None
+    assert auth._dev_jwks_clients.get("https://attacker.example.test") is None
+    assert auth.verify_token(_token(signing_key)) is None
@@ -0,0 +1,93 @@
+"""
+Unit tests for the in-process and on-disk caches.
+"""
+
+import time
+from cache import LRUCache, VisionCache
+from schemas import WallMeasurement
+
+
+def _measurement(walls_230: float = 10.0) -> WallMeasurement:
+    return WallMeasurement(scale="1:100", walls_230mm_linear_m=walls_230, walls_110mm_linear_m=5.0)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")          # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_entry_expires():
+    cache = LRUCache(max_entries=10, ttl_s=60)
+    cache.set("short", "x", ttl_s=0.01)
+    cache.set("long", "y")
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get("long") == "y"
+
+
+def test_vision_cache_persists_across_instances(tmp_path):
+    """A second process (new instance, same file) should hit the disk tier."""
+    db = str(tmp_path / "vision.sqlite3")
+    VisionCache(namespace="m:v1", db_path=db).set("abc", _measurement())
+
+    cache = VisionCache(namespace="m:v1", db_path=db)
+    assert cache.get("abc") == _measurement()
+    assert cache.hits_disk == 1
+    assert cache.get("abc") == _measurement()
+    assert cache.hits_memory == 1
+
+
+def test_vision_cache_namespace_isolation(tmp_path):
+    """A new model or prompt version must not see old results."""
+    db = str(tmp_path / "vision.sqlite3")
+    VisionCache(namespace="m:v1", db_path=db).set("abc", _measurement())
+    assert VisionCache(namespace="m:v2", db_path=db).get("abc") is None
+
+
+def test_vision_cache_ttl_and_size_eviction(tmp_path):
+    db = str(tmp_path / "vision.sqlite3")
+    expired = VisionCache(namespace="m:v1", db_path=db, ttl_s=0)
+    expired.set("abc", _measurement())
+    assert VisionCache(namespace="m:v1", db_path=db, ttl_s=0).get("abc") is None
+
+    cache = VisionCache(namespace="m:v1", db_path=db, max_entries=3)
+    for i in range(VisionCache._EVICT_EVERY):
+        cache.set(f"d{i}", _measurement(float(i)))
+    (count,) = cache._db.execute("SELECT COUNT(*) FROM vision_cache").fetchone()
+    assert count == 3
+
+
+def test_vision_cache_evict_digest(tmp_path):
+    cache = VisionCache(namespace="m:v1", db_path=str(tmp_path / "vision.sqlite3"))
+    cache.set("abc", _measurement())
+    cache.evict_digest("abc")
+    assert cache.get("abc") is None
+
+
+def test_vision_cache_migrates_legacy_table(tmp_path):
+    """A cache file from before per-page keys keeps its entries, as page 0."""
+    import sqlite3
+    db = str(tmp_path / "vision.sqlite3")
+    legacy = sqlite3.connect(db)
+    legacy.execute(
+        "CREATE TABLE vision_cache (digest TEXT NOT NULL, namespace TEXT NOT NULL, value TEXT NOT NULL, "
+        "created_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (digest, namespace))"
+    )
+    now = time.time()
+    legacy.execute(
+        "INSERT INTO vision_cache VALUES (?, ?, ?, ?, ?)",
+        ("abc", "m:v1", _measurement().model_dump_json(), now, now),
+    )
+    legacy.commit()
+    legacy.close()
+
+    cache = VisionCache(namespace="m:v1", db_path=db)
+    assert cache.get("abc") == _measurement()
+    cache.set("abc", _measurement(20.0), page=2)
+    assert VisionCache(namespace="m:v1", db_path=db).get("abc", page=2) == _measurement(20.0)
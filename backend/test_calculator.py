@@ -2,6 +2,7 @@
 Unit tests for the SA brick calculation engine.
 """
 
+import itertools
 import math
 import pytest
 from calculator import calculate_boq
@@ -123,3 +124,100 @@ def test_zero_walls():
     assert boq.total_bricks == 0
     assert boq.cement_bags == 0.0
     assert boq.sand_cubes == 0.0
+
+
+def test_batch_matches_scalar_across_grid():
+    """calculate_boq_batch must reproduce calculate_boq exactly, scenario by scenario."""
+    from calculator import calculate_boq_batch
+    from schemas import CalculatorAssumptions
+
+    grid = list(itertools.product(
+        ["stock", "maxi"], [2.4, 2.55, 2.7, 3.0, 3.3], [0.0, 5.0, 12.5, 30.0], [False, True], [1, 3],
+    ))
+    walls_230, walls_110, openings = 37.43, 21.09, 18.6
+    batch = calculate_boq_batch(
+        walls_230mm_linear_m=walls_230,
+        walls_110mm_linear_m=walls_110,
+        brick_type=[g[0] for g in grid],
+        wall_height_m=[g[1] for g in grid],
+        wastage_percent=[g[2] for g in grid],
+        include_vat=[g[3] for g in grid],
+        floors=[g[4] for g in grid],
+        estimate_prices=True,
+        openings_area_sqm=openings,
+        openings_wider_than_600mm=3,
+    )
+
+    for i, (brick, height, wastage, vat, floors) in enumerate(grid):
+        boq = calculate_boq(
+            filename="grid.pdf",
+            scale="1:100",
+            walls_230mm_linear_m=walls_230,
+            walls_110mm_linear_m=walls_110,
+            assumptions=CalculatorAssumptions(
+                brick_type=brick, wall_height_m=height, wastage_percent=wastage, include_vat=vat,
+                floors=floors, estimate_prices=True, openings_area_sqm=openings, openings_wider_than_600mm=3,
+            ),
+        )
+        for field, values in batch.items():
+            expected = getattr(boq, field)
+            if expected is None:
+                assert math.isnan(values[i]), field
+            else:
+                assert values[i] == expected, field
+
+
+def test_sweep_scenarios_expands_full_grid():
+    from calculator import sweep_scenarios
+    from schemas import ScenarioSweepRequest, ScenarioGrid, WallMeasurement
+
+    request = ScenarioSweepRequest(
+        measurements=[
+            WallMeasurement(scale="1:100", walls_230mm_linear_m=10, walls_110mm_linear_m=5),
+            WallMeasurement(scale="1:100", walls_230mm_linear_m=20, walls_110mm_linear_m=0),
+        ],
+        grid=ScenarioGrid(brick_types=["stock", "maxi"], wall_heights_m=[2.4, 2.7, 3.0], wastage_percents=[5, 10]),
+    )
+    columns = sweep_scenarios(request)
+    assert len(columns["total_bricks"]) == 2 * 2 * 3 * 2
+    assert set(columns["plan"]) == {0, 1}
+    assert set(columns["brick_type"]) == {"stock", "maxi"}
+
+
+def test_multi_floor_boq_sums_pages_and_applies_openings_once():
+    from calculator import calculate_multi_floor_boq
+    from schemas import CalculatorAssumptions, WallMeasurement
+
+    pages = [
+        (2, WallMeasurement(scale="1:100", walls_230mm_linear_m=12, walls_110mm_linear_m=3, confidence_note="roof")),
+        (0, WallMeasurement(scale="1:100", walls_230mm_linear_m=30, walls_110mm_linear_m=10)),
+    ]
+    assumptions = CalculatorAssumptions(floors=5, openings_area_sqm=6.0)
+    result = calculate_multi_floor_boq("house.pdf", pages, assumptions, failed_pages=[1])
+
+    assert [floor.page for floor in result.floors] == [1, 3]
+    assert result.failed_pages == [2]
+    assert result.total.walls_230mm_linear_m == 42
+    assert result.total.walls_110mm_linear_m == 13
+    assert result.total.scale == "1:100"
+    assert result.total.assumptions.floors == 1
+    assert result.total.confidence_note == "Page 3: roof"
+    # Openings come off the building total only, not each floor
+    assert all(floor.boq.assumptions.openings_area_sqm == 0 for floor in result.floors)
+    assert result.total.net_wall_area_sqm < sum(floor.boq.net_wall_area_sqm for floor in result.floors)
+
+
+def test_multi_floor_boq_scale_when_pages_disagree_or_all_fail():
+    from calculator import calculate_multi_floor_boq
+    from schemas import WallMeasurement
+
+    mixed = calculate_multi_floor_boq("a.pdf", [
+        (0, WallMeasurement(scale="1:100", walls_230mm_linear_m=1, walls_110mm_linear_m=0)),
+        (1, WallMeasurement(scale="1:50", walls_230mm_linear_m=1, walls_110mm_linear_m=0)),
+    ])
+    assert mixed.total.scale == "mixed"
+
+    failed = calculate_multi_floor_boq("a.pdf", [], failed_pages=[0, 1])
+    assert failed.total.scale == "unknown"
+    assert failed.total.total_bricks == 0
+    assert failed.failed_pages == [1, 2]
@@ -0,0 +1,63 @@
+"""
+Unit tests for the compact estimate row format.
+"""
+
+import json
+from calculator import calculate_boq
+from estimates import estimate_row, boq_from_row, estimate_summary, flatten_estimate, EXPORT_COLUMNS
+from schemas import CalculatorAssumptions, BrickType
+
+
+def _boq():
+    return calculate_boq(
+        filename="house.pdf",
+        scale="1:100",
+        walls_230mm_linear_m=48.5,
+        walls_110mm_linear_m=22.25,
+        assumptions=CalculatorAssumptions(brick_type=BrickType.MAXI, estimate_prices=True, include_vat=True, floors=2),
+        confidence_note="Scale bar used",
+    )
+
+
+def _stored(row: dict) -> dict:
+    # What comes back from Supabase: plain JSON
+    return json.loads(json.dumps(row))
+
+
+def test_round_trip_reproduces_boq():
+    boq = _boq()
+    row = _stored(estimate_row("e1", "user_1", boq, upload_sha256="abc", upload_path="/uploads/x.pdf"))
+    restored = boq_from_row(row)
+    assert restored.estimate_id == "e1"
+    assert restored.model_dump(exclude={"estimate_id"}) == boq.model_dump(exclude={"estimate_id"})
+
+
+def test_stored_prices_survive_repricing():
+    row = _stored(estimate_row("e1", "user_1", _boq()))
+    row["materials"][0][3] = 1.23   # unit price at the time of saving
+    row["totals"]["total_estimated_cost"] = 999.0
+    restored = boq_from_row(row)
+    assert restored.materials[0].unit_price == 1.23
+    assert restored.total_estimated_cost == 999.0
+
+
+def test_row_is_compact():
+    boq = _boq()
+    row = estimate_row("e1", "user_1", boq)
+    assert len(json.dumps(row)) < len(boq.model_dump_json())
+    assert all(isinstance(line, list) for line in row["materials"])
+
+
+def test_legacy_rows_with_full_result():
+    boq = _boq()
+    row = {"id": "old", "user_id": "user_1", "filename": boq.filename, "created_at": "2025-01-01T00:00:00+00:00",
+           "result": json.loads(boq.model_dump_json())}
+    assert boq_from_row(row).total_bricks == boq.total_bricks
+    assert estimate_summary(row).total_bricks == boq.total_bricks
+    assert flatten_estimate(row)["scale"] == "1:100"
+
+
+def test_flatten_has_every_export_column():
+    flat = flatten_estimate(_stored(estimate_row("e1", "user_1", _boq())))
+    assert list(flat) == EXPORT_COLUMNS
+    assert flat["walls_230mm_linear_m"] == 48.5
@@ -0,0 +1,89 @@
+"""
+Unit tests for the XLSX / PDF report exports.
+"""
+
+import io
+import asyncio
+import datetime
+from types import SimpleNamespace
+from openpyxl import load_workbook
+
+import exports
+from calculator import calculate_boq
+from schemas import CalculatorAssumptions
+
+
+def _boq(**assumptions):
+    return calculate_boq(
+        filename="plan.pdf",
+        scale="1:100",
+        walls_230mm_linear_m=40,
+        walls_110mm_linear_m=25,
+        assumptions=CalculatorAssumptions(**assumptions),
+        confidence_note="Scale read from <title block> & dimensions",
+    )
+
+
+def test_xlsx_contains_materials_and_totals():
+    boq = _boq(estimate_prices=True)
+    ws = load_workbook(io.BytesIO(exports.boq_to_xlsx(boq))).active
+    values = [row for row in ws.iter_rows(values_only=True)]
+    items = [row[0] for row in values]
+    assert all(mat.item in items for mat in boq.materials)
+    assert ("TOTAL", None, None, None, boq.total_estimated_cost) in [tuple(r[:5]) for r in values]
+
+
+def test_xlsx_watermark_only_when_requested():
+    boq = _boq()
+    clean = load_workbook(io.BytesIO(exports.boq_to_xlsx(boq))).active
+    marked = load_workbook(io.BytesIO(exports.boq_to_xlsx(boq, watermark=True))).active
+    assert not any(exports.WATERMARK_TEXT in str(r[0]) for r in clean.iter_rows(values_only=True))
+    assert any(exports.WATERMARK_TEXT in str(r[0]) for r in marked.iter_rows(values_only=True))
+
+
+def test_pdf_builds_with_untrusted_markup():
+    data = exports.boq_to_pdf(_boq(estimate_prices=True), watermark=True)
+    assert data.startswith(b"%PDF")
+
+
+def test_render_export_caches_by_content(monkeypatch):
+    builds = []
+    monkeypatch.setitem(exports._BUILDERS, "pdf", lambda boq, watermark: builds.append(watermark) or b"%PDF")
+    exports._export_cache.clear()
+    boq = _boq()
+
+    async def scenario():
+        await exports.render_export(boq, "pdf", watermark=True)
+        await exports.render_export(boq.model_copy(), "pdf", watermark=True)
+        await exports.render_export(boq, "pdf", watermark=False)
+
+    asyncio.run(scenario())
+    assert builds == [True, False]
+    exports._export_cache.clear()
+
+
+def test_xlsx_writes_untrusted_text_as_strings_not_formulas():
+    boq = _boq().model_copy(update={"filename": '=HYPERLINK("http://x","y")', "confidence_note": "=1+1"})
+    ws = load_workbook(io.BytesIO(exports.boq_to_xlsx(boq))).active
+    cells = {row[0].value: row[1] for row in ws.iter_rows(min_col=1, max_col=2) if row[0].value}
+    assert cells["File"].value == '=HYPERLINK("http://x","y")'
+    assert cells["File"].data_type == "s"
+    assert cells["AI Confidence Note"].data_type == "s"
+
+
+def test_render_export_rebuilds_on_a_new_day(monkeypatch):
+    builds = []
+    monkeypatch.setitem(exports._BUILDERS, "pdf", lambda boq, watermark: builds.append(1) or b"%PDF")
+    exports._export_cache.clear()
+    boq = _boq()
+
+    class _Tomorrow(datetime.date):
+        @classmethod
+        def today(cls):
+            return datetime.date(2099, 1, 1)
+
+    asyncio.run(exports.render_export(boq, "pdf", watermark=False))
+    monkeypatch.setattr(exports, "datetime", SimpleNamespace(date=_Tomorrow))
+    asyncio.run(exports.render_export(boq, "pdf", watermark=False))
+    assert len(builds) == 2
+    exports._export_cache.clear()
@@ -0,0 +1,70 @@
+"""
+Unit tests for the upload directory janitor.
+"""
+
+import os
+import time
+import uuid
+
+from janitor import UploadJanitor
+
+NOW = time.time()
+
+
+def _file(dir, name: str, size: int, age_s: float):
+    path = dir / name
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (NOW - age_s, NOW - age_s))
+    return path
+
+
+def _upload(dir, size: int, age_s: float, ext: str = ".pdf"):
+    return _file(dir, f"{uuid.uuid4().hex}{ext}", size, age_s)
+
+
+def _janitor(dir, **kwargs) -> UploadJanitor:
+    settings = dict(max_age_s=86400, quota_bytes=10_000, min_age_s=60, part_max_age_s=3600)
+    return UploadJanitor(str(dir), **{**settings, **kwargs})
+
+
+def test_removes_page_renders_stale_parts_and_expired_uploads(tmp_path):
+    render = _file(tmp_path, "abc_page0.png", 100, 0)
+    stale_part = _file(tmp_path, f"{uuid.uuid4().hex}.part", 100, 7200)
+    live_part = _file(tmp_path, f"{uuid.uuid4().hex}.part", 100, 10)
+    expired = _upload(tmp_path, 100, 2 * 86400)
+    fresh = _upload(tmp_path, 100, 600)
+
+    janitor = _janitor(tmp_path)
+    assert janitor.sweep(NOW) == 300
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([live_part.name, fresh.name])
+    assert janitor.files_removed == {"page_render": 1, "partial": 1, "age": 1, "quota": 0}
+    assert janitor.stats()["usage_bytes"] == 100
+    assert not render.exists() and not stale_part.exists() and not expired.exists()
+
+
+def test_quota_evicts_least_recently_used_first(tmp_path):
+    oldest = _upload(tmp_path, 4000, 5000)
+    middle = _upload(tmp_path, 4000, 4000)
+    newest = _upload(tmp_path, 4000, 3000)
+
+    janitor = _janitor(tmp_path)
+    assert janitor.sweep(NOW) == 4000
+    assert not oldest.exists()
+    assert middle.exists() and newest.exists()
+    assert janitor.stats()["usage_bytes"] == 8000
+
+
+def test_quota_spares_uploads_that_may_still_be_queued(tmp_path):
+    _upload(tmp_path, 6000, 30)
+    _upload(tmp_path, 6000, 30)
+
+    janitor = _janitor(tmp_path)
+    assert janitor.sweep(NOW) == 0
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_ignores_files_it_did_not_create(tmp_path):
+    keep = _file(tmp_path, "vision.sqlite3", 50_000, 10 * 86400)
+    janitor = _janitor(tmp_path)
+    janitor.sweep(NOW)
+    assert keep.exists()
@@ -0,0 +1,130 @@
+"""
+Unit tests for the in-process background JobQueue.
+"""
+
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from jobs import JobQueue
+from schemas import JobStatus
+
+
+def test_runs_jobs_and_keeps_results():
+    async def scenario():
+        queue = JobQueue("test", workers=2)
+        await queue.start()
+
+        async def work(n):
+            await asyncio.sleep(0.01)
+            return n * 2
+
+        jobs = [queue.submit(lambda n=n: work(n)) for n in range(5)]
+        await queue._queue.join()
+        await queue.stop()
+        return queue, jobs
+
+    queue, jobs = asyncio.run(scenario())
+    assert [j.result for j in jobs] == [0, 2, 4, 6, 8]
+    assert all(j.status == JobStatus.SUCCEEDED for j in jobs)
+    assert queue.stats()["succeeded"] == 5
+
+
+def test_queue_position_counts_jobs_ahead():
+    queue = JobQueue("test", workers=1)
+    jobs = [queue.submit(lambda: asyncio.sleep(0)) for _ in range(3)]
+    assert [queue.info(j).queue_position for j in jobs] == [0, 1, 2]
+
+
+def test_failures_keep_http_status():
+    async def scenario():
+        queue = JobQueue("test", workers=1)
+        await queue.start()
+
+        async def not_found():
+            raise HTTPException(status_code=504, detail="timed out")
+
+        async def broken():
+            raise ValueError("bad json")
+
+        jobs = [queue.submit(not_found), queue.submit(broken)]
+        await queue._queue.join()
+        await queue.stop()
+        return jobs
+
+    timed_out, broken = asyncio.run(scenario())
+    assert (timed_out.status, timed_out.error_status, timed_out.error) == (JobStatus.FAILED, 504, "timed out")
+    assert (broken.error_status, broken.error) == (500, "bad json")
+
+
+def test_jobs_are_private_to_their_owner():
+    queue = JobQueue("test")
+    job = queue.submit(lambda: asyncio.sleep(0), owner="user_1")
+    assert queue.get(job.id, owner="user_1") is job
+    assert queue.get(job.id, owner="user_2") is None
+    assert queue.get(job.id) is None
+
+
+def test_full_queue_rejects_with_503():
+    queue = JobQueue("test", max_queue=1)
+    queue.submit(lambda: asyncio.sleep(0))
+    with pytest.raises(HTTPException) as exc:
+        queue.submit(lambda: asyncio.sleep(0))
+    assert exc.value.status_code == 503
+
+
+def test_finished_jobs_expire():
+    async def scenario():
+        queue = JobQueue("test", workers=1, result_ttl_s=0)
+        await queue.start()
+        job = queue.submit(lambda: asyncio.sleep(0))
+        await queue._queue.join()
+        await queue.stop()
+        return queue, job
+
+    queue, job = asyncio.run(scenario())
+    assert queue.get(job.id) is None
+
+
+def test_forget_owner_drops_only_their_finished_jobs():
+    async def scenario():
+        queue = JobQueue("test", workers=1)
+        await queue.start()
+        mine = queue.submit(lambda: asyncio.sleep(0, "boq"), owner="user_a")
+        theirs = queue.submit(lambda: asyncio.sleep(0, "boq"), owner="user_b")
+        await queue._queue.join()
+        pending = queue.submit(lambda: asyncio.sleep(0), owner="user_a")
+        dropped = queue.forget_owner("user_a")
+        await queue.stop()
+        return queue, mine, theirs, pending, dropped
+
+    queue, mine, theirs, pending, dropped = asyncio.run(scenario())
+    assert dropped == 1
+    assert queue.get(mine.id, owner="user_a") is None
+    assert queue.get(theirs.id, owner="user_b") is theirs
+    assert queue.get(pending.id, owner="user_a") is pending
+
+
+def test_cancel_owner_fails_their_queued_jobs_only():
+    async def scenario():
+        queue = JobQueue("test", workers=1)
+        await queue.start()
+        gate = asyncio.Event()
+        running = queue.submit(gate.wait, owner="user_a")
+        await asyncio.sleep(0)                    # let the worker take it
+        queued = queue.submit(lambda: asyncio.sleep(0, "boq"), owner="user_a", on_cancel=lambda: "purged")
+        theirs = queue.submit(lambda: asyncio.sleep(0, "boq"), owner="user_b")
+        cancelled = queue.cancel_owner("user_a", "Deleting your data.")
+        gate.set()
+        await queue._queue.join()
+        await queue.stop()
+        return queue, running, queued, theirs, cancelled
+
+    queue, running, queued, theirs, cancelled = asyncio.run(scenario())
+    assert cancelled == [queued]
+    assert queued.on_cancel() == "purged"
+    assert running.status == JobStatus.SUCCEEDED
+    assert queued.status == JobStatus.FAILED and queued.error_status == 409
+    assert queued.result is None
+    assert theirs.status == JobStatus.SUCCEEDED
+    assert queue.stats()["running"] == 0
@@ -0,0 +1,367 @@
+"""
+Endpoint tests for main.py. Storage, the vision cache, the estimates writer
+and the vision provider are replaced by local fakes; no Supabase or Gemini
+access is needed.
+"""
+
+import io
+import re
+import csv
+import json
+import time
+import asyncio
+from types import SimpleNamespace
+import pytest
+import fitz
+from PIL import Image
+from fastapi.testclient import TestClient
+
+import main
+import vision
+from admission import AdmissionController
+from auth import get_current_user_tier, verify_token
+from storage import LocalStorage
+from schemas import WallMeasurement
+from writers import BatchWriter
+
+ANSWER = '{"scale": "1:100", "walls_230mm_linear_m": 20.0, "walls_110mm_linear_m": 8.0}'
+
+
+def _pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page(width=200, height=200)
+    return doc.tobytes()
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("L", (64, 64), 255).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _Provider:
+    """Stands in for Gemini: the same answer for every call, after `delay_s`."""
+
+    def __init__(self, text: str = ANSWER, delay_s: float = 0.0):
+        self.text = text
+        self.delay_s = delay_s
+        self.calls = 0
+
+    async def generate(self, prompt, image_part):
+        self.calls += 1
+        await asyncio.sleep(self.delay_s)
+        return self.text
+
+    def stats(self) -> dict:
+        return {"provider": "test", "calls": self.calls}
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    fake = _Provider()
+    monkeypatch.setattr(vision, "get_vision_provider", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, provider):
+    monkeypatch.setattr(main, "get_storage", lambda: LocalStorage(str(tmp_path)))
+    monkeypatch.setattr(main, "get_vision_cache", lambda tiled=False: None)
+    monkeypatch.setattr(main, "upload_janitor", None)
+    monkeypatch.setattr(main, "estimates_writer", BatchWriter("estimates"))
+    monkeypatch.setattr(main, "admission", AdmissionController())
+    main.app.dependency_overrides[get_current_user_tier] = lambda: "pro"
+    main.app.dependency_overrides[verify_token] = lambda: "user_a"
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+def _ndjson(response) -> list[dict]:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+# ── Upload pipeline ──────────────────────────────────────────────────────────
+
+def test_upload_returns_a_boq(client, provider):
+    response = client.post("/api/upload", files={"file": ("plan.pdf", _pdf(1), "application/pdf")})
+    assert response.status_code == 200
+    assert response.json()["walls_230mm_linear_m"] == 20.0
+    assert provider.calls == 1
+
+
+def test_slow_gemini_call_is_504(client, provider, monkeypatch):
+    provider.delay_s = 1.0
+    monkeypatch.setattr(vision, "VISION_GEMINI_TIMEOUT_S", 0.01)
+    response = client.post("/api/upload", files={"file": ("plan.png", _png(), "image/png")})
+    assert response.status_code == 504
+    assert "timed out" in response.json()["detail"]
+
+
+def test_slow_render_is_504(client, provider, monkeypatch):
+    def slow_render(image_path, page):
+        time.sleep(0.2)
+
+    monkeypatch.setattr(vision, "_load_image_part", slow_render)
+    monkeypatch.setattr(vision, "VISION_RENDER_TIMEOUT_S", 0.01)
+    response = client.post("/api/upload", files={"file": ("plan.pdf", _pdf(1), "application/pdf")})
+    assert response.status_code == 504
+    assert provider.calls == 0
+
+
+# ── Upload progress stream ──────────────────────────────────────────────────
+
+def _sse(response) -> list[tuple[str, dict]]:
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class _BusyOnce(AdmissionController):
+    """The only slot is taken until the first waiter has been told its queue position."""
+
+    def __init__(self):
+        super().__init__(max_in_flight=1)
+        self._in_flight = 1
+        self._freed = False
+
+    def _notify_positions(self):
+        super()._notify_positions()
+        if self._waiters and not self._freed:
+            self._freed = True
+            asyncio.get_running_loop().call_soon(self._release)
+
+
+def test_stream_reports_stages_then_the_result(client, monkeypatch):
+    monkeypatch.setattr(main, "admission", _BusyOnce())
+    response = client.post("/api/upload/stream", files={"file": ("plan.pdf", _pdf(1), "application/pdf")})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse(response)
+
+    assert [(name, data.get("stage")) for name, data in events] == [
+        ("stage", "save"),
+        ("queued", None),
+        ("stage", "queue"),
+        ("stage", "render"),
+        ("stage", "gemini"),
+        ("stage", "parse"),
+        ("stage", "calculate"),
+        ("result", None),
+    ]
+    assert events[1][1] == {"position": 1}
+    totals = [data["total_ms"] for name, data in events if name == "stage"]
+    assert totals == sorted(totals)
+    assert events[-1][1]["walls_230mm_linear_m"] == 20.0
+    assert events[-1][1]["estimate_id"] == main.estimates_writer._rows[0]["id"]
+
+
+def test_stream_reports_a_full_queue_as_an_error_event_with_retry_hints(client, monkeypatch):
+    monkeypatch.setattr(main, "admission", AdmissionController(max_in_flight=0, queue_timeout_s=0.01))
+    response = client.post("/api/upload/stream", files={"file": ("plan.pdf", _pdf(1), "application/pdf")})
+    assert response.status_code == 200
+    events = _sse(response)
+
+    assert [name for name, _ in events] == ["stage", "queued", "error"]
+    error = events[-1][1]
+    assert error["status"] == 503
+    assert error["retry_after_s"] >= 1
+    assert error["queue_position"] == 1
+    assert not main.estimates_writer._rows
+
+
+# ── Multi-page uploads ───────────────────────────────────────────────────────
+
+def test_multi_page_upload_is_saved_to_the_users_history(client, tmp_path):
+    response = client.post("/api/upload/pages", files={"file": ("house.pdf", _pdf(2), "application/pdf")})
+    assert response.status_code == 200
+    events = _ndjson(response)
+    assert sorted(e["page"] for e in events if e["event"] == "page") == [1, 2]
+
+    total = events[-1]["result"]["total"]
+    (row,) = main.estimates_writer._rows
+    assert total["estimate_id"] == row["id"]
+    assert row["user_id"] == "user_a"
+    assert row["measurement"]["walls_230mm_linear_m"] == 40.0
+    # POPIA export and deletion find the plan through the row
+    assert row["upload_path"].startswith(str(tmp_path))
+
+
+def test_multi_page_errors_name_the_page_the_user_asked_for(client):
+    response = client.post(
+        "/api/upload/pages", data={"pages": "5"}, files={"file": ("house.pdf", _pdf(2), "application/pdf")}
+    )
+    error, total = _ndjson(response)
+    assert error == {"event": "page_error", "page": 5, "detail": "Page 5 is not in the document (2 pages)."}
+    assert total["result"]["failed_pages"] == [5]
+    assert total["result"]["total"]["scale"] == "unknown"
+
+
+def test_multi_page_upload_overtaken_by_a_deletion_is_purged(client, tmp_path, monkeypatch):
+    async def measure(*args, **kwargs):
+        main._deletion_epochs["user_a"] = main._deletion_epochs.get("user_a", 0) + 1
+        return WallMeasurement(scale="1:100", walls_230mm_linear_m=1.0, walls_110mm_linear_m=0.0)
+
+    monkeypatch.setattr(main, "_measure", measure)
+    monkeypatch.setattr(main, "_deletion_epochs", {})
+    response = client.post(
+        "/api/upload/pages", data={"pages": "1"}, files={"file": ("house.pdf", _pdf(1), "application/pdf")}
+    )
+    assert _ndjson(response)[-1]["result"]["total"]["estimate_id"] is None
+    assert not main.estimates_writer._rows
+    for _ in range(100):                    # the purge runs in the background
+        if not any(tmp_path.iterdir()):
+            break
+        time.sleep(0.01)
+    assert not any(tmp_path.iterdir())
+
+
+# ── Admin exports ────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def admin(client, monkeypatch):
+    monkeypatch.setattr(main, "get_supabase", lambda: None)
+    monkeypatch.setattr(main, "audit_writer", BatchWriter("audit_logs"))
+    main.app.dependency_overrides[get_current_user_tier] = lambda: "admin"
+    return client
+
+
+def _serve_rows(monkeypatch, rows: list[dict]):
+    async def iter_rows(make_query, page_size, *args, **kwargs):
+        for row in rows:
+            yield row
+
+    monkeypatch.setattr(main, "iter_rows", iter_rows)
+
+
+def test_estimate_csv_export_neutralises_formulas(admin, monkeypatch):
+    from estimates import EXPORT_COLUMNS
+
+    rows = [
+        {"id": "e1", "user_id": "u1", "filename": '=HYPERLINK("http://x","y")', "created_at": "2026-01-02",
+         "measurement": {"scale": "1:100", "walls_230mm_linear_m": 1.5, "walls_110mm_linear_m": -0.0}, "totals": {}},
+        {"id": "e2", "user_id": "u1", "filename": "@SUM(A1)", "created_at": "2026-01-01",
+         "measurement": {"scale": "-1", "walls_230mm_linear_m": 2.0, "walls_110mm_linear_m": 0.0}, "totals": {}},
+    ]
+    _serve_rows(monkeypatch, rows)
+    response = admin.get("/api/admin/estimates/export", params={"format": "csv"})
+    assert response.status_code == 200
+    header, first, second = list(csv.reader(io.StringIO(response.text)))
+    assert header == EXPORT_COLUMNS
+    cell = dict(zip(header, first))
+    assert cell["filename"] == '\'=HYPERLINK("http://x","y")'
+    assert cell["walls_230mm_linear_m"] == "1.5"          # numbers are left alone
+    assert dict(zip(header, second))["filename"] == "'@SUM(A1)"
+    assert dict(zip(header, second))["scale"] == "'-1"
+
+
+# ── Audit logs ──────────────────────────────────────────────────────────────
+
+class _FakeQuery:
+    """Just enough of a PostgREST query builder to filter, order and keyset-page rows."""
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.filters = []
+        self.limit_n = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row[column] >= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row[column] < value)
+        return self
+
+    def order(self, column, desc=False):
+        assert desc
+        return self
+
+    def or_(self, expression):
+        # created_at.lt."<ts>",and(created_at.eq."<ts>",id.lt."<id>")
+        after_ts, _, after_id = re.findall(r'"([^"]*)"', expression)
+        self.filters.append(lambda row: (row["created_at"], row["id"]) < (after_ts, after_id))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def execute(self):
+        rows = [row for row in self.rows if all(f(row) for f in self.filters)]
+        rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+        return SimpleNamespace(data=rows[: self.limit_n])
+
+
+AUDIT_ROWS = [
+    {"id": f"log{i}", "user_id": f"user_{i % 2}", "action": "popia.export" if i % 3 == 0 else "user.created",
+     "resource": None, "detail": None, "created_at": f"2026-03-{i // 2 + 1:02d}T10:00:00+00:00"}
+    for i in range(8)
+]
+
+
+@pytest.fixture
+def audit_logs(admin, monkeypatch):
+    tables = []
+
+    def table(name):
+        tables.append(name)
+        return _FakeQuery(AUDIT_ROWS)
+
+    monkeypatch.setattr(main, "get_supabase", lambda: SimpleNamespace(table=table))
+    return tables
+
+
+def _expected(**filters) -> list[str]:
+    rows = [r for r in AUDIT_ROWS if all(r[k] == v for k, v in filters.items())]
+    return [r["id"] for r in sorted(rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)]
+
+
+def test_audit_logs_are_filtered(admin, audit_logs):
+    response = admin.get("/api/admin/audit-logs", params={"user_id": "user_0", "action": "popia.export"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == _expected(user_id="user_0", action="popia.export")
+    assert set(audit_logs) == {"audit_logs"}
+
+    window = admin.get("/api/admin/audit-logs", params={
+        "since": "2026-03-02T10:00:00+00:00", "until": "2026-03-04T10:00:00+00:00",
+    }).json()["items"]
+    assert {item["created_at"][:10] for item in window} == {"2026-03-02", "2026-03-03"}
+
+
+def test_audit_logs_page_through_every_match_once(admin, audit_logs):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = admin.get("/api/admin/audit-logs", params=params).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == _expected()
+
+
+def test_audit_logs_are_admin_only(client, audit_logs):
+    main.app.dependency_overrides[get_current_user_tier] = lambda: "pro"
+    assert client.get("/api/admin/audit-logs").status_code == 403
+    assert client.get("/api/admin/audit-logs/export").status_code == 403
+
+
+def test_audit_log_export_streams_every_filtered_row(admin, audit_logs, monkeypatch):
+    monkeypatch.setattr(main, "BULK_EXPORT_PAGE_SIZE", 2)
+    response = admin.get("/api/admin/audit-logs/export", params={"user_id": "user_1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [row["id"] for row in _ndjson(response)] == _expected(user_id="user_1")
+    (audit,) = main.audit_writer._rows
+    assert audit["action"] == "admin.audit_logs.export"
+    assert json.loads(audit["detail"])["user_id"] == "user_1"
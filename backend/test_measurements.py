@@ -0,0 +1,73 @@
+"""
+Unit tests for the measurement store behind /api/recalculate.
+"""
+
+import time
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from measurements import MeasurementStore
+from schemas import WallMeasurement, RecalculateRequest
+
+
+def _measurement(walls_230: float = 10.0) -> WallMeasurement:
+    return WallMeasurement(scale="1:100", walls_230mm_linear_m=walls_230, walls_110mm_linear_m=5.0)
+
+
+def test_put_and_get_round_trip():
+    store = MeasurementStore()
+    measurement_id = store.put("plan.pdf", "abc", _measurement())
+    stored = store.get(measurement_id)
+    assert stored.filename == "plan.pdf"
+    assert stored.digest == "abc"
+    assert stored.measurement == _measurement()
+    assert store.get("unknown") is None
+
+
+def test_entries_expire():
+    store = MeasurementStore(ttl_s=0.01)
+    measurement_id = store.put("plan.pdf", "abc", _measurement())
+    time.sleep(0.02)
+    assert store.get(measurement_id) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    store = MeasurementStore(max_entries=2)
+    first = store.put("a.pdf", "a", _measurement(1.0))
+    second = store.put("b.pdf", "b", _measurement(2.0))
+    store.get(first)                      # "second" is now the oldest
+    third = store.put("c.pdf", "c", _measurement(3.0))
+    assert store.get(second) is None
+    assert store.get(first) is not None
+    assert store.get(third) is not None
+
+
+def test_evict_digest():
+    store = MeasurementStore()
+    kept = store.put("a.pdf", "a", _measurement())
+    dropped = [store.put("b.pdf", "b", _measurement()) for _ in range(2)]
+    assert store.evict_digest("b") == 2
+    assert all(store.get(measurement_id) is None for measurement_id in dropped)
+    assert store.get(kept) is not None
+
+
+def test_recalculate_uses_stored_measurement_and_404s_when_gone(monkeypatch):
+    import main
+
+    store = MeasurementStore(ttl_s=0.05)
+    monkeypatch.setattr(main, "get_measurement_store", lambda: store)
+    measurement_id = store.put("plan.pdf", "abc", _measurement(40.0))
+
+    boq = asyncio.run(main.recalculate(RecalculateRequest(measurement_id=measurement_id), tier="pro"))
+    assert boq.measurement_id == measurement_id
+    assert boq.walls_230mm_linear_m == 40.0
+
+    with pytest.raises(HTTPException) as unknown:
+        asyncio.run(main.recalculate(RecalculateRequest(measurement_id="missing"), tier="pro"))
+    assert unknown.value.status_code == 404
+
+    time.sleep(0.06)
+    with pytest.raises(HTTPException) as expired:
+        asyncio.run(main.recalculate(RecalculateRequest(measurement_id=measurement_id), tier="pro"))
+    assert expired.value.status_code == 404
@@ -0,0 +1,91 @@
+"""
+Unit tests for keyset pagination helpers.
+"""
+
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+import pagination
+from pagination import apply_keyset, decode_cursor, encode_cursor, iter_rows
+
+
+class _Recorder:
+    """Query builder stand-in that records the calls made on it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return method
+
+
+class _FakeTable:
+    """Serves rows sorted by (created_at, id) desc, honouring the keyset cursor."""
+
+    def __init__(self, n: int):
+        self.rows = sorted(
+            ({"id": f"{i:04d}", "created_at": f"2026-01-{i % 28 + 1:02d}T00:00:00+00:00"} for i in range(n)),
+            key=lambda r: (r["created_at"], r["id"]), reverse=True,
+        )
+        self.queries = 0
+
+
+def test_cursor_round_trip():
+    cursor = ("2026-03-01T10:00:00.123+00:00", "a1b2")
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+
+
+def test_invalid_cursor_is_400():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_apply_keyset_orders_and_filters_after_cursor():
+    q = apply_keyset(_Recorder(), ("2026-03-01T10:00:00+00:00", "abc"))
+    assert q.calls[:2] == [("order", ("created_at",), {"desc": True}), ("order", ("id",), {"desc": True})]
+    name, (expr,), _ = q.calls[2]
+    assert name == "or_"
+    assert expr == (
+        'created_at.lt."2026-03-01T10:00:00+00:00",'
+        'and(created_at.eq."2026-03-01T10:00:00+00:00",id.lt."abc")'
+    )
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = _FakeTable(25)
+
+    def fake_fetch_page(make_query, cursor, limit, desc=True):
+        table.queries += 1
+        start = 0
+        if cursor is not None:
+            start = next(i for i, r in enumerate(table.rows) if (r["created_at"], r["id"]) < cursor)
+        rows = table.rows[start:start + limit]
+        return rows, (rows[-1]["created_at"], rows[-1]["id"]) if len(rows) == limit else None
+
+    monkeypatch.setattr(pagination, "fetch_page", fake_fetch_page)
+    table.fetch_page = fake_fetch_page
+    return table
+
+
+def test_iter_rows_walks_every_page_once(table):
+    async def collect():
+        return [row async for row in iter_rows(lambda: None, page_size=10)]
+
+    assert asyncio.run(collect()) == table.rows
+    assert table.queries == 3
+
+
+def test_iter_rows_continues_from_a_prefetched_first_page(table):
+    first_page = table.fetch_page(None, None, 10)
+
+    async def collect():
+        return [row async for row in iter_rows(lambda: None, page_size=10, first_page=first_page)]
+
+    assert asyncio.run(collect()) == table.rows
+    assert table.queries == 3
@@ -0,0 +1,48 @@
+"""
+Unit tests for plan image preprocessing.
+"""
+
+import io
+from PIL import Image, ImageDraw
+from preprocess import estimate_tokens, crop_to_drawing, fit_tile_budget, preprocess_plan, preprocess_metrics, TOKENS_PER_TILE
+
+
+def _plan(size=(4000, 3000), box=(1000, 800, 2500, 2000)) -> Image.Image:
+    img = Image.new("RGB", size, "white")
+    ImageDraw.Draw(img).rectangle(box, outline="black", width=3)
+    return img
+
+
+def test_estimate_tokens():
+    assert estimate_tokens(300, 300) == TOKENS_PER_TILE
+    assert estimate_tokens(1536, 769) == 2 * 2 * TOKENS_PER_TILE
+
+
+def test_crop_to_drawing_trims_whitespace():
+    cropped = crop_to_drawing(_plan().convert("L"), margin=10)
+    assert cropped.size == (1501 + 20, 1201 + 20)
+
+
+def test_fit_tile_budget_downscales_only_when_needed():
+    small = Image.new("L", (700, 700), 255)
+    assert fit_tile_budget(small, max_tiles=4) is small
+    big = fit_tile_budget(Image.new("L", (6000, 4000), 255), max_tiles=4)
+    assert estimate_tokens(*big.size) <= 4 * TOKENS_PER_TILE
+
+
+def test_preprocess_plan_returns_smaller_grayscale_png():
+    data = preprocess_plan(_plan(), bytes_in=4000 * 3000 * 3)
+    out = Image.open(io.BytesIO(data))
+    assert out.format == "PNG"
+    assert out.mode in ("L", "1")
+    assert out.width < 4000 and out.height < 3000
+
+
+def test_renders_are_left_out_of_the_byte_savings():
+    before = preprocess_metrics()
+    preprocess_plan(_plan())                      # a PDF render: no encoded original
+    after = preprocess_metrics()
+    assert after["renders"] == before["renders"] + 1
+    assert after["bytes_in"] == before["bytes_in"]
+    assert after["bytes_out"] == before["bytes_out"]
+    assert after["tokens_in"] > before["tokens_in"]
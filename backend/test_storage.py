@@ -0,0 +1,116 @@
+"""
+Unit tests for streamed upload ingestion and the storage backends.
+"""
+
+import io
+import asyncio
+import hashlib
+import pytest
+from fastapi import UploadFile, HTTPException
+
+import storage
+from storage import LocalStorage
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 5000
+
+
+def _upload(data: bytes, filename: str = "plan.png") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+def test_save_returns_digest_and_size(tmp_path):
+    stored = asyncio.run(LocalStorage(str(tmp_path)).save(_upload(PNG)))
+    assert stored.sha256 == hashlib.sha256(PNG).hexdigest()
+    assert stored.size == len(PNG)
+    assert (tmp_path / stored.name).read_bytes() == PNG
+
+
+def test_extension_follows_content_not_filename(tmp_path):
+    stored = asyncio.run(LocalStorage(str(tmp_path)).save(_upload(b"%PDF-1.7\n...", filename="plan.png")))
+    assert stored.name.endswith(".pdf")
+
+
+def test_rejects_unknown_magic_bytes(tmp_path):
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(LocalStorage(str(tmp_path)).save(_upload(b"MZ\x90\x00 not a plan")))
+    assert exc.value.status_code == 415
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_rejects_oversized_upload_midstream(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "UPLOAD_CHUNK_BYTES", 1024)
+    upload = _upload(PNG)
+    upload.size = None  # unknown up front, as with chunked transfer encoding
+
+    async def save():
+        async def write(chunk):
+            pass
+        return await storage._stream_upload(upload, write, max_bytes=2048)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(save())
+    assert exc.value.status_code == 413
+    # Stopped reading as soon as the limit was crossed
+    assert upload.file.tell() == 3072
+
+
+# ── GCSStorage ──────────────────────────────────────────────────────────────
+
+class _FakeBlob:
+    def __init__(self, bucket: "_FakeBucket", name: str):
+        self.bucket, self.name = bucket, name
+
+    def open(self, mode: str, **kwargs):
+        if mode == "rb":
+            return io.BytesIO(self.bucket.objects[self.name])
+        blob = self
+
+        class _Writer(io.BytesIO):
+            def close(self):
+                blob.bucket.objects[blob.name] = self.getvalue()
+                super().close()
+        return _Writer()
+
+
+class _FakeBucket:
+    """In-memory stand-in for google.cloud.storage.Bucket."""
+
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+
+    def blob(self, name: str, chunk_size: int | None = None):
+        return _FakeBlob(self, name)
+
+
+def test_gcs_save_streams_and_reads_back():
+    gcs = storage.GCSStorage.__new__(storage.GCSStorage)
+    gcs.bucket, gcs.bucket_obj = "plans", _FakeBucket()
+
+    stored = asyncio.run(gcs.save(_upload(PNG, filename="plan.jpeg")))
+    assert stored.path == f"gs://plans/uploads/{stored.name}"
+    assert stored.name.endswith(".png")
+    assert stored.sha256 == hashlib.sha256(PNG).hexdigest()
+    with gcs.get_path(stored.name) as reader:
+        assert reader.read() == PNG
+
+
+@pytest.mark.skipif(not storage.GCS_ENDPOINT, reason="set GCS_ENDPOINT to a GCS emulator (e.g. fake-gcs-server)")
+def test_gcs_round_trip_against_emulator():
+    bucket = "costcorrect-test"
+    client = storage._gcs_client()
+    if client.lookup_bucket(bucket) is None:
+        client.create_bucket(bucket)
+
+    gcs = storage.GCSStorage(bucket)
+    stored = asyncio.run(gcs.save(_upload(PNG)))
+    with storage.open_stored(stored.path) as reader:
+        assert reader.read() == PNG
+
+
+def test_delete_stored_removes_upload_and_page_renders(tmp_path):
+    for name in ("plan.pdf", "plan_page0.png", "plan_page1.png", "other.png"):
+        (tmp_path / name).write_bytes(b"x")
+    assert storage.delete_stored(str(tmp_path / "plan.pdf")) == 3
+    assert [p.name for p in tmp_path.iterdir()] == ["other.png"]
+    # Already gone is not an error
+    assert storage.delete_stored(str(tmp_path / "plan.pdf")) == 0
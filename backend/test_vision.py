@@ -0,0 +1,287 @@
+"""
+Unit tests for the Gemini-free parts of the vision pipeline.
+"""
+
+import io
+import time
+import functools
+import asyncio
+import fitz
+import pytest
+import vision
+from schemas import WallMeasurement
+from vision import adaptive_dpi, render_pdf_page, pdf_page_count, tile_grid, tile_boxes, merge_tiles, scale_denominator
+
+A4 = (595, 842)       # points
+A0 = (2384, 3370)
+
+
+def _make_pdf(path, pages: int = 3, size=A4) -> str:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=size[0], height=size[1])
+        page.draw_line((50, 50), (size[0] - 50, 50))
+        page.insert_text((60, 100), f"Sheet {i}")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_adaptive_dpi_keeps_max_for_small_pages():
+    assert adaptive_dpi(*A4, max_dpi=200, max_pixels=24_000_000) == 200
+
+
+def test_adaptive_dpi_respects_pixel_budget():
+    dpi = adaptive_dpi(*A0, max_dpi=200, max_pixels=24_000_000)
+    assert dpi < 200
+    pixels = (A0[0] * dpi / 72) * (A0[1] * dpi / 72)
+    assert pixels <= 24_000_000 * 1.0001
+
+
+def test_render_single_page_in_memory(tmp_path):
+    pdf = _make_pdf(tmp_path / "plan.pdf", pages=3, size=A0)
+    pix = render_pdf_page(pdf, page_index=2, max_dpi=200, max_pixels=4_000_000)
+    assert pix.width * pix.height <= 4_000_000 * 1.01
+    assert pdf_page_count(pdf) == 3
+    # No intermediate renders left next to the upload
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["plan.pdf"]
+
+
+# ── Tiled analysis ──────────────────────────────────────────────────────────
+
+def test_tile_grid_respects_max_tiles():
+    assert tile_grid(1000, 800, tile_px=2048, max_tiles=12) == (1, 1)
+    assert tile_grid(6000, 4000, tile_px=2048, max_tiles=12) == (2, 3)
+    rows, cols = tile_grid(12000, 9000, tile_px=1024, max_tiles=12)
+    assert rows * cols <= 12
+
+
+@pytest.mark.parametrize("overlap", [0.0, 0.1, 0.25])
+def test_tile_boxes_cover_sheet_and_cores_partition_it(overlap):
+    width, height = 6001, 4000
+    tiles = tile_boxes(width, height, rows=2, cols=3, overlap=overlap)
+    assert len(tiles) == 6
+    assert min(b[0] for b, _ in tiles) == 0 and max(b[2] for b, _ in tiles) == width
+    assert min(b[1] for b, _ in tiles) == 0 and max(b[3] for b, _ in tiles) == height
+    for box, core in tiles:
+        assert 0 <= core[0] < core[2] <= box[2] - box[0]
+        assert 0 <= core[1] < core[3] <= box[3] - box[1]
+    # Cores add back up to the sheet: nothing counted twice or missed
+    assert sum((c[2] - c[0]) * (c[3] - c[1]) for _, c in tiles) == width * height
+
+
+def test_scale_denominator():
+    assert scale_denominator("1:100") == 100
+    assert scale_denominator("1 : 50 @ A1") == 50
+    assert scale_denominator("unknown") is None
+
+
+def test_merge_tiles_sums_cores():
+    tiles = [WallMeasurement(scale="1:100", walls_230mm_linear_m=4, walls_110mm_linear_m=2.5) for _ in range(6)]
+    overview = WallMeasurement(scale="1:100", walls_230mm_linear_m=20, walls_110mm_linear_m=10)
+    merged = merge_tiles(overview, tiles, (2, 3))
+    assert merged.walls_230mm_linear_m == 24
+    assert merged.walls_110mm_linear_m == 15
+    assert merged.scale == "1:100"
+
+
+def _fake_generate(calls, fail_tile: bool = False):
+    async def fake_generate(prompt, image_part):
+        calls.append(prompt)
+        if prompt == vision.VISION_PROMPT:
+            return WallMeasurement(scale="1:100", walls_230mm_linear_m=10, walls_110mm_linear_m=5)
+        if fail_tile and len(calls) == 3:
+            raise RuntimeError("tile failed")
+        return WallMeasurement(scale="1:100", walls_230mm_linear_m=4, walls_110mm_linear_m=2)
+    return fake_generate
+
+
+def test_analyse_plan_tiled_gives_tiles_the_overview_scale(tmp_path, monkeypatch):
+    pdf = _make_pdf(tmp_path / "a0.pdf", pages=1, size=A0)
+    calls = []
+    monkeypatch.setattr(vision, "_generate", _fake_generate(calls))
+    monkeypatch.setattr(vision, "VISION_TILE_MAX_PIXELS", 4_000_000)
+    monkeypatch.setattr(vision, "tile_grid", lambda w, h, tile_px: (2, 2))
+
+    result = asyncio.run(vision.analyse_plan_tiled(pdf))
+    assert calls[0] == vision.VISION_PROMPT          # overview first
+    tile_prompts = calls[1:]
+    assert len(tile_prompts) == 4
+    assert all("Drawing scale: 1:100" in p and " m x " in p for p in tile_prompts)
+    assert result.walls_230mm_linear_m == 16
+    assert result.scale == "1:100"
+    assert "2x2 tiles" in result.confidence_note
+
+
+def test_analyse_plan_tiled_degrades_to_overview_when_a_tile_fails(tmp_path, monkeypatch):
+    pdf = _make_pdf(tmp_path / "a0.pdf", pages=1, size=A0)
+    monkeypatch.setattr(vision, "_generate", _fake_generate([], fail_tile=True))
+    monkeypatch.setattr(vision, "VISION_TILE_MAX_PIXELS", 4_000_000)
+    monkeypatch.setattr(vision, "tile_grid", lambda w, h, tile_px: (2, 2))
+
+    with pytest.raises(vision.TiledAnalysisDegraded) as degraded:
+        asyncio.run(vision.analyse_plan_tiled(pdf))
+    assert degraded.value.measurement.walls_230mm_linear_m == 10
+    assert degraded.value.measurement.confidence_note.startswith("Degraded result: 1 of 4 tiles")
+
+
+def test_tiles_are_sized_so_preprocess_keeps_full_detail(tmp_path, monkeypatch):
+    from PIL import Image
+    from preprocess import max_square_px
+
+    doc = fitz.open()
+    doc.new_page(width=A0[0], height=A0[1]).draw_rect(fitz.Rect(20, 20, A0[0] - 20, A0[1] - 20))
+    pdf = str(tmp_path / "a0.pdf")
+    doc.save(pdf)
+    monkeypatch.setattr(vision, "VISION_TILE_MAX_PIXELS", 24_000_000)
+    # At most 4 tiles: cells must grow past the core size, so the sheet shrinks instead
+    monkeypatch.setattr(vision, "tile_grid", functools.partial(vision.tile_grid, max_tiles=4))
+    monkeypatch.setattr(vision, "PREPROCESS_ENABLED", True)
+
+    sheet = vision._load_tiled_sheet(pdf)
+    assert sheet.grid == (2, 2)
+    for part, box, core in sheet.tiles:
+        tile_w, tile_h = box[2] - box[0], box[3] - box[1]
+        assert max(tile_w, tile_h) <= max_square_px()
+        # Sent at the size it was cut at: preprocessing did not downscale it
+        assert Image.open(io.BytesIO(part.inline_data.data)).size == (tile_w, tile_h)
+
+
+def test_tiled_analysis_takes_an_admission_slot_per_gemini_call(tmp_path, monkeypatch):
+    from contextlib import asynccontextmanager
+
+    pdf = _make_pdf(tmp_path / "a0.pdf", pages=1, size=A0)
+    monkeypatch.setattr(vision, "_generate", _fake_generate([]))
+    monkeypatch.setattr(vision, "VISION_TILE_MAX_PIXELS", 4_000_000)
+    monkeypatch.setattr(vision, "tile_grid", lambda w, h, tile_px: (2, 2))
+    admitted = []
+
+    @asynccontextmanager
+    async def admit():
+        admitted.append(1)
+        yield
+
+    asyncio.run(vision.analyse_plan_tiled(pdf, admit=admit))
+    assert len(admitted) == 5                        # overview + 4 tiles
+
+
+# ── Async pipeline ──────────────────────────────────────────────────────────
+
+ANSWER = '{"scale": "1:100", "walls_230mm_linear_m": 12.5, "walls_110mm_linear_m": 4.0}'
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    """A replay provider answering every image with ANSWER after `latency_s`."""
+    from vision_providers import ReplayProvider
+
+    recordings = tmp_path / "recordings"
+    recordings.mkdir()
+    (recordings / "answer.txt").write_text(ANSWER)
+    provider = ReplayProvider(str(recordings), latency_s=0.05, jitter_s=0)
+    monkeypatch.setattr(vision, "get_vision_provider", lambda: provider)
+    return provider
+
+
+@pytest.fixture
+def plan(tmp_path):
+    return _make_pdf(tmp_path / "plan.pdf", pages=1)
+
+
+def test_analyse_plan_reports_each_stage(replay, plan):
+    stages = []
+    result = asyncio.run(vision.analyse_plan(plan, on_stage=lambda stage, s: stages.append(stage)))
+    assert result.walls_230mm_linear_m == 12.5
+    assert stages == ["queue", "render", "gemini", "parse"]
+    assert replay.fallbacks == 1
+
+
+def test_vision_semaphore_caps_analyses_in_flight(replay, plan, monkeypatch):
+    in_flight, peak = 0, 0
+    generate = replay.generate
+
+    async def counting_generate(prompt, image_part):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await generate(prompt, image_part)
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr(replay, "generate", counting_generate)
+
+    async def scenario():
+        monkeypatch.setattr(vision, "_vision_semaphore", asyncio.Semaphore(2))
+        return await asyncio.gather(*(vision.analyse_plan(plan) for _ in range(6)))
+
+    assert len(asyncio.run(scenario())) == 6
+    assert peak == 2
+
+
+def test_gemini_timeout(replay, plan, monkeypatch):
+    replay.latency_s = 1.0
+    monkeypatch.setattr(vision, "VISION_GEMINI_TIMEOUT_S", 0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(vision.analyse_plan(plan))
+
+
+def test_render_timeout(replay, plan, monkeypatch):
+    def slow_render(image_path, page):
+        time.sleep(0.2)
+
+    monkeypatch.setattr(vision, "_load_image_part", slow_render)
+    monkeypatch.setattr(vision, "VISION_RENDER_TIMEOUT_S", 0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(vision.analyse_plan(plan))
+    assert replay.fallbacks == 0
+
+
+def test_queue_timeout_frees_nothing_it_did_not_take(replay, plan, monkeypatch):
+    monkeypatch.setattr(vision, "VISION_QUEUE_TIMEOUT_S", 0.01)
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(1)
+        monkeypatch.setattr(vision, "_vision_semaphore", semaphore)
+        await semaphore.acquire()                 # every slot taken
+        with pytest.raises(asyncio.TimeoutError):
+            await vision.analyse_plan(plan)
+        semaphore.release()
+        return semaphore
+
+    assert not asyncio.run(scenario()).locked()
+
+
+# ── Multi-page analysis ─────────────────────────────────────────────────────
+
+def test_analyse_pages_isolates_failures_and_names_missing_pages(tmp_path):
+    pdf = _make_pdf(tmp_path / "house.pdf", pages=3)
+
+    async def measure(page):
+        await asyncio.sleep(0.01 * (3 - page))      # later pages finish first
+        if page == 1:
+            raise RuntimeError("Gemini failed")
+        return WallMeasurement(scale="1:100", walls_230mm_linear_m=page, walls_110mm_linear_m=0)
+
+    async def scenario():
+        return [item async for item in vision.analyse_pages(pdf, [0, 1, 2, 4], measure=measure)]
+
+    results = asyncio.run(scenario())
+    assert [page for page, _ in results] == [4, 2, 1, 0]   # missing page at once, then completion order
+    outcome = dict(results)
+    assert str(outcome[4]) == "Page 5 is not in the document (3 pages)."
+    assert isinstance(outcome[1], RuntimeError)
+    assert outcome[2].walls_230mm_linear_m == 2
+
+
+def test_analyse_pages_defaults_to_every_page(tmp_path, monkeypatch):
+    pdf = _make_pdf(tmp_path / "house.pdf", pages=4)
+    monkeypatch.setattr(vision, "VISION_MAX_PAGES", 3)
+
+    async def measure(page):
+        return WallMeasurement(scale="1:100", walls_230mm_linear_m=1, walls_110mm_linear_m=0)
+
+    async def scenario():
+        return sorted([page async for page, _ in vision.analyse_pages(pdf, measure=measure)])
+
+    assert asyncio.run(scenario()) == [0, 1, 2]
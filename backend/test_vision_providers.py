@@ -0,0 +1,81 @@
+"""
+Unit tests for the record / replay vision providers.
+"""
+
+import asyncio
+import pytest
+from google.genai import types
+
+import vision_providers
+from vision_providers import RecordingProvider, ReplayProvider
+
+
+def _part(data: bytes) -> types.Part:
+    return types.Part.from_bytes(data=data, mime_type="image/png")
+
+
+class _FakeProvider:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt, image_part):
+        self.calls += 1
+        return f'{{"scale": "1:100", "walls_230mm_linear_m": {len(image_part.inline_data.data)}}}'
+
+
+def test_replay_serves_what_was_recorded(tmp_path):
+    inner = _FakeProvider()
+    recorder = RecordingProvider(inner, str(tmp_path))
+    plans = [_part(b"plan-a"), _part(b"plan-bb")]
+    recorded = [asyncio.run(recorder.generate("prompt", p)) for p in plans]
+    assert inner.calls == 2 and recorder.recorded == 2
+
+    replay = ReplayProvider(str(tmp_path), latency_s=0, jitter_s=0)
+    assert [asyncio.run(replay.generate("prompt", p)) for p in plans] == recorded
+    assert replay.stats() == {"provider": "replay", "hits": 2, "fallbacks": 0}
+
+
+def test_unrecorded_images_fall_back_deterministically(tmp_path, monkeypatch):
+    sample = tmp_path / "sample.json"
+    sample.write_text('{"scale": "1:50"}')
+    monkeypatch.setattr(vision_providers, "_SAMPLE_RESPONSES", [sample])
+
+    replay = ReplayProvider(str(tmp_path / "empty"), latency_s=0, jitter_s=0)
+    assert asyncio.run(replay.generate("prompt", _part(b"unseen"))) == '{"scale": "1:50"}'
+    assert replay.fallbacks == 1
+
+
+def test_shipped_samples_parse_as_measurements(tmp_path):
+    from vision import _extract_json
+
+    replay = ReplayProvider(str(tmp_path / "empty"), latency_s=0, jitter_s=0)
+    for n in range(16):
+        data = _extract_json(asyncio.run(replay.generate("prompt", _part(bytes([n])))))
+        assert float(data["walls_230mm_linear_m"]) > 0
+    assert replay.fallbacks == 16
+
+
+def test_replay_latency_is_reproducible(tmp_path, monkeypatch):
+    delays = []
+
+    async def fake_sleep(s):
+        delays.append(s)
+
+    monkeypatch.setattr(vision_providers.asyncio, "sleep", fake_sleep)
+    replay = ReplayProvider(str(tmp_path), latency_s=1.0, jitter_s=0.5)
+    for _ in range(2):
+        asyncio.run(replay.generate("prompt", _part(b"plan")))
+    assert delays[0] == delays[1]
+    assert 0.5 <= delays[0] <= 1.5
+
+
+def test_replay_without_any_responses_fails_loudly(tmp_path, monkeypatch):
+    monkeypatch.setattr(vision_providers, "_SAMPLE_RESPONSES", [])
+    with pytest.raises(RuntimeError):
+        asyncio.run(ReplayProvider(str(tmp_path), latency_s=0, jitter_s=0).generate("prompt", _part(b"x")))
+
+
+def test_gemini_provider_reports_stats_without_an_api_key():
+    provider = vision_providers.GeminiProvider(api_key="")
+    assert provider.stats() == {"provider": "gemini"}
+    assert provider._client is None
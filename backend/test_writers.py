@@ -0,0 +1,121 @@
+"""
+Unit tests for the background BatchWriter.
+"""
+
+import asyncio
+import pytest
+import writers
+from writers import BatchWriter
+
+
+class _FakeTable:
+    """Records insert batches; fails the first `failures` calls."""
+
+    def __init__(self, failures: int = 0):
+        self.batches: list[list[dict]] = []
+        self.failures = failures
+
+    def table(self, name):
+        return self
+
+    def insert(self, rows):
+        self._rows = rows
+        return self
+
+    def execute(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("supabase unavailable")
+        if any(row.get("bad") for row in self._rows):
+            raise ValueError("violates foreign key constraint")
+        self.batches.append(list(self._rows))
+
+
+@pytest.fixture
+def fake_table(monkeypatch):
+    fake = _FakeTable()
+    monkeypatch.setattr(writers, "get_supabase", lambda: fake)
+    return fake
+
+
+def test_batches_by_size_and_flushes_on_stop(fake_table):
+    async def scenario():
+        writer = BatchWriter("audit_logs", batch_size=10, flush_interval_s=60)
+        await writer.start()
+        for i in range(25):
+            writer.submit({"n": i})
+        await asyncio.sleep(0.05)   # size threshold wakes the worker
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert [len(b) for b in fake_table.batches] == [10, 10, 5]
+    assert writer.stats() == {"pending": 0, "written": 25, "dropped": 0, "failed_batches": 0}
+
+
+def test_retries_then_succeeds(fake_table):
+    fake_table.failures = 2
+    writer = BatchWriter("audit_logs", retry_base_s=0.001)
+    writer.submit({"n": 1})
+    asyncio.run(writer.flush())
+    assert fake_table.batches == [[{"n": 1}]]
+
+
+def test_gives_up_and_counts_dropped(fake_table):
+    fake_table.failures = 100
+    writer = BatchWriter("audit_logs", max_retries=2, retry_base_s=0.001)
+    writer.submit({"n": 1})
+    asyncio.run(writer.flush())
+    assert writer.dropped == 1
+    assert writer.failed_batches == 1
+
+
+def test_bad_row_is_bisected_out_of_its_batch(fake_table):
+    writer = BatchWriter("estimates", batch_size=8, max_retries=1, retry_base_s=0.001)
+    for i in range(8):
+        writer.submit({"n": i, "bad": i == 5})
+    asyncio.run(writer.flush())
+    assert sorted(row["n"] for batch in fake_table.batches for row in batch) == [0, 1, 2, 3, 4, 6, 7]
+    assert writer.stats() == {"pending": 0, "written": 7, "dropped": 1, "failed_batches": 1}
+
+
+def test_full_queue_drops_without_blocking():
+    writer = BatchWriter("audit_logs", max_queue=2)
+    assert writer.submit({"n": 1}) and writer.submit({"n": 2})
+    assert writer.submit({"n": 3}) is False
+    assert writer.stats()["pending"] == 2
+    assert writer.dropped == 1
+
+
+def test_flush_waits_for_the_batch_already_in_flight(monkeypatch):
+    import threading
+
+    class _SlowTable(_FakeTable):
+        def __init__(self):
+            super().__init__()
+            self.started = threading.Event()
+            self.release = threading.Event()
+
+        def execute(self):
+            self.started.set()
+            self.release.wait(5)
+            super().execute()
+
+    slow = _SlowTable()
+    monkeypatch.setattr(writers, "get_supabase", lambda: slow)
+
+    async def scenario():
+        writer = BatchWriter("estimates", batch_size=1, flush_interval_s=60)
+        await writer.start()
+        writer.submit({"n": 1})
+        await asyncio.to_thread(slow.started.wait, 5)   # the background task has taken the batch
+        assert writer.stats()["pending"] == 0
+        flush = asyncio.create_task(writer.flush())
+        await asyncio.sleep(0.02)
+        assert not flush.done()
+        slow.release.set()
+        await flush
+        assert slow.batches == [[{"n": 1}]]
+        await writer.stop()
+
+    asyncio.run(scenario())
@@ -1,29 +1,92 @@
+import io
 import json
+import math
 import re
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, NamedTuple
 import fitz  # PyMuPDF
 from pathlib import Path
-from PIL import Image
-from google import genai
+from PIL import Image, ImageOps
 from google.genai import types
 
-from config import GOOGLE_API_KEY, GEMINI_MODEL
+from config import (
+    VISION_MAX_CONCURRENCY,
+    VISION_RENDER_WORKERS,
+    VISION_QUEUE_TIMEOUT_S,
+    VISION_RENDER_TIMEOUT_S,
+    VISION_GEMINI_TIMEOUT_S,
+    VISION_PAGE_CONCURRENCY,
+    VISION_MAX_PAGES,
+    PDF_MAX_DPI,
+    PDF_MAX_PIXELS,
+    VISION_TILE_MAX_PIXELS,
+    VISION_TILE_PX,
+    VISION_TILE_OVERLAP,
+    VISION_TILE_MAX,
+    VISION_TILE_CONCURRENCY,
+    PREPROCESS_ENABLED,
+)
 from schemas import WallMeasurement
+from storage import open_stored
+from preprocess import preprocess_plan, crop_to_drawing, max_square_px
+from vision_providers import get_vision_provider
+
+# Rasterisation and image decoding are CPU-bound; keep them off the event loop
+# in a small dedicated pool so they cannot starve FastAPI's default threadpool.
+_render_executor = ThreadPoolExecutor(max_workers=VISION_RENDER_WORKERS, thread_name_prefix="vision-render")
+
+# Global cap on analyses in flight (render + Gemini) across all requests.
+_vision_semaphore = asyncio.Semaphore(VISION_MAX_CONCURRENCY)
 
 
 # ── Helpers ─────────────────────────────────────────────────────────────────
 
-def pdf_to_images(pdf_path: str, dpi: int = 200) -> list[str]:
-    """Convert every page of a PDF to a PNG image, return list of paths."""
-    doc = fitz.open(pdf_path)
-    image_paths: list[str] = []
-    for i, page in enumerate(doc):
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat)
-        out_path = str(Path(pdf_path).with_suffix("")) + f"_page{i}.png"
-        pix.save(out_path)
-        image_paths.append(out_path)
-    doc.close()
-    return image_paths
+def adaptive_dpi(width_pt: float, height_pt: float, max_dpi: int = PDF_MAX_DPI, max_pixels: int = PDF_MAX_PIXELS) -> float:
+    """Highest DPI (up to max_dpi) at which a page of the given size fits the pixel budget."""
+    pixels_at_max = (width_pt * max_dpi / 72) * (height_pt * max_dpi / 72)
+    if pixels_at_max <= max_pixels:
+        return float(max_dpi)
+    return max_dpi * math.sqrt(max_pixels / pixels_at_max)
+
+
+def _open_pdf(pdf_path: str) -> fitz.Document:
+    """Open a stored PDF; objects in GCS are streamed into memory, not copied to disk."""
+    if pdf_path.startswith("gs://"):
+        with open_stored(pdf_path) as f:
+            return fitz.open(stream=f.read(), filetype="pdf")
+    return fitz.open(pdf_path)
+
+
+def render_pdf_page(
+    pdf_path: str,
+    page_index: int = 0,
+    max_dpi: int = PDF_MAX_DPI,
+    max_pixels: int = PDF_MAX_PIXELS,
+    gray: bool = False,
+) -> fitz.Pixmap:
+    """
+    Render a single PDF page to an in-memory pixmap.
+
+    Only the requested page is rasterised and nothing is written to disk.
+    `gray` renders a single-channel pixmap (a third of the memory of RGB).
+    The pixmap's xres/yres carry the (rounded) DPI used.
+    """
+    with _open_pdf(pdf_path) as doc:
+        page = doc[page_index]
+        dpi = adaptive_dpi(page.rect.width, page.rect.height, max_dpi, max_pixels)
+        colorspace = fitz.csGRAY if gray else fitz.csRGB
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=colorspace, alpha=False)
+        pix.set_dpi(round(dpi), round(dpi))
+        return pix
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    with _open_pdf(pdf_path) as doc:
+        return doc.page_count
 
 
 def _extract_json(text: str) -> dict:
@@ -74,41 +137,440 @@ Rules:
 6. Return the JSON object only — no extra text.
 """
 
+# Short fingerprint of the prompt; part of the vision cache key so that
+# editing the prompt automatically invalidates previously cached results.
+VISION_PROMPT_VERSION: str = hashlib.sha256(VISION_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+VISION_TILE_PROMPT = """You are an expert quantity surveyor analysing ONE TILE of a large South African architectural drawing.
+The sheet has been cut into overlapping tiles; this image shows only part of it.
+
+From an analysis of the whole sheet:
+- Drawing scale: {scale}
+- This tile {extent}.
+
+Only the CORE of this tile counts: the region from {core_left}% to {core_right}% of the image width and from {core_top}% to {core_bottom}% of its height, measured from the top-left corner. The rest is context; neighbouring tiles measure it.
+
+Examine this tile carefully and extract the following information.  Return ONLY valid JSON — no markdown fences, no commentary.
+
+{{
+  "scale": "<the drawing scale used>",
+  "walls_230mm_linear_m": <linear meters of 230 mm (double-skin / cavity) walls inside the core>,
+  "walls_110mm_linear_m": <linear meters of 110 mm (single-skin) walls inside the core>,
+  "confidence_note": "<any caveats or assumptions you made>"
+}}
+
+Rules:
+1. External / structural walls are typically 230 mm (double skin).
+2. Internal partition walls are typically 110 mm (single skin); look closely, they are thin lines.
+3. Measure only the part of each wall that lies inside the core; a wall crossing the core edge counts up to that edge.
+4. Convert drawn lengths to real-world meters with the drawing scale and tile extent above, even where this tile shows no scale bar or dimensions.
+5. Return the JSON object only — no extra text.
+"""
+
+VISION_TILE_PROMPT_VERSION: str = hashlib.sha256(VISION_TILE_PROMPT.encode("utf-8")).hexdigest()[:12]
 
-async def analyse_plan(image_path: str) -> WallMeasurement:
+
+_IMAGE_MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+
+
+def _load_image_part(image_path: str, page: int = 0) -> types.Part:
     """
-    Send an architectural plan image to Gemini Vision and return
-    structured wall measurements.
+    Rasterise (if PDF), preprocess and encode the plan as an inline image part.
+    Runs in the render pool so neither PyMuPDF nor PIL touches the event loop.
     """
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-
-    # If the file is a PDF, convert pages to images and use the first page
     path = Path(image_path)
     if path.suffix.lower() == ".pdf":
-        pages = pdf_to_images(image_path)
-        image_path = pages[0]  # analyse first page (floor plan)
-
-    # Load the image
-    img = Image.open(image_path)
-
-    # Use the simpler list-based content format (confirmed working)
-    response = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=[VISION_PROMPT, img],
-        config=types.GenerateContentConfig(
-            temperature=0.1,
-            max_output_tokens=2048,
-            response_mime_type="application/json",
-        ),
+        # Render just the requested sheet, in memory
+        pix = render_pdf_page(image_path, page, gray=PREPROCESS_ENABLED)
+        if not PREPROCESS_ENABLED:
+            return types.Part.from_bytes(data=pix.tobytes("png"), mime_type="image/png")
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+        return _preprocessed_part(img, bytes_in=None)
+
+    with open_stored(image_path) as f:
+        data = f.read()
+    if PREPROCESS_ENABLED:
+        return _preprocessed_part(Image.open(io.BytesIO(data)), bytes_in=len(data))
+
+    mime_type = _IMAGE_MIME_TYPES.get(path.suffix.lower())
+    if mime_type is None:
+        # Unknown extension: let PIL sniff it and normalise to PNG
+        buf = io.BytesIO()
+        Image.open(io.BytesIO(data)).save(buf, format="PNG")
+        return types.Part.from_bytes(data=buf.getvalue(), mime_type="image/png")
+    return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+
+def _preprocessed_part(img: Image.Image, bytes_in: int | None, crop: bool = True) -> types.Part:
+    return types.Part.from_bytes(data=preprocess_plan(img, bytes_in=bytes_in, crop=crop), mime_type="image/png")
+
+
+# Called with (stage name, seconds spent in it) as each pipeline stage completes
+StageCallback = Callable[[str, float], None]
+
+
+class _StageTimer:
+    """Reports the time since the previous mark to an optional StageCallback."""
+
+    def __init__(self, on_stage: StageCallback | None):
+        self.on_stage = on_stage
+        self._last = time.perf_counter()
+
+    def __call__(self, stage: str) -> None:
+        now = time.perf_counter()
+        if self.on_stage is not None:
+            self.on_stage(stage, now - self._last)
+        self._last = now
+
+
+@asynccontextmanager
+async def _vision_slot():
+    """Hold one of the global vision slots, waiting at most VISION_QUEUE_TIMEOUT_S for it."""
+    await asyncio.wait_for(_vision_semaphore.acquire(), timeout=VISION_QUEUE_TIMEOUT_S)
+    try:
+        yield
+    finally:
+        _vision_semaphore.release()
+
+
+async def _generate(prompt: str, image_part: types.Part, mark: _StageTimer | None = None) -> WallMeasurement:
+    """One call to the vision provider (Gemini by default), bounded by VISION_GEMINI_TIMEOUT_S."""
+    text = await asyncio.wait_for(
+        get_vision_provider().generate(prompt, image_part),
+        timeout=VISION_GEMINI_TIMEOUT_S,
     )
+    if mark:
+        mark("gemini")
 
     # Parse the JSON response (robust extraction)
-    data = _extract_json(response.text)
+    data = _extract_json(text)
 
-    return WallMeasurement(
+    measurement = WallMeasurement(
         scale=data.get("scale", "unknown"),
         walls_230mm_linear_m=float(data.get("walls_230mm_linear_m", 0)),
         walls_110mm_linear_m=float(data.get("walls_110mm_linear_m", 0)),
         confidence_note=data.get("confidence_note"),
     )
+    if mark:
+        mark("parse")
+    return measurement
+
+
+async def analyse_plan(image_path: str, page: int = 0, on_stage: StageCallback | None = None) -> WallMeasurement:
+    """
+    Send an architectural plan image to Gemini Vision and return
+    structured wall measurements.
+
+    For PDFs, `page` selects the sheet to analyse (default: the first).
+
+    Each stage (waiting for a slot, rendering, the Gemini call) has its own
+    timeout and raises asyncio.TimeoutError when exceeded. `on_stage` is
+    called as "queue", "render", "gemini" and "parse" complete.
+    """
+    mark = _StageTimer(on_stage)
+    async with _vision_slot():
+        mark("queue")
+        loop = asyncio.get_running_loop()
+        image_part = await asyncio.wait_for(
+            loop.run_in_executor(_render_executor, _load_image_part, image_path, page),
+            timeout=VISION_RENDER_TIMEOUT_S,
+        )
+        mark("render")
+        return await _generate(VISION_PROMPT, image_part, mark)
+
+
+# ── Tiled analysis ──────────────────────────────────────────────────────────
+
+class TiledAnalysisDegraded(Exception):
+    """
+    Some tiles of a sheet failed. `measurement` is the whole-sheet overview
+    instead: usable, but not the tiled result, so callers must not cache it.
+    """
+
+    def __init__(self, measurement: WallMeasurement, failed: int, total: int, cause: BaseException):
+        super().__init__(f"{failed}/{total} tiles failed: {cause!r}")
+        self.measurement = measurement
+
+
+class TiledSheet(NamedTuple):
+    overview: types.Part
+    tiles: list[tuple[types.Part, tuple[int, int, int, int], tuple[int, int, int, int]]]  # (part, box, core)
+    grid: tuple[int, int]
+    size: tuple[int, int]          # sheet pixels, after cropping to the drawing
+    mm_per_px: float | None        # paper millimetres per pixel; None for raster uploads
+
+
+# Tiled sheets analysed, and how many fell back to the overview (this worker only)
+_tiled_stats = {"sheets": 0, "degraded": 0}
+
+
+def tiled_metrics() -> dict:
+    return dict(_tiled_stats)
+
+
+def tile_grid(width: int, height: int, tile_px: int = VISION_TILE_PX, max_tiles: int = VISION_TILE_MAX) -> tuple[int, int]:
+    """Rows and columns of roughly tile_px-square cells covering the image, at most max_tiles cells."""
+    while True:
+        rows, cols = max(1, math.ceil(height / tile_px)), max(1, math.ceil(width / tile_px))
+        if rows * cols <= max(1, max_tiles):
+            return rows, cols
+        tile_px = int(tile_px * 1.1) + 1
+
+
+def tile_core_px(overlap: float = VISION_TILE_OVERLAP) -> int:
+    """
+    Target core size for tiles. With preprocessing on, a core padded by
+    `overlap` must stay within the preprocess tile budget, or the tile would
+    be downscaled and lose the detail tiling is for.
+    """
+    if not PREPROCESS_ENABLED:
+        return VISION_TILE_PX
+    # Less 2 px: rounded core edges can make a core a pixel wider than its cell
+    return min(VISION_TILE_PX, int(max_square_px() / (1 + 2 * overlap)) - 2)
+
+
+def tile_boxes(
+    width: int, height: int, rows: int, cols: int, overlap: float = VISION_TILE_OVERLAP
+) -> list[tuple[tuple[int, int, int, int], tuple[int, int, int, int]]]:
+    """
+    Overlapping crop boxes for a rows x cols grid, each with its core.
+
+    The core is the tile's grid cell; the cores partition the image exactly.
+    Each tile is its core padded by `overlap` of the cell size on every side
+    (clamped to the image), so walls near a cell edge are seen in context.
+    Cores are returned relative to their tile's top-left corner.
+    """
+    cell_w, cell_h = width / cols, height / rows
+    pad_x, pad_y = round(cell_w * overlap), round(cell_h * overlap)
+    tiles = []
+    for r in range(rows):
+        for c in range(cols):
+            core = (round(c * cell_w), round(r * cell_h), round((c + 1) * cell_w), round((r + 1) * cell_h))
+            box = (
+                max(0, core[0] - pad_x),
+                max(0, core[1] - pad_y),
+                min(width, core[2] + pad_x),
+                min(height, core[3] + pad_y),
+            )
+            tiles.append((box, (core[0] - box[0], core[1] - box[1], core[2] - box[0], core[3] - box[1])))
+    return tiles
+
+
+def scale_denominator(scale: str) -> float | None:
+    """N for a drawing scale like "1:100" (or "1 : 50 @ A1"), else None."""
+    match = re.search(r"1\s*:\s*(\d+(?:\.\d+)?)", scale or "")
+    return float(match.group(1)) if match else None
+
+
+def tile_prompt(
+    overview: WallMeasurement,
+    box: tuple[int, int, int, int],
+    core: tuple[int, int, int, int],
+    sheet_size: tuple[int, int],
+    mm_per_px: float | None,
+) -> str:
+    """VISION_TILE_PROMPT filled in with the sheet's scale and where this tile sits on it."""
+    tile_w, tile_h = box[2] - box[0], box[3] - box[1]
+    extent = (
+        f"is {tile_w} x {tile_h} px of the {sheet_size[0]} x {sheet_size[1]} px sheet, "
+        f"at x {box[0]}-{box[2]}, y {box[1]}-{box[3]}"
+    )
+    denominator = scale_denominator(overview.scale)
+    if denominator and mm_per_px:
+        metres_per_px = mm_per_px * denominator / 1000
+        extent += (
+            f". At {overview.scale} it covers {tile_w * metres_per_px:.1f} m x {tile_h * metres_per_px:.1f} m "
+            f"in real-world terms"
+        )
+    scale = overview.scale if denominator else "not known; infer it from dimension strings in this tile"
+    return VISION_TILE_PROMPT.format(
+        scale=scale,
+        extent=extent,
+        core_left=round(100 * core[0] / tile_w),
+        core_right=round(100 * core[2] / tile_w),
+        core_top=round(100 * core[1] / tile_h),
+        core_bottom=round(100 * core[3] / tile_h),
+    )
 
+
+def merge_tiles(
+    overview: WallMeasurement, tiles: list[WallMeasurement], grid: tuple[int, int]
+) -> WallMeasurement:
+    """Sum the tile cores' measurements; the scale comes from the whole-sheet overview."""
+    walls_230 = sum(m.walls_230mm_linear_m for m in tiles)
+    walls_110 = sum(m.walls_110mm_linear_m for m in tiles)
+    note = (
+        f"Tiled analysis ({grid[0]}x{grid[1]} tiles). Whole-sheet estimate: "
+        f"{overview.walls_230mm_linear_m:.1f} m of 230 mm and {overview.walls_110mm_linear_m:.1f} m of 110 mm walls."
+    )
+    if overview.confidence_note:
+        note += f" {overview.confidence_note}"
+    return WallMeasurement(
+        scale=overview.scale,
+        walls_230mm_linear_m=round(walls_230, 2),
+        walls_110mm_linear_m=round(walls_110, 2),
+        confidence_note=note,
+    )
+
+
+def _load_gray(image_path: str, page: int, max_pixels: int) -> tuple[Image.Image, int | None, float | None]:
+    """
+    The plan as a grayscale image, plus the upload size for the preprocessing
+    metrics and the paper millimetres per pixel (both None where unknown).
+    """
+    if Path(image_path).suffix.lower() == ".pdf":
+        pix = render_pdf_page(image_path, page, max_pixels=max_pixels, gray=True)
+        return Image.frombytes("L", (pix.width, pix.height), pix.samples), None, 25.4 / pix.xres
+    with open_stored(image_path) as f:
+        data = f.read()
+    return ImageOps.grayscale(Image.open(io.BytesIO(data))), len(data), None
+
+
+def _image_part(img: Image.Image, bytes_in: int | None, crop: bool = True) -> types.Part:
+    if PREPROCESS_ENABLED:
+        return _preprocessed_part(img, bytes_in=bytes_in, crop=crop)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return types.Part.from_bytes(data=buf.getvalue(), mime_type="image/png")
+
+
+def _load_tiled_sheet(image_path: str, page: int = 0) -> TiledSheet:
+    """
+    Render the sheet once at the tiled pixel budget and cut it up. There are
+    no tiles when the drawing fits a single cell.
+    """
+    img, bytes_in, mm_per_px = _load_gray(image_path, page, VISION_TILE_MAX_PIXELS)
+    img = crop_to_drawing(img)
+    core_px = tile_core_px()
+    rows, cols = tile_grid(img.width, img.height, core_px)
+    overview = _image_part(img, bytes_in)
+    if rows * cols == 1:
+        return TiledSheet(overview, [], (1, 1), img.size, mm_per_px)
+    # Within VISION_TILE_MAX tiles the cells may have to be larger than
+    # core_px; shrink the sheet once instead, so that no tile gets downscaled
+    shrink = min(1.0, core_px * cols / img.width, core_px * rows / img.height)
+    if shrink < 1.0:
+        img = img.resize((max(1, int(img.width * shrink)), max(1, int(img.height * shrink))), Image.LANCZOS)
+        mm_per_px = mm_per_px / shrink if mm_per_px else None
+    # Not re-cropped: the prompt locates each tile's core by position
+    tiles = [
+        (_image_part(img.crop(box), None, crop=False), box, core)
+        for box, core in tile_boxes(img.width, img.height, rows, cols)
+    ]
+    return TiledSheet(overview, tiles, (rows, cols), img.size, mm_per_px)
+
+
+async def analyse_plan_tiled(
+    image_path: str,
+    page: int = 0,
+    on_stage: StageCallback | None = None,
+    admit: Callable[[], AsyncContextManager] | None = None,
+) -> WallMeasurement:
+    """
+    Analyse a large-format (A0/A1) sheet as overlapping tiles, in parallel.
+
+    The sheet is rendered at VISION_TILE_MAX_PIXELS and each tile is sent at
+    full detail, so thin partitions that vanish from a single downsampled
+    image survive. A whole-sheet overview call runs first: its scale, and
+    each tile's position and real-world extent, go into the tile prompts,
+    since most tiles show no scale bar. Each tile measures only its core, so
+    the tile totals simply add up. At most VISION_TILE_CONCURRENCY tiles of
+    the sheet are in flight at once, on top of the global vision semaphore.
+
+    A sheet makes up to VISION_TILE_MAX + 1 Gemini calls, so each one runs
+    inside its own `admit()` (an admission slot) when given, rather than
+    the whole sheet holding one. If any tile fails, raises
+    TiledAnalysisDegraded carrying the overview result. `on_stage` is
+    called as "render", "gemini" (all calls) and "merge" complete.
+    """
+    mark = _StageTimer(on_stage)
+    loop = asyncio.get_running_loop()
+    sheet = await asyncio.wait_for(
+        loop.run_in_executor(_render_executor, _load_tiled_sheet, image_path, page),
+        timeout=VISION_RENDER_TIMEOUT_S,
+    )
+    mark("render")
+
+    async def analyse(prompt: str, part: types.Part) -> WallMeasurement:
+        async with admit() if admit else nullcontext():
+            async with _vision_slot():
+                return await _generate(prompt, part)
+
+    overview = await analyse(VISION_PROMPT, sheet.overview)
+    if not sheet.tiles:
+        mark("gemini")
+        return overview
+
+    fan_out = asyncio.Semaphore(VISION_TILE_CONCURRENCY)
+
+    async def analyse_tile(part: types.Part, box, core) -> WallMeasurement:
+        async with fan_out:
+            return await analyse(tile_prompt(overview, box, core, sheet.size, sheet.mm_per_px), part)
+
+    results = await asyncio.gather(*(analyse_tile(*tile) for tile in sheet.tiles), return_exceptions=True)
+    mark("gemini")
+    _tiled_stats["sheets"] += 1
+
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if failed:
+        _tiled_stats["degraded"] += 1
+        note = (
+            f"Degraded result: {len(failed)} of {len(sheet.tiles)} tiles could not be analysed, "
+            f"so this is the whole-sheet estimate only and may miss thin partitions."
+        )
+        if overview.confidence_note:
+            note += f" {overview.confidence_note}"
+        fallback = overview.model_copy(update={"confidence_note": note})
+        raise TiledAnalysisDegraded(fallback, len(failed), len(sheet.tiles), failed[0])
+    merged = merge_tiles(overview, results, sheet.grid)
+    mark("merge")
+    return merged
+
+
+async def analyse_pages(
+    pdf_path: str,
+    pages: list[int] | None = None,
+    measure: Callable[[int], Awaitable[WallMeasurement]] | None = None,
+    concurrency: int = VISION_PAGE_CONCURRENCY,
+) -> AsyncIterator[tuple[int, WallMeasurement | Exception]]:
+    """
+    Analyse several pages of a PDF concurrently.
+
+    Yields `(page, measurement)` in completion order, so callers can stream
+    partial results; a page that fails yields its exception instead of
+    aborting the others. `pages` defaults to every page (up to
+    VISION_MAX_PAGES); pages past the end of the document yield an IndexError
+    naming the 1-based page. `measure` defaults to `analyse_plan` and lets
+    callers layer caching on top. At most `concurrency` pages of this document
+    are in flight at once, on top of the global vision semaphore.
+    """
+    loop = asyncio.get_running_loop()
+    count = await loop.run_in_executor(_render_executor, pdf_page_count, pdf_path)
+    if pages is None:
+        pages = list(range(min(count, VISION_MAX_PAGES)))
+    for page in pages:
+        if page >= count:
+            # PyMuPDF's own error would name the 0-based index
+            yield page, IndexError(f"Page {page + 1} is not in the document ({count} pages).")
+    pages = [page for page in pages if page < count]
+    if measure is None:
+        measure = lambda page: analyse_plan(pdf_path, page)  # noqa: E731
+
+    fan_out = asyncio.Semaphore(concurrency)
+
+    async def run(page: int) -> tuple[int, WallMeasurement | Exception]:
+        async with fan_out:
+            try:
+                return page, await measure(page)
+            except Exception as exc:
+                return page, exc
+
+    tasks = [asyncio.create_task(run(page)) for page in pages]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away or the consumer stopped early: don't leave Gemini calls running
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,170 @@
+"""
+Vision providers: where vision.py sends a prompt and an image for analysis.
+
+  - gemini: the Gemini API through one long-lived client per process
+  - record: Gemini, with every raw response also saved to VISION_RECORD_DIR
+  - replay: no network; serves recorded responses after an artificial delay
+
+Recordings are keyed by the SHA-256 of the image bytes (plus a short hash of
+the prompt), so replaying a recorded run answers the same uploads with the
+same responses. Unrecorded images get one of the recordings, picked
+deterministically by image hash, or the sample response shipped in backend/
+(e2e_result.json). That makes replay suitable for offline load tests of the full upload path.
+"""
+
+import os
+import random
+import asyncio
+import hashlib
+import functools
+from pathlib import Path
+from typing import Protocol
+
+from google import genai
+from google.genai import types
+
+from config import (
+    GOOGLE_API_KEY,
+    GEMINI_MODEL,
+    VISION_PROVIDER,
+    VISION_RECORD_DIR,
+    VISION_REPLAY_LATENCY_S,
+    VISION_REPLAY_JITTER_S,
+)
+
+# Sample Gemini output committed alongside the backend, used when replaying
+# without recordings. raw_response*.txt are truncated and don't parse.
+_SAMPLE_RESPONSES = [Path(__file__).parent / "e2e_result.json"]
+
+
+class VisionProvider(Protocol):
+    async def generate(self, prompt: str, image_part: types.Part) -> str:
+        """Return the raw response text for one prompt + image."""
+        ...
+
+    def stats(self) -> dict:
+        ...
+
+
+def recording_key(prompt: str, image_part: types.Part) -> str:
+    image_sha = hashlib.sha256(image_part.inline_data.data).hexdigest()
+    prompt_sha = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return f"{image_sha}-{prompt_sha[:12]}"
+
+
+class GeminiProvider:
+    """
+    Gemini API calls through one shared client (and its connection pool).
+    The client is created on first use: genai.Client rejects an empty API
+    key, and the provider is also built just to report stats.
+    """
+
+    def __init__(self, api_key: str = GOOGLE_API_KEY, model: str = GEMINI_MODEL):
+        self.api_key = api_key
+        self.model = model
+        self._client: genai.Client | None = None
+
+    @property
+    def client(self) -> genai.Client:
+        if self._client is None:
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    async def generate(self, prompt: str, image_part: types.Part) -> str:
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=[prompt, image_part],
+            config=types.GenerateContentConfig(
+                temperature=0.1,
+                max_output_tokens=2048,
+                response_mime_type="application/json",
+            ),
+        )
+        return response.text
+
+    def stats(self) -> dict:
+        return {"provider": "gemini"}
+
+
+class RecordingProvider:
+    """Wraps another provider and saves each raw response as <record_dir>/<key>.txt."""
+
+    def __init__(self, inner: VisionProvider, record_dir: str = VISION_RECORD_DIR):
+        self.inner = inner
+        self.record_dir = Path(record_dir)
+        self.record_dir.mkdir(parents=True, exist_ok=True)
+        self.recorded = 0
+
+    async def generate(self, prompt: str, image_part: types.Part) -> str:
+        text = await self.inner.generate(prompt, image_part)
+        await asyncio.to_thread(self._save, recording_key(prompt, image_part), text)
+        self.recorded += 1
+        return text
+
+    def _save(self, key: str, text: str) -> None:
+        partial = self.record_dir / f"{key}.part"
+        partial.write_text(text, encoding="utf-8")
+        os.replace(partial, self.record_dir / f"{key}.txt")
+
+    def stats(self) -> dict:
+        return {"provider": "record", "recorded": self.recorded}
+
+
+class ReplayProvider:
+    """
+    Serves recorded responses without network access, after `latency_s` ±
+    `jitter_s` seconds. The delay is seeded by the recording key, so repeated
+    runs see the same latencies.
+    """
+
+    def __init__(
+        self,
+        record_dir: str = VISION_RECORD_DIR,
+        latency_s: float = VISION_REPLAY_LATENCY_S,
+        jitter_s: float = VISION_REPLAY_JITTER_S,
+    ):
+        self.record_dir = Path(record_dir)
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.hits = 0
+        self.fallbacks = 0
+
+    def _lookup(self, key: str) -> tuple[str, bool]:
+        exact = self.record_dir / f"{key}.txt"
+        if exact.is_file():
+            return exact.read_text(encoding="utf-8"), True
+        image_sha = key.split("-", 1)[0]
+        recordings = sorted(self.record_dir.glob("*.txt")) if self.record_dir.is_dir() else []
+        # Same image under another prompt version is still the best answer
+        for path in recordings:
+            if path.name.startswith(image_sha):
+                return path.read_text(encoding="utf-8"), True
+        samples = recordings or [p for p in _SAMPLE_RESPONSES if p.is_file()]
+        if not samples:
+            raise RuntimeError(f"No recorded vision responses in {self.record_dir} to replay")
+        path = samples[int(image_sha[:8], 16) % len(samples)]
+        return path.read_text(encoding="utf-8", errors="replace"), False
+
+    async def generate(self, prompt: str, image_part: types.Part) -> str:
+        key = recording_key(prompt, image_part)
+        text, hit = await asyncio.to_thread(self._lookup, key)
+        if hit:
+            self.hits += 1
+        else:
+            self.fallbacks += 1
+        delay = self.latency_s + random.Random(key).uniform(-self.jitter_s, self.jitter_s)
+        await asyncio.sleep(max(0.0, delay))
+        return text
+
+    def stats(self) -> dict:
+        return {"provider": "replay", "hits": self.hits, "fallbacks": self.fallbacks}
+
+
+@functools.lru_cache()
+def get_vision_provider() -> VisionProvider:
+    """Factory function — returns the process-wide provider selected by VISION_PROVIDER."""
+    if VISION_PROVIDER == "replay":
+        return ReplayProvider()
+    if VISION_PROVIDER == "record":
+        return RecordingProvider(GeminiProvider())
+    return GeminiProvider()
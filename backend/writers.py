@@ -0,0 +1,132 @@
+"""
+Background batch writers for Supabase tables.
+
+Request handlers hand rows to a BatchWriter and return immediately; a
+background task inserts them in batches (by size or time) with retries, and
+flushes whatever is left on shutdown. A batch that still fails is split in
+halves until only the rows that fail on their own are dropped.
+"""
+
+import asyncio
+from collections import deque
+
+from auth import get_supabase
+
+
+class BatchWriter:
+    """Bounded in-memory queue of rows, inserted into `table` in batches."""
+
+    def __init__(
+        self,
+        table: str,
+        max_queue: int = 10000,
+        batch_size: int = 100,
+        flush_interval_s: float = 2.0,
+        max_retries: int = 4,
+        retry_base_s: float = 0.5,
+    ):
+        self.table = table
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max_retries
+        self.retry_base_s = retry_base_s
+
+        self._rows: deque[dict] = deque()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        # Held while a batch is taken and inserted, so flush() also waits for
+        # a batch the background task is already sending
+        self._flushing = asyncio.Lock()
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def submit(self, row: dict) -> bool:
+        """Queue a row for insertion. Never blocks; returns False if dropped."""
+        if len(self._rows) >= self.max_queue:
+            self.dropped += 1
+            return False
+        self._rows.append(row)
+        if self._wakeup is not None and len(self._rows) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name=f"batch-writer:{self.table}")
+
+    async def stop(self) -> None:
+        """Stop the background task after it has flushed every queued row."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Insert every row submitted so far, including any batch already in flight."""
+        async with self._flushing:
+            while self._rows:
+                batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+                await self._insert(batch)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _execute(self, rows: list[dict]) -> None:
+        await asyncio.to_thread(lambda: get_supabase().table(self.table).insert(rows).execute())
+        self.written += len(rows)
+
+    async def _insert(self, batch: list[dict]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._execute(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed_batches += 1
+                    if len(batch) == 1:
+                        print(f"Insert into {self.table} failed, dropping 1 row: {e}")
+                        self.dropped += 1
+                    else:
+                        print(f"Batch insert into {self.table} failed, retrying its {len(batch)} rows in halves: {e}")
+                        await self._bisect(batch)
+                    return
+                await asyncio.sleep(self.retry_base_s * 2 ** attempt)
+
+    async def _bisect(self, rows: list[dict]) -> None:
+        """
+        Insert a failed batch half by half, once each, so that one bad row
+        (e.g. a foreign key violation) costs only itself and not the rows of
+        other users batched with it.
+        """
+        mid = len(rows) // 2
+        for half in (rows[:mid], rows[mid:]):
+            try:
+                await self._execute(half)
+            except Exception as e:
+                if len(half) > 1:
+                    await self._bisect(half)
+                else:
+                    print(f"Insert into {self.table} failed, dropping 1 row: {e}")
+                    self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._rows),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+        }
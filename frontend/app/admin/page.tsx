@@ -6,12 +6,22 @@ import { useAuth } from "@clerk/nextjs";
 import { Users, Activity, ChevronDown, Shield, AlertTriangle, CheckCircle, RefreshCw } from "lucide-react";
 
 type User = { id: string; email: string; tier: string; created_at: string };
+type UserPage = { items: User[]; next_cursor: string | null; tier_counts: Record<string, number> };
+type UserFilters = { tier: string; emailPrefix: string; joinedAfter: string; joinedBefore: string };
 type AuditEntry = { id: string; user_id: string; action: string; resource: string; detail: string; created_at: string };
+type AuditPage = { items: AuditEntry[]; next_cursor: string | null };
+type AuditFilters = { userId: string; action: string; since: string; until: string };
 
 export default function AdminPage() {
     const { getToken } = useAuth();
     const [users, setUsers] = useState<User[]>([]);
+    const [usersCursor, setUsersCursor] = useState<string | null>(null);
+    const [tierCounts, setTierCounts] = useState<Record<string, number>>({});
+    const [filters, setFilters] = useState<UserFilters>({ tier: "", emailPrefix: "", joinedAfter: "", joinedBefore: "" });
+    const [loadingMore, setLoadingMore] = useState(false);
     const [auditLogs, setAuditLogs] = useState<AuditEntry[]>([]);
+    const [auditCursor, setAuditCursor] = useState<string | null>(null);
+    const [auditFilters, setAuditFilters] = useState<AuditFilters>({ userId: "", action: "", since: "", until: "" });
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
     const [updatingUser, setUpdatingUser] = useState<string | null>(null);
@@ -24,18 +34,98 @@ export default function AdminPage() {
         return { Authorization: `Bearer ${token}`, "Content-Type": "application/json" };
     }
 
+    // Filtering and paging happen server-side; the page only holds what has been loaded
+    function usersUrl(cursor: string | null) {
+        const params = new URLSearchParams({ limit: "50" });
+        if (cursor) params.set("cursor", cursor);
+        if (filters.tier) params.set("tier", filters.tier);
+        if (filters.emailPrefix) params.set("email_prefix", filters.emailPrefix);
+        if (filters.joinedAfter) params.set("joined_after", filters.joinedAfter);
+        if (filters.joinedBefore) params.set("joined_before", filters.joinedBefore);
+        return `${API}/api/admin/users?${params}`;
+    }
+
+    function applyUserPage(page: UserPage, append: boolean) {
+        setUsers(prev => append ? [...prev, ...page.items] : page.items);
+        setUsersCursor(page.next_cursor);
+        setTierCounts(page.tier_counts);
+    }
+
+    async function loadUsers() {
+        setLoading(true);
+        try {
+            const res = await fetch(usersUrl(null), { headers: await authHeaders() });
+            if (res.ok) applyUserPage(await res.json(), false);
+        } finally {
+            setLoading(false);
+        }
+    }
+
+    async function loadMoreUsers() {
+        if (!usersCursor) return;
+        setLoadingMore(true);
+        try {
+            const res = await fetch(usersUrl(usersCursor), { headers: await authHeaders() });
+            if (res.ok) applyUserPage(await res.json(), true);
+        } finally {
+            setLoadingMore(false);
+        }
+    }
+
+    function auditParams(cursor: string | null) {
+        const params = new URLSearchParams();
+        if (cursor) params.set("cursor", cursor);
+        if (auditFilters.userId) params.set("user_id", auditFilters.userId);
+        if (auditFilters.action) params.set("action", auditFilters.action);
+        if (auditFilters.since) params.set("since", auditFilters.since);
+        if (auditFilters.until) params.set("until", auditFilters.until);
+        return params;
+    }
+
+    function auditUrl(cursor: string | null) {
+        const params = auditParams(cursor);
+        params.set("limit", "50");
+        return `${API}/api/admin/audit-logs?${params}`;
+    }
+
+    function applyAuditPage(page: AuditPage, append: boolean) {
+        setAuditLogs(prev => append ? [...prev, ...page.items] : page.items);
+        setAuditCursor(page.next_cursor);
+    }
+
+    async function loadAuditLogs(cursor: string | null = null) {
+        cursor ? setLoadingMore(true) : setLoading(true);
+        try {
+            const res = await fetch(auditUrl(cursor), { headers: await authHeaders() });
+            if (res.ok) applyAuditPage(await res.json(), cursor !== null);
+        } finally {
+            cursor ? setLoadingMore(false) : setLoading(false);
+        }
+    }
+
+    async function exportAuditLogs() {
+        const res = await fetch(`${API}/api/admin/audit-logs/export?${auditParams(null)}`, { headers: await authHeaders() });
+        if (!res.ok) { alert("Failed to export audit logs."); return; }
+        const url = URL.createObjectURL(await res.blob());
+        const a = document.createElement("a");
+        a.href = url;
+        a.download = "audit-logs.ndjson";
+        a.click();
+        URL.revokeObjectURL(url);
+    }
+
     async function loadData() {
         setLoading(true);
         setError(null);
         try {
             const headers = await authHeaders();
             const [uRes, lRes] = await Promise.all([
-                fetch(`${API}/api/admin/users`, { headers }),
-                fetch(`${API}/api/admin/audit-logs?limit=50`, { headers }),
+                fetch(usersUrl(null), { headers }),
+                fetch(auditUrl(null), { headers }),
             ]);
             if (uRes.status === 403) { setError("Access denied. Admin role required."); return; }
-            setUsers(await uRes.json());
-            setAuditLogs(await lRes.json());
+            applyUserPage(await uRes.json(), false);
+            applyAuditPage(await lRes.json(), false);
         } catch (e) {
             setError("Failed to load admin data. Is the backend running?");
         } finally {
@@ -55,6 +145,11 @@ export default function AdminPage() {
                 body: JSON.stringify({ tier: newTier }),
             });
             setUsers(prev => prev.map(u => u.id === userId ? { ...u, tier: newTier } : u));
+            setTierCounts(prev => {
+                const oldTier = users.find(u => u.id === userId)?.tier;
+                if (!oldTier || oldTier === newTier) return prev;
+                return { ...prev, [oldTier]: (prev[oldTier] || 1) - 1, [newTier]: (prev[newTier] || 0) + 1 };
+            });
         } catch (e) {
             alert("Failed to update tier.");
         } finally {
@@ -62,9 +157,7 @@ export default function AdminPage() {
         }
     }
 
-    const tierCounts = users.reduce((acc, u) => {
-        acc[u.tier] = (acc[u.tier] || 0) + 1; return acc;
-    }, {} as Record<string, number>);
+    const totalUsers = Object.values(tierCounts).reduce((a, b) => a + b, 0);
 
     const tierColor: Record<string, string> = {
         free: "#64748b", pro: "#10b981", admin: "#e63946", enterprise: "#f59e0b",
@@ -98,7 +191,7 @@ export default function AdminPage() {
                 {/* Stats Row */}
                 <div className="admin-stats">
                     {[
-                        { label: "Total Users", value: users.length, icon: <Users size={16} /> },
+                        { label: "Total Users", value: totalUsers, icon: <Users size={16} /> },
                         { label: "Free", value: tierCounts.free || 0 },
                         { label: "Pro", value: tierCounts.pro || 0 },
                         { label: "Audit Entries", value: auditLogs.length, icon: <Activity size={16} /> },
@@ -120,6 +213,37 @@ export default function AdminPage() {
                     </button>
                 </div>
 
+                {activeTab === "users" && (
+                    <form
+                        className="admin-filters"
+                        onSubmit={(e) => { e.preventDefault(); loadUsers(); }}
+                    >
+                        <input
+                            className="config-select" type="search" placeholder="Email starts with…"
+                            value={filters.emailPrefix}
+                            onChange={(e) => setFilters({ ...filters, emailPrefix: e.target.value })}
+                        />
+                        <select
+                            className="config-select" value={filters.tier}
+                            onChange={(e) => setFilters({ ...filters, tier: e.target.value })}
+                        >
+                            <option value="">All plans</option>
+                            <option value="free">Free</option>
+                            <option value="pro">Pro</option>
+                            <option value="admin">Admin</option>
+                        </select>
+                        <label>Joined from
+                            <input className="config-select" type="date" value={filters.joinedAfter}
+                                onChange={(e) => setFilters({ ...filters, joinedAfter: e.target.value })} />
+                        </label>
+                        <label>to
+                            <input className="config-select" type="date" value={filters.joinedBefore}
+                                onChange={(e) => setFilters({ ...filters, joinedBefore: e.target.value })} />
+                        </label>
+                        <button type="submit" className="admin-tab active">Filter</button>
+                    </form>
+                )}
+
                 {activeTab === "users" && (
                     <div className="glass-card" style={{ overflow: "auto" }}>
                         {loading ? (
@@ -170,9 +294,44 @@ export default function AdminPage() {
                                 </tbody>
                             </table>
                         )}
+                        {!loading && usersCursor && (
+                            <div style={{ padding: "1rem", textAlign: "center" }}>
+                                <button className="admin-tab" onClick={loadMoreUsers} disabled={loadingMore}>
+                                    {loadingMore ? "Loading…" : "Load more"}
+                                </button>
+                            </div>
+                        )}
                     </div>
                 )}
 
+                {activeTab === "logs" && (
+                    <form
+                        className="admin-filters"
+                        onSubmit={(e) => { e.preventDefault(); loadAuditLogs(); }}
+                    >
+                        <input
+                            className="config-select" type="search" placeholder="User ID"
+                            value={auditFilters.userId}
+                            onChange={(e) => setAuditFilters({ ...auditFilters, userId: e.target.value })}
+                        />
+                        <input
+                            className="config-select" type="search" placeholder="Action (e.g. popia.export)"
+                            value={auditFilters.action}
+                            onChange={(e) => setAuditFilters({ ...auditFilters, action: e.target.value })}
+                        />
+                        <label>From
+                            <input className="config-select" type="date" value={auditFilters.since}
+                                onChange={(e) => setAuditFilters({ ...auditFilters, since: e.target.value })} />
+                        </label>
+                        <label>to
+                            <input className="config-select" type="date" value={auditFilters.until}
+                                onChange={(e) => setAuditFilters({ ...auditFilters, until: e.target.value })} />
+                        </label>
+                        <button type="submit" className="admin-tab active">Filter</button>
+                        <button type="button" className="admin-tab" onClick={exportAuditLogs}>Export NDJSON</button>
+                    </form>
+                )}
+
                 {activeTab === "logs" && (
                     <div className="glass-card" style={{ overflow: "auto" }}>
                         {loading ? (
@@ -203,6 +362,13 @@ export default function AdminPage() {
                                 </tbody>
                             </table>
                         )}
+                        {!loading && auditCursor && (
+                            <div style={{ padding: "1rem", textAlign: "center" }}>
+                                <button className="admin-tab" onClick={() => loadAuditLogs(auditCursor)} disabled={loadingMore}>
+                                    {loadingMore ? "Loading…" : "Load more"}
+                                </button>
+                            </div>
+                        )}
                     </div>
                 )}
             </div>
@@ -232,6 +398,9 @@ export default function AdminPage() {
           cursor: pointer; font-family: inherit; transition: all 0.2s;
         }
         .admin-tab.active { background: var(--accent); color: white; border-color: var(--accent); }
+        .admin-filters { display: flex; flex-wrap: wrap; align-items: center; gap: 0.5rem; margin-bottom: 1rem; }
+        .admin-filters .config-select { width: auto; padding: 0.4rem 0.6rem; font-size: 0.85rem; }
+        .admin-filters label { display: inline-flex; align-items: center; gap: 0.4rem; font-size: 0.8rem; color: var(--text-muted); }
         .tier-badge { padding: 0.2rem 0.6rem; border-radius: 12px; color: white; font-size: 0.72rem; font-weight: 700; text-transform: uppercase; }
         .action-badge { padding: 0.2rem 0.5rem; border-radius: 6px; background: rgba(99,102,241,0.1); color: var(--text-secondary); font-size: 0.75rem; font-weight: 600; font-family: monospace; }
         .btn-icon { display: inline-flex; align-items: center; justify-content: center; width: 36px; height: 36px; border-radius: 50%; border: 1px solid var(--border-subtle); background: var(--bg-card); color: var(--text-secondary); cursor: pointer; transition: all 0.2s; }
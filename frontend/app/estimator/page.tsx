@@ -10,12 +10,51 @@ type AppState = "idle" | "uploading" | "done" | "error";
 
 const API = process.env.NEXT_PUBLIC_API_URL || "";
 
+// Labels for the `stage` events streamed by /api/upload/stream
+const STAGE_LABELS: Record<string, string> = {
+    save: "Plan uploaded. Waiting for the analyser…",
+    cache_hit: "We've seen this plan before. Calculating materials…",
+    queue: "Rendering your drawing…",
+    render: "Detecting walls and measuring lengths…",
+    gemini: "Reading the measurements…",
+    parse: "Calculating materials…",
+};
+
+type StreamEvent = { event: string; data: any };
+
+// 429 / 503 responses say how long to back off (Retry-After, or retry_after_s in an SSE error event)
+function withRetryHint(message: string, retryAfter: string | number | null | undefined) {
+    return retryAfter ? `${message} Try again in ${retryAfter} s.` : message;
+}
+
+// Parse a Server-Sent Events response body incrementally (EventSource can't POST a file)
+async function* readEvents(res: Response): AsyncGenerator<StreamEvent> {
+    const reader = res.body!.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end: number;
+        while ((end = buffer.indexOf("\n\n")) !== -1) {
+            const block = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            const event = block.match(/^event: (.*)$/m)?.[1] ?? "message";
+            const data = block.match(/^data: (.*)$/m)?.[1];
+            if (data) yield { event, data: JSON.parse(data) };
+        }
+    }
+}
+
 export default function EstimatorPage() {
     const { getToken, isSignedIn } = useAuth();
     const [state, setState] = useState<AppState>("idle");
     const [file, setFile] = useState<File | null>(null);
     const [boq, setBOQ] = useState<BOQData | null>(null);
     const [error, setError] = useState<string>("");
+    const [stage, setStage] = useState<string>("");
+    const [queuePosition, setQueuePosition] = useState<number | null>(null);
     const [theme, setTheme] = useState<"light" | "dark">("light");
     const [tier, setTier] = useState<string>("free");
 
@@ -78,6 +117,8 @@ export default function EstimatorPage() {
         if (!file) return;
         setState("uploading");
         setError("");
+        setStage("");
+        setQueuePosition(null);
 
         try {
             const formData = new FormData();
@@ -97,14 +138,21 @@ export default function EstimatorPage() {
                 if (token) headers["Authorization"] = `Bearer ${token}`;
             }
 
-            const res = await fetch(`${API}/api/upload`, { method: "POST", headers, body: formData });
+            const res = await fetch(`${API}/api/upload/stream`, { method: "POST", headers, body: formData });
 
             if (!res.ok) {
                 const detail = await res.json().catch(() => ({}));
-                throw new Error(detail.detail || `Upload failed (${res.status})`);
+                throw new Error(withRetryHint(detail.detail || `Upload failed (${res.status})`, res.headers.get("Retry-After")));
             }
 
-            const data: BOQData = await res.json();
+            let data: BOQData | null = null;
+            for await (const { event, data: payload } of readEvents(res)) {
+                if (event === "stage") { setStage(payload.stage); setQueuePosition(null); }
+                else if (event === "queued") setQueuePosition(payload.position);
+                else if (event === "error") throw new Error(withRetryHint(payload.detail || `Analysis failed (${payload.status})`, payload.retry_after_s));
+                else if (event === "result") data = payload;
+            }
+            if (!data) throw new Error("The connection closed before the analysis finished. Please retry.");
             setBOQ(data);
             setState("done");
         } catch (err: unknown) {
@@ -186,7 +234,9 @@ export default function EstimatorPage() {
                                 <div className="spinner" />
                                 <div className="loading-text">
                                     <strong>Please wait while we carefully analyse your plan…</strong>
-                                    Detecting walls, measuring lengths, and calculating materials.
+                                    {queuePosition
+                                        ? `Lots of plans are being analysed right now. You're number ${queuePosition} in the queue…`
+                                        : STAGE_LABELS[stage] || "Uploading your plan…"}
                                 </div>
                             </motion.div>
                         )}
@@ -9,7 +9,6 @@ export default function PrivacyPage() {
     const { getToken, isSignedIn } = useAuth();
     const [exportStatus, setExportStatus] = useState<"idle" | "loading" | "done" | "error">("idle");
     const [deleteStatus, setDeleteStatus] = useState<"idle" | "confirm" | "loading" | "done" | "error">("idle");
-    const [exportedData, setExportedData] = useState<any>(null);
 
     const API = process.env.NEXT_PUBLIC_API_URL;
 
@@ -21,13 +20,10 @@ export default function PrivacyPage() {
                 headers: { Authorization: `Bearer ${token}` },
             });
             if (!res.ok) throw new Error("Export failed");
-            const data = await res.json();
-            setExportedData(data);
-            // Download as JSON file
-            const blob = new Blob([JSON.stringify(data, null, 2)], { type: "application/json" });
-            const url = URL.createObjectURL(blob);
+            // Download as a ZIP archive (profile, estimates, activity log and uploaded plans)
+            const url = URL.createObjectURL(await res.blob());
             const a = document.createElement("a");
-            a.href = url; a.download = `costcorrect_my_data_${new Date().toISOString().slice(0, 10)}.json`;
+            a.href = url; a.download = `costcorrect_my_data_${new Date().toISOString().slice(0, 10)}.zip`;
             a.click(); URL.revokeObjectURL(url);
             setExportStatus("done");
         } catch {
@@ -40,11 +36,18 @@ export default function PrivacyPage() {
         setDeleteStatus("loading");
         try {
             const token = await getToken();
-            const res = await fetch(`${API}/api/popia/delete-my-data`, {
-                method: "DELETE",
-                headers: { Authorization: `Bearer ${token}` },
-            });
+            const headers = { Authorization: `Bearer ${token}` };
+            const res = await fetch(`${API}/api/popia/delete-my-data`, { method: "DELETE", headers });
             if (!res.ok) throw new Error("Deletion failed");
+            // Deletion runs in the background; poll the job until it settles
+            let job = await res.json();
+            while (job.status === "queued" || job.status === "running") {
+                await new Promise(r => setTimeout(r, 2000));
+                const poll = await fetch(`${API}/api/popia/delete-my-data/${job.job_id}`, { headers });
+                if (!poll.ok) throw new Error("Deletion failed");
+                job = await poll.json();
+            }
+            if (job.status !== "succeeded") throw new Error(job.error || "Deletion failed");
             setDeleteStatus("done");
         } catch {
             setDeleteStatus("error");
@@ -72,7 +75,7 @@ export default function PrivacyPage() {
                 {/* POPIA Rights */}
                 <div className="rights-grid">
                     {[
-                        { icon: <Eye size={20} />, title: "Right to Access (Section 23)", desc: "View and download all data we hold about you at any time. Export includes your profile, estimates, and activity logs." },
+                        { icon: <Eye size={20} />, title: "Right to Access (Section 23)", desc: "View and download all data we hold about you at any time. Export includes your profile, estimates, activity logs, and the plans you uploaded." },
                         { icon: <Trash2 size={20} />, title: "Right to Deletion (Section 24)", desc: "Request deletion of your personal data. Anonymised audit logs are retained for 12 months for legal compliance, then deleted." },
                         { icon: <Clock size={20} />, title: "Data Retention", desc: "Uploaded plans are retained for the duration of your subscription. Free tier uploads are deleted after 30 days of inactivity." },
                         { icon: <Lock size={20} />, title: "Storage & Encryption", desc: "All files are stored in Google Cloud africa-south1 (Johannesburg) and encrypted at rest with AES-256. Access is via signed URLs only." },
@@ -107,7 +110,7 @@ export default function PrivacyPage() {
                                 <div className="action-icon export-icon"><Download size={20} /></div>
                                 <div>
                                     <h3>Export My Data</h3>
-                                    <p>Download a JSON file containing all data held for your account.</p>
+                                    <p>Download a ZIP archive containing all data held for your account, including your uploaded plans.</p>
                                 </div>
                             </div>
                             <button
@@ -1,8 +1,8 @@
 "use client";
 
-import React, { useRef } from "react";
+import React from "react";
 import { motion } from "framer-motion";
-import { useReactToPrint } from "react-to-print";
+import { useAuth } from "@clerk/nextjs";
 import Link from "next/link";
 
 interface MaterialLine {
@@ -49,6 +49,7 @@ export interface BOQData {
     vat_amount?: number;
     total_estimated_cost?: number;
     confidence_note?: string | null;
+    measurement_id?: string | null;
 }
 
 interface BOQTableProps {
@@ -80,30 +81,32 @@ function getIcon(item: string): string {
     return "📦";
 }
 
-async function downloadCSV(data: BOQData) {
+type ExportFormat = "csv" | "xlsx" | "pdf";
+
+async function downloadExport(data: BOQData, format: ExportFormat, token?: string | null) {
     const API = process.env.NEXT_PUBLIC_API_URL || "";
-    const res = await fetch(`${API}/api/export/csv`, {
+    const headers: Record<string, string> = { "Content-Type": "application/json" };
+    // Reports are watermarked unless the server can see a Pro token
+    if (token) headers["Authorization"] = `Bearer ${token}`;
+    const res = await fetch(`${API}/api/export/${format}`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers,
         body: JSON.stringify(data),
     });
-    if (!res.ok) { alert("CSV export failed."); return; }
+    if (!res.ok) { alert(`${format.toUpperCase()} export failed.`); return; }
     const blob = await res.blob();
     const url = URL.createObjectURL(blob);
     const a = document.createElement("a");
     a.href = url;
-    a.download = `costcorrect_boq_${new Date().toISOString().slice(0, 10)}.csv`;
+    a.download = `costcorrect_boq_${new Date().toISOString().slice(0, 10)}.${format}`;
     a.click();
     URL.revokeObjectURL(url);
 }
 
 export default function BOQTable({ data, onReset, tier = "free" }: BOQTableProps) {
-    const componentRef = useRef<HTMLDivElement>(null);
+    const { getToken } = useAuth();
     const isPro = tier !== "free";
-    const handlePrint = useReactToPrint({
-        contentRef: componentRef,
-        documentTitle: `CostCorrect_BOQ_${data.filename}`,
-    });
+    const download = async (format: ExportFormat) => downloadExport(data, format, await getToken());
     const assumptions = data.assumptions || {};
 
     return (
@@ -114,7 +117,7 @@ export default function BOQTable({ data, onReset, tier = "free" }: BOQTableProps
             className="boq-results"
             id="boq-results"
         >
-            <div ref={componentRef} className="printable-area">
+            <div className="printable-area">
                 <h2 className="section-title">Bill of Quantities</h2>
                 <p className="section-subtitle">
                     AI-assisted suggested takeoff from <strong>{data.filename}</strong>
@@ -260,27 +263,27 @@ export default function BOQTable({ data, onReset, tier = "free" }: BOQTableProps
                     ← Upload another plan
                 </button>
 
-                {/* PDF Export */}
-                {tier === "free" ? (
-                    <button className="btn-success" style={{ opacity: 0.6, cursor: "not-allowed" }}
-                        onClick={() => alert("PDF Export is a Pro feature. Please upgrade your account.")}
-                        id="download-pdf-button">
-                        📄 PDF Report <span className="pro-badge">PRO</span>
-                    </button>
-                ) : (
-                    <button className="btn-success" onClick={() => handlePrint()} id="download-pdf-button">
-                        📄 PDF Report
-                    </button>
-                )}
+                {/* Report exports (watermarked on the free tier) */}
+                <button className="btn-success" onClick={() => download("pdf")} id="download-pdf-button">
+                    📄 PDF Report
+                </button>
+
+                <button
+                    className="btn-success"
+                    style={{ background: "#1d3557", borderColor: "#142844" }}
+                    onClick={() => download("xlsx")}
+                    id="download-xlsx-button"
+                >
+                    📊 Excel
+                </button>
 
-                {/* CSV Export */}
                 <button
                     className="btn-success"
                     style={{ background: "#1d3557", borderColor: "#142844" }}
-                    onClick={() => downloadCSV(data)}
+                    onClick={() => download("csv")}
                     id="download-csv-button"
                 >
-                    📊 CSV / Excel
+                    📄 CSV
                 </button>
 
                 {/* Upgrade prompt for free users */}